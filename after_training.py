@@ -1,10 +1,14 @@
 from settings import *
 from env import RoomSimulator
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+from tensorflow.keras.models import load_model
+import utils
 from weather import OutdoorTemp
 
 # load environment & pre-trained model
 env = RoomSimulator(0.5,0.04,reward_mech='V1',render_mode="human")
 policy_network = load_model(join('V1_outputs','policy_network_5000.keras'))
+action_selector = utils.ActionSelector(policy_network, env.action_space.n)
 
 for ep in range(1):
     done = False
@@ -13,12 +17,11 @@ for ep in range(1):
 
     while not done:
 
-        # policy network
-        state = np.expand_dims(state, axis = 0)
-        q_values = policy_network(state)
+        # policy network (greedy)
+        action = action_selector(state)[0]
         
         # take action
-        state, reward, done, info = env.step(np.argmax(q_values))
+        state, reward, done, info = env.step(action)
         env.render()
         
         # updates
@@ -0,0 +1,443 @@
+"""
+Benchmarks for the RoomSimulator hot paths. Run from the repository root, e.g.
+
+    python benchmarks.py                                  # everything
+    python benchmarks.py env_step render --json out.json  # some, saving machine-readable results
+    python benchmarks.py --baseline baseline.json         # fail on >25% regressions vs a saved run
+
+Benchmarks that have a budget exit with a non-zero status when it is exceeded, so they can guard CI.
+Metrics are compared with a baseline by name: times (*_us, *_ms, seconds) & memory (*_mb) should not
+go up, throughputs (*_per_sec) & speed-ups should not go down.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# IMPORT TIME
+# modules that must not be pulled in by importing the simulation core
+CORE_MODULES = ["settings", "weather", "env"]
+HEAVY_MODULES = ["tensorflow", "keras", "pygame", "scipy", "matplotlib", "utils"]
+IMPORT_BUDGET_SECONDS = 1.0
+IMPORT_BUDGET_MB = 150
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+for module in {modules}:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in {heavy} if m in sys.modules],
+}}))
+"""
+
+def bench_import_time(repeats = 5):
+    """
+    Imports the simulation core in fresh interpreters & checks it against the import budget.
+
+    Args:
+        repeats (int):
+            Number of fresh interpreters to time. The fastest run is reported, as it is the least
+            affected by a busy machine.
+
+    Returns:
+        result (dict):
+            Import time (s), peak RSS (MB), heavy modules that got imported & whether the budget was met
+    """
+
+    probe = IMPORT_PROBE.format(modules = CORE_MODULES, heavy = HEAVY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", probe], capture_output = True, text = True, check = True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    best = min(runs, key = lambda run: run["seconds"])
+    best["within_budget"] = (
+        best["seconds"] <= IMPORT_BUDGET_SECONDS
+        and best["rss_mb"] <= IMPORT_BUDGET_MB
+        and not best["heavy_modules"]
+    )
+
+    return best
+
+def best_time(fn, number, repeats = 5):
+    """
+    Returns the fastest mean time (s) per call of fn over `repeats` runs of `number` calls
+    """
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+
+    return min(times)
+
+# ACTION SELECTION
+def bench_action_selection(batch_size = 1024, number = 200):
+    """
+    Compares the eager per-step path (policy_network call + utils.choose_action) with ActionSelector
+    on a single state & on a batch of states.
+
+    Returns:
+        result (dict):
+            Time per state (us) for each path & the batched speed-up over the eager path
+    """
+
+    import numpy as np
+    import utils
+    from env import RoomSimulator
+
+    env = RoomSimulator(0.5,0.04)
+    state = env.reset(seed = 0)
+    states = np.random.default_rng(0).uniform(15, 25, size = batch_size)
+    policy_network = utils.build_network((1,), 3)
+    action_selector = utils.ActionSelector(policy_network, env.action_space.n, seed = 0)
+    action_selector(states, 0.1) # trace
+
+    def eager():
+        q_values = policy_network(np.expand_dims(state, axis = 0))
+        utils.choose_action(env, 0.1, q_values)
+
+    eager_us = best_time(eager, number) * 1e6
+    single_us = best_time(lambda: action_selector(state, 0.1), number) * 1e6
+    batch_us = best_time(lambda: action_selector(states, 0.1), number) * 1e6 / batch_size
+
+    return {
+        "eager_us_per_state": eager_us,
+        "selector_us_per_state": single_us,
+        "selector_batch_us_per_state": batch_us,
+        "batch_size": batch_size,
+        "batch_speedup": eager_us / batch_us,
+    }
+
+# SIMULATOR
+def bench_env_step(num_envs = 1024, number = 960):
+    """
+    Returns:
+        result (dict):
+            RoomSimulator step & reset throughput, VectorRoomSimulator & MultiZoneSimulator room/zone-steps
+            per second, and VectorRoomSimulator room-steps per second with 1-minute physics & 15-minute decisions
+    """
+
+    import numpy as np
+    from env import RoomSimulator, VectorRoomSimulator
+    from multizone import MultiZoneSimulator, grid_conductance
+
+    env = RoomSimulator(0.5,0.04)
+    env.reset(seed = 0)
+    def day():
+        env.reset()
+        for i in range(96):
+            env.step(i % 2)
+    step_seconds = best_time(day, number // 96) / 96
+    reset_seconds = best_time(env.reset, number)
+
+    vector_env = VectorRoomSimulator(num_envs, 0.5, 0.04)
+    vector_env.reset(seed = 0)
+    actions = np.ones(num_envs, dtype = np.int64)
+    vector_step_seconds = best_time(lambda: vector_env.step(actions), number)
+
+    # 15 exact 1-minute sub-steps per decision
+    fine_env = VectorRoomSimulator(num_envs, 0.5, 0.04, dt = 1, action_repeat = 15)
+    fine_env.reset(seed = 0)
+    fine_step_seconds = best_time(lambda: fine_env.step(actions), number)
+
+    # 32 x 32 floor plan
+    zones_env = MultiZoneSimulator(0.5, 0.04, grid_conductance(32, 32, 0.05))
+    zones_env.reset(seed = 0)
+    zone_actions = np.ones(zones_env.num_zones, dtype = np.int64)
+    def zones_day():
+        zones_env.reset()
+        for i in range(96):
+            zones_env.step(zone_actions)
+    zones_step_seconds = best_time(zones_day, max(number // 96, 1)) / 96
+
+    return {
+        "step_per_sec": 1 / step_seconds,
+        "reset_per_sec": 1 / reset_seconds,
+        "vector_room_steps_per_sec": num_envs / vector_step_seconds,
+        "num_envs": num_envs,
+        "fine_vector_room_steps_per_sec": num_envs / fine_step_seconds,
+        "multizone_zone_steps_per_sec": zones_env.num_zones / zones_step_seconds,
+    }
+
+def bench_outdoor_temp(number = 2000):
+    """
+    Returns:
+        result (dict):
+            Time (us) to build an OutdoorTemp (unseeded & seeded) & to index a day from a WeatherBank
+    """
+
+    import os
+    import tempfile
+    import numpy as np
+    from weather import OutdoorTemp, WeatherBank
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        bank = WeatherBank.generate(os.path.join(tmp, "bank.npy"), 1000, seed = 0)
+        days = rng.integers(len(bank), size = number)
+        day_iter = iter(np.tile(days, 6))
+        bank_us = best_time(lambda: bank[next(day_iter)], number) * 1e6
+        del bank
+
+    return {
+        "construct_us": best_time(OutdoorTemp, number) * 1e6,
+        "construct_seeded_us": best_time(lambda: OutdoorTemp(rng), number) * 1e6,
+        "weather_bank_day_us": bank_us,
+    }
+
+# REPLAY & LEARNER
+def filled_buffer(capacity = 1000, prioritized = False):
+    import numpy as np
+    from replay import ReplayBuffer, PrioritizedReplayBuffer
+
+    rng = np.random.default_rng(0)
+    memory_buffer = (PrioritizedReplayBuffer if prioritized else ReplayBuffer)(capacity, seed = 0)
+    states = rng.uniform(15, 25, size = capacity)
+    memory_buffer.append_batch(states, rng.integers(2, size = capacity), rng.random(capacity), states + 0.1,
+                               np.zeros(capacity))
+
+    return memory_buffer
+
+def bench_get_experiences(batch_size = 20, number = 2000):
+    """
+    Returns:
+        result (dict):
+            Latency (us) of utils.get_experiences & of a prioritized sample + priority update
+    """
+
+    import numpy as np
+    import utils
+
+    memory_buffer = filled_buffer()
+    prioritized_buffer = filled_buffer(prioritized = True)
+    td_errors = np.random.default_rng(0).random(batch_size)
+
+    def prioritized():
+        experiences, idx, weights = utils.get_prioritized_experiences(prioritized_buffer, batch_size)
+        prioritized_buffer.update_priorities(idx, td_errors)
+
+    return {
+        "get_experiences_us": best_time(lambda: utils.get_experiences(memory_buffer, batch_size), number) * 1e6,
+        "prioritized_us": best_time(prioritized, number) * 1e6,
+        "batch_size": batch_size,
+    }
+
+def bench_agent_learn(batch_size = 20, fused_updates = 16, number = 200):
+    """
+    Returns:
+        result (dict):
+            Time (us) per agent_learn update (incl. sampling) & per update of agent_learn_fused
+    """
+
+    import tensorflow as tf
+    from tensorflow.keras.optimizers import Adam
+    import utils
+    from learner import agent_learn, agent_learn_fused, DeviceReplay, build_optimizer
+
+    memory_buffer = filled_buffer()
+    policy_network, target_network = utils.build_network((1,), 3), utils.build_network((1,), 3)
+    optimizer = Adam(learning_rate = 1e-3)
+    build_optimizer(optimizer, policy_network)
+    device_replay = DeviceReplay(memory_buffer)
+    num_updates = tf.constant(fused_updates)
+
+    def learn():
+        agent_learn(policy_network, target_network, optimizer, utils.get_experiences(memory_buffer, batch_size), 0.995, 1e-3)
+    def learn_fused():
+        agent_learn_fused(policy_network, target_network, optimizer, device_replay, num_updates, batch_size, 0.995, 1e-3)
+    learn(); learn_fused() # trace
+
+    return {
+        "agent_learn_us": best_time(learn, number) * 1e6,
+        "agent_learn_fused_us": best_time(learn_fused, number // fused_updates) * 1e6 / fused_updates,
+        "batch_size": batch_size,
+    }
+
+def bench_ensemble(num_agents = 16, episodes = 3):
+    """
+    Returns:
+        result (dict):
+            Seconds per training episode of one agent & of num_agents stacked agents (ensemble.py),
+            and the speed-up over training the agents one after another
+    """
+
+    from settings_training import TrainingConfig
+    from ensemble import EnsembleTrainer
+    import contextlib
+    import io
+    import tempfile
+
+    def episode_seconds(agents):
+        with tempfile.TemporaryDirectory() as save_dir, contextlib.redirect_stdout(io.StringIO()):
+            trainer = EnsembleTrainer([TrainingConfig(num_episodes = episodes, eval_days = 1)] * agents, save_dir = save_dir)
+            trainer.train(num_episodes = 1) # trace
+            start = time.perf_counter()
+            trainer.train()
+            return (time.perf_counter() - start) / episodes
+
+    single, stacked = episode_seconds(1), episode_seconds(num_agents)
+
+    return {
+        "single_agent_episode_ms": single * 1e3,
+        "ensemble_episode_ms": stacked * 1e3,
+        "num_agents": num_agents,
+        "ensemble_speedup": num_agents * single / stacked,
+    }
+
+def bench_mpc(num_envs = 1024, horizon = 8, number = 20):
+    """
+    Returns:
+        result (dict):
+            MPCController planning throughput, in room-steps per second, with exhaustive search & with
+            cross-entropy search over the same horizon
+    """
+
+    import numpy as np
+    from env import VectorRoomSimulator
+    from mpc import MPCController
+
+    env = VectorRoomSimulator(num_envs, 0.5, 0.04)
+    state = env.reset(seed = 0)
+    for _ in range(40): # mid-morning, setpoint changes within the horizon
+        state, _, _, _ = env.step(np.zeros(num_envs, dtype = np.int64))
+
+    result = {}
+    for method in ["exhaustive", "cem"]:
+        controller = MPCController(env, horizon, method)
+        result[f"{method}_room_steps_per_sec"] = num_envs / best_time(lambda: controller(state), number)
+    result.update(num_envs = num_envs, horizon = horizon)
+
+    return result
+
+def bench_inference(model = "V1_outputs/best_model.keras", batch_size = 1024, number = 2000):
+    """
+    Returns:
+        result (dict):
+            Time per state (us) of NumpyPolicy on a single state & on a batch, and of its lookup table
+    """
+
+    import os
+    import tempfile
+    import numpy as np
+    from inference import export
+
+    with tempfile.TemporaryDirectory() as tmp:
+        policy, max_error = export(model, os.path.join(tmp, "policy.npz"))
+    table = policy.lookup_table()
+    state = np.float32(19.5)
+    states = np.random.default_rng(0).uniform(15, 25, size = batch_size)
+
+    return {
+        "numpy_us_per_state": best_time(lambda: policy(state), number) * 1e6,
+        "numpy_batch_us_per_state": best_time(lambda: policy(states), number // 10) * 1e6 / batch_size,
+        "table_us_per_state": best_time(lambda: table(state), number) * 1e6,
+        "table_batch_us_per_state": best_time(lambda: table(states), number // 10) * 1e6 / batch_size,
+        "max_q_error": max_error,
+    }
+
+# RENDERING
+def bench_render(number = 95):
+    """
+    Returns:
+        result (dict):
+            Mean headless (rgb_array) frame time (ms) over a day
+    """
+
+    from env import RoomSimulator
+
+    env = RoomSimulator(0.5,0.04,render_mode="rgb_array")
+    env.reset(seed = 0)
+    env.render()
+    def day():
+        env.reset()
+        for i in range(number):
+            env.step(i % 2)
+            env.render()
+
+    return {"frame_ms": best_time(day, 1, repeats = 3) / number * 1e3}
+
+BENCHMARKS = {
+    "import_time": bench_import_time,
+    "env_step": bench_env_step,
+    "outdoor_temp": bench_outdoor_temp,
+    "get_experiences": bench_get_experiences,
+    "agent_learn": bench_agent_learn,
+    "ensemble": bench_ensemble,
+    "mpc": bench_mpc,
+    "action_selection": bench_action_selection,
+    "inference": bench_inference,
+    "render": bench_render,
+}
+
+LOWER_IS_BETTER = ("_us", "_ms", "seconds", "_mb")
+HIGHER_IS_BETTER = ("_per_sec", "speedup")
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a baseline run.
+
+    Args:
+        results (dict):
+            benchmark -> metric -> value, from this run
+        baseline (dict):
+            The same, from a saved run
+        tolerance (float):
+            Allowed relative slow-down, e.g. 0.25 for 25%
+
+    Returns:
+        regressions (list):
+            Description of every metric that got worse by more than the tolerance
+    """
+
+    regressions = []
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            base = baseline.get(name, {}).get(key)
+            if base is None or not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if key.endswith(LOWER_IS_BETTER) and value > base * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {value:.4g} vs baseline {base:.4g}")
+            elif key.endswith(HIGHER_IS_BETTER) and value < base / (1 + tolerance):
+                regressions.append(f"{name}.{key}: {value:.4g} vs baseline {base:.4g}")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "RoomSimulator benchmarks")
+    parser.add_argument("names", nargs = "*", default = list(BENCHMARKS), help = f"benchmarks to run, from {list(BENCHMARKS)}")
+    parser.add_argument("--json", help = "write results to this file")
+    parser.add_argument("--baseline", help = "compare with results saved by an earlier --json run")
+    parser.add_argument("--tolerance", type = float, default = 0.25, help = "allowed relative regression vs the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.names:
+        results[name] = BENCHMARKS[name]()
+        print(f"{name}: {results[name]}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent = 2)
+
+    failed = not all(result.get("within_budget", True) for result in results.values())
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Resumable training checkpoints, written on a background thread so the training loop never waits on disk.
+
+A checkpoint is a directory <checkpoint_dir>/ckpt-<episode> holding
+
+    networks.npz     policy & target network weights
+    optimizer.npz    optimizer variables (iteration count, learning rate & Adam slots), in optimizer order
+    replay.npy       the replay buffer's experiences as one structured array, memory-mappable with np.load
+    priorities.npy   leaf priorities (prioritized replay only)
+    state.json       episode, epsilon, best_avg_score, metrics store rows, training time, replay counters
+                     & the replay sampling, exploration & env rng states
+
+It is written to a temporary directory that is renamed once complete, so a crash mid-write never leaves
+a half-written checkpoint behind.
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+import numpy as np
+
+PREFIX = "ckpt-"
+
+def replay_dtype(memory_buffer):
+    return np.dtype([
+        (name, field.dtype, field.shape[1:])
+        for name, field in zip(["states", "actions", "rewards", "new_states", "done_vals"], memory_buffer.fields())
+    ])
+
+def snapshot(episode, epsilon, best_avg_score, metrics_rows, policy_network, target_network, optimizer, memory_buffer,
+             seconds = 0.0, action_rng = None, env_rng = None):
+    """
+    Copies everything a checkpoint needs into host memory. Cheap enough to run in the training loop;
+    the slow part (writing) is left to Checkpointer's thread.
+
+    Args:
+        episode (int):
+            Number of episodes completed
+        epsilon, best_avg_score:
+            Training loop state
+        metrics_rows (int):
+            Rows in the (append-only) metrics store, which is cut back to this on resume
+        policy_network, target_network (Sequential):
+            Networks to save
+        optimizer (Optimizer):
+            Optimizer of the policy network
+        memory_buffer (ReplayBuffer):
+            Replay buffer to snapshot (PrioritizedReplayBuffer priorities included)
+        seconds (float):
+            Training time so far, summed over resumed runs (for the scheduler's time budget)
+        action_rng (tf.random.Generator):
+            Exploration generator of the utils.ActionSelector
+        env_rng (Generator):
+            The env's generator of days & start temperatures (None for an unseeded env)
+
+    Returns:
+        snapshot (dict):
+            To pass to Checkpointer.save
+    """
+
+    replay = np.empty(memory_buffer.capacity, dtype = replay_dtype(memory_buffer))
+    for name, field in zip(replay.dtype.names, memory_buffer.fields()):
+        replay[name] = field
+
+    state = {
+        "episode": episode,
+        "epsilon": float(epsilon),
+        "best_avg_score": float(best_avg_score),
+        "metrics_rows": int(metrics_rows),
+        "seconds": float(seconds),
+        "action_rng": None if action_rng is None else action_rng.state.numpy().tolist(),
+        "env_rng": None if env_rng is None else env_rng.bit_generator.state,
+        "replay": {
+            "pos": memory_buffer.pos,
+            "size": memory_buffer.size,
+            "count": memory_buffer.count,
+            "rng": memory_buffer.rng.bit_generator.state,
+        },
+    }
+    arrays = {
+        "networks": {
+            **{f"policy_{i}": w for i, w in enumerate(policy_network.get_weights())},
+            **{f"target_{i}": w for i, w in enumerate(target_network.get_weights())},
+        },
+        "optimizer": {f"var_{i}": np.array(v) for i, v in enumerate(optimizer.variables)},
+        "replay": replay,
+    }
+    if hasattr(memory_buffer, "tree"):
+        arrays["priorities"] = memory_buffer.tree.priorities(np.arange(memory_buffer.capacity))
+        state["replay"].update(beta = memory_buffer.beta, max_priority = float(memory_buffer.max_priority))
+
+    return {"state": state, "arrays": arrays}
+
+def write_checkpoint(path, snapshot):
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors = True)
+    os.makedirs(tmp_path)
+
+    for name, array in snapshot["arrays"].items():
+        if isinstance(array, dict):
+            np.savez(os.path.join(tmp_path, f"{name}.npz"), **array)
+        else:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    with open(os.path.join(tmp_path, "state.json"), "w") as file:
+        json.dump(snapshot["state"], file)
+
+    shutil.rmtree(path, ignore_errors = True)
+    os.rename(tmp_path, path)
+
+def list_checkpoints(checkpoint_dir):
+    """
+    Returns the complete checkpoints in checkpoint_dir, oldest first
+    """
+
+    if not os.path.isdir(checkpoint_dir):
+        return []
+    names = [name for name in os.listdir(checkpoint_dir) if name.startswith(PREFIX) and name[len(PREFIX):].isdigit()]
+
+    return [os.path.join(checkpoint_dir, name) for name in sorted(names, key = lambda name: int(name[len(PREFIX):]))]
+
+def latest_checkpoint(checkpoint_dir):
+    checkpoints = list_checkpoints(checkpoint_dir)
+
+    return checkpoints[-1] if checkpoints else None
+
+class Checkpointer():
+    """
+    Writes snapshots on a background thread & keeps the `keep` most recent checkpoints.
+
+    Args:
+        checkpoint_dir (str):
+            Directory checkpoints are written to
+        keep (int):
+            Number of checkpoints kept; older ones are deleted after each write
+    """
+
+    def __init__(self, checkpoint_dir, keep = 3):
+
+        self.checkpoint_dir = checkpoint_dir
+        self.keep = keep
+        self.queue = queue.Queue()
+        self.error = None
+        os.makedirs(checkpoint_dir, exist_ok = True)
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                write_checkpoint(os.path.join(self.checkpoint_dir, f"{PREFIX}{item['state']['episode']}"), item)
+                for path in list_checkpoints(self.checkpoint_dir)[:-self.keep]:
+                    shutil.rmtree(path, ignore_errors = True)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing a checkpoint failed") from error
+
+    def save(self, snapshot):
+        """
+        Queues a snapshot (see snapshot()) for writing & returns straight away
+        """
+
+        self.check()
+        self.queue.put(snapshot)
+
+    def wait(self):
+        """
+        Blocks until every queued checkpoint has been written
+        """
+
+        self.queue.join()
+        self.check()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.check()
+
+def load_checkpoint(path):
+    """
+    Reads a checkpoint written by Checkpointer. The replay snapshot is memory-mapped, so only the pages
+    that are used get read.
+
+    Returns:
+        checkpoint (dict):
+            "state" (dict from state.json), "policy_weights", "target_weights" & "optimizer" (lists of arrays),
+            "replay" (structured memmap) & "priorities" (prioritized replay only)
+    """
+
+    with open(os.path.join(path, "state.json")) as file:
+        checkpoint = {"state": json.load(file)}
+    with np.load(os.path.join(path, "networks.npz")) as networks:
+        num_layers = len(networks.files) // 2
+        checkpoint["policy_weights"] = [networks[f"policy_{i}"] for i in range(num_layers)]
+        checkpoint["target_weights"] = [networks[f"target_{i}"] for i in range(num_layers)]
+    with np.load(os.path.join(path, "optimizer.npz")) as optimizer:
+        checkpoint["optimizer"] = [optimizer[f"var_{i}"] for i in range(len(optimizer.files))]
+    checkpoint["replay"] = np.load(os.path.join(path, "replay.npy"), mmap_mode = "r")
+    if os.path.exists(os.path.join(path, "priorities.npy")):
+        checkpoint["priorities"] = np.load(os.path.join(path, "priorities.npy"))
+
+    return checkpoint
+
+def restore_replay(memory_buffer, checkpoint):
+    """
+    Copies a checkpoint's replay snapshot (and priorities) into memory_buffer, which must have the same capacity
+    """
+
+    replay, state = checkpoint["replay"], checkpoint["state"]["replay"]
+    if len(replay) != memory_buffer.capacity:
+        raise ValueError(f"Checkpoint replay holds {len(replay)} experiences, the buffer {memory_buffer.capacity}")
+
+    for name, field in zip(replay.dtype.names, memory_buffer.fields()):
+        field[...] = replay[name]
+    memory_buffer.pos, memory_buffer.size, memory_buffer.count = state["pos"], state["size"], state["count"]
+    memory_buffer.rng.bit_generator.state = state["rng"]
+
+    if "priorities" in checkpoint and hasattr(memory_buffer, "tree"):
+        memory_buffer.tree.update(np.arange(memory_buffer.capacity), checkpoint["priorities"])
+        memory_buffer.beta, memory_buffer.max_priority = state["beta"], state["max_priority"]
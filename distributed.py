@@ -0,0 +1,269 @@
+"""
+Multi-process actor/learner training (python training.py --distributed).
+
+Actors are separate Python processes that only import the simulation core, never TensorFlow. Each one
+runs RoomSimulator episodes with a NumpyPolicy copy of the policy network and writes its transitions & each
+episode's score & length into its own shared-memory ring. The learner (training.py) drains the rings into its replay buffer,
+runs agent_learn and periodically publishes new weights & epsilon through a shared-memory broadcast block.
+The learner also publishes an env-step limit, so actors can't run ahead of learning by more than a fixed lead.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from env import RoomSimulator
+from inference import NumpyPolicy
+
+# transition row layout in the actor rings
+STATE, ACTION, REWARD, NEW_STATE, DONE = range(5)
+
+class SharedBlock():
+    """
+    Named shared memory holding NumPy arrays laid out back to back.
+
+    Args:
+        layout (dict):
+            name -> (shape, dtype) of each array
+        name (str):
+            Name of an existing block to attach to. If None, a new zeroed block is created & owned,
+            i.e. unlinked on close.
+    """
+
+    def __init__(self, layout, name = None):
+
+        offsets, size = {}, 0
+        for key, (shape, dtype) in layout.items():
+            offsets[key] = size
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8 # keep 8-byte alignment
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create = True, size = max(size, 8))
+        else:
+            self.shm = shared_memory.SharedMemory(name = name)
+            # only the owner may unlink the block; stop this process's tracker doing it on exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.name = self.shm.name
+
+        self.arrays = {
+            key: np.ndarray(shape, dtype = dtype, buffer = self.shm.buf, offset = offsets[key])
+            for key, (shape, dtype) in layout.items()
+        }
+        if self.owner:
+            for array in self.arrays.values():
+                array[...] = 0
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays = None # views must go before the buffer can be released
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def broadcast_layout(num_params):
+    # header = [weights version (odd while being written), stop flag, env steps allowed per actor]
+    return {"header": ((3,), np.int64), "epsilon": ((1,), np.float64), "weights": ((num_params,), np.float32)}
+
+def channel_layout(capacity, episode_capacity):
+    # counters = [transitions written, episodes written, env steps]; episodes = [score, env steps] rows
+    return {
+        "counters": ((3,), np.int64),
+        "transitions": ((capacity, 5), np.float32),
+        "episodes": ((episode_capacity, 2), np.float64),
+    }
+
+def unflatten(flat, shapes):
+    weights, start = [], 0
+    for shape in shapes:
+        stop = start + int(np.prod(shape))
+        weights.append(flat[start:stop].reshape(shape))
+        start = stop
+
+    return weights
+
+class ActorPool():
+    """
+    Learner-side handle on N actor processes.
+
+    Args:
+        num_actors (int):
+            Number of actor processes
+        weight_shapes (list):
+            Shapes of policy_network.get_weights()
+        env_kwargs (dict):
+            heating_power, loss_coefficient & reward_mech passed to each actor's RoomSimulator
+        actor_sync_steps (int):
+            Actors pick up newly published weights at most every this many env steps
+        capacity (int):
+            Transitions held by each actor's ring before the oldest unread ones are overwritten
+        seed (int):
+            Actor i seeds its env & exploration with seed + i
+    """
+
+    def __init__(self, num_actors, weight_shapes, env_kwargs, actor_sync_steps = 96, capacity = 1 << 16,
+                 seed = 0):
+
+        self.num_actors = num_actors
+        self.weight_shapes = [tuple(shape) for shape in weight_shapes]
+        num_params = sum(int(np.prod(shape)) for shape in self.weight_shapes)
+        self.broadcast = SharedBlock(broadcast_layout(num_params))
+        self.channels = [SharedBlock(channel_layout(capacity, capacity)) for _ in range(num_actors)]
+        self.capacity = capacity
+        self.transitions_read = np.zeros(num_actors, dtype = np.int64)
+        self.episodes_read = np.zeros(num_actors, dtype = np.int64)
+        self.dropped = 0 # transitions overwritten before the learner drained them
+        self.processes = []
+
+        self.config = {
+            "broadcast": self.broadcast.name,
+            "num_params": num_params,
+            "weight_shapes": self.weight_shapes,
+            "capacity": capacity,
+            "env_kwargs": env_kwargs,
+            "actor_sync_steps": actor_sync_steps,
+            "seed": seed,
+        }
+
+    def start(self):
+        for i, channel in enumerate(self.channels):
+            config = dict(self.config, channel = channel.name, actor_id = i)
+            self.processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), json.dumps(config)]))
+
+    def publish(self, weights):
+        """
+        Publishes new policy weights (seqlock: the version is odd while the weights are being written)
+        """
+
+        header = self.broadcast["header"]
+        header[0] += 1
+        self.broadcast["weights"][:] = np.concatenate([np.ravel(w) for w in weights])
+        header[0] += 1
+
+    def set_epsilon(self, epsilon):
+        self.broadcast["epsilon"][0] = epsilon
+
+    def set_step_limit(self, total_steps):
+        """
+        Lets the actors take up to total_steps env steps between them
+        """
+
+        self.broadcast["header"][2] = -(-total_steps // self.num_actors)
+
+    def env_steps(self):
+        return int(sum(channel["counters"][2] for channel in self.channels))
+
+    def drain(self):
+        """
+        Returns every transition written since the last drain as arrays
+        (states, actions, rewards, new_states, done_vals), or None if there are none
+        """
+
+        rows = []
+        for i, channel in enumerate(self.channels):
+            written = int(channel["counters"][0])
+            start = max(self.transitions_read[i], written - self.capacity)
+            self.dropped += start - self.transitions_read[i]
+            if written > start:
+                rows.append(channel["transitions"][np.arange(start, written) % self.capacity])
+            self.transitions_read[i] = written
+
+        if not rows:
+            return None
+        rows = np.concatenate(rows)
+
+        return (rows[:, STATE], rows[:, ACTION].astype(np.int32), rows[:, REWARD], rows[:, NEW_STATE],
+                rows[:, DONE].astype(np.uint8))
+
+    def drain_episodes(self):
+        """
+        Returns (score, env steps) of every episode finished since the last call
+        """
+
+        episodes = []
+        for i, channel in enumerate(self.channels):
+            written = int(channel["counters"][1])
+            if written > self.episodes_read[i]:
+                rows = channel["episodes"][np.arange(self.episodes_read[i], written) % self.capacity]
+                episodes.extend((float(score), int(steps)) for score, steps in rows)
+            self.episodes_read[i] = written
+
+        return episodes
+
+    def close(self, timeout = 10):
+        self.broadcast["header"][1] = 1
+        for process in self.processes:
+            try:
+                process.wait(timeout = timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for block in [self.broadcast, *self.channels]:
+            block.close()
+
+def run_actor(config):
+    """
+    Actor process: runs epsilon-greedy episodes until the learner raises the stop flag (or exits)
+    """
+
+    broadcast = SharedBlock(broadcast_layout(config["num_params"]), name = config["broadcast"])
+    channel = SharedBlock(channel_layout(config["capacity"], config["capacity"]), name = config["channel"])
+    header, counters = broadcast["header"], channel["counters"]
+    transitions, episodes, capacity = channel["transitions"], channel["episodes"], config["capacity"]
+
+    seed = config["seed"] + config["actor_id"]
+    rng = np.random.default_rng(seed)
+    env = RoomSimulator(**config["env_kwargs"])
+    num_actions = env.action_space.n
+    parent = os.getppid()
+
+    policy, version = None, -1
+    state = env.reset(seed = seed)
+    episode_steps = 0
+    while not header[1] and os.getppid() == parent:
+
+        # pick up new weights?
+        if policy is None or counters[2] % config["actor_sync_steps"] == 0:
+            latest = int(header[0])
+            if latest != version and latest % 2 == 0:
+                flat = broadcast["weights"].copy()
+                if int(header[0]) == latest:
+                    policy, version = NumpyPolicy(unflatten(flat, config["weight_shapes"])), latest
+            if policy is None:
+                time.sleep(0.01)
+                continue
+
+        # wait for the learner to catch up
+        if counters[2] >= header[2]:
+            time.sleep(0.0005)
+            continue
+
+        # epsilon-greedy strategy
+        if rng.random() < broadcast["epsilon"][0]:
+            action = int(rng.integers(num_actions))
+        else:
+            action = int(policy(state)[0])
+
+        # take action & store transition
+        new_state, reward, done, info = env.step(action)
+        transitions[counters[0] % capacity] = (state, action, reward, new_state, done)
+        counters[0] += 1
+        counters[2] += 1
+        episode_steps += 1
+        state = new_state
+
+        if done:
+            episodes[counters[1] % capacity] = (env.score, episode_steps)
+            counters[1] += 1
+            state, episode_steps = env.reset(), 0
+
+    broadcast.close()
+    channel.close()
+
+if __name__ == "__main__":
+    run_actor(json.loads(sys.argv[1]))
@@ -0,0 +1,339 @@
+"""
+Ensemble training: M independent DQN agents (different seeds or hyperparameters) trained in one process.
+The agents' networks are stacked along a leading agent axis, so one batched matmul runs every agent's forward
+pass, and agent m plays rooms [m*K, (m+1)*K) of one VectorRoomSimulator, so all M x K rooms step together.
+Each agent keeps its own replay slice, target network, epsilon & Adam state, and the whole ensemble takes its
+gradient step, Adam update & soft target update in a single compiled call. Run from the repository root, e.g.
+
+    python ensemble.py --agents 8 --episodes 500                               # seed-variance study
+    python ensemble.py --agents 4 --rooms 4 --alpha 1e-3 3e-4 --gamma 0.99 0.995  # values cycle over agents
+
+Every agent's final network is saved as <save_dir>/agent-<m>.npz (see inference.NumpyPolicy) & scored on the
+scheduler's evaluation days; per-agent episode scores go to the metrics store <save_dir>/metrics.
+"""
+
+from settings_training import *
+from env import VectorRoomSimulator
+from evaluate import evaluate_policy
+from inference import NumpyPolicy
+from metrics import MetricsStore, RollingStats
+import json
+
+# hyperparameters that may differ between agents; the others must be the same for the whole ensemble
+PER_AGENT = ["alpha", "gamma", "tau", "epsilon", "e_min", "e_decay", "double_dqn"]
+SHARED = ["reward_mech", "memory", "batch_size", "num_steps_upd", "num_episodes", "avg_frequency", "eval_days", "eval_seed"]
+
+# Adam constants (Keras defaults)
+BETA_1 = 0.9
+BETA_2 = 0.999
+ADAM_EPSILON = 1e-7
+
+def init_stacked(num_agents, sizes, seed = None, stream = 0):
+    """
+    Returns [kernel, bias, ...] for every agent stacked on a leading axis: kernels of shape
+    (num_agents, fan_in, fan_out), Glorot-uniform like Keras' Dense, & zero biases of shape (num_agents, 1, fan_out).
+    Agent m draws its kernels from (seed, m, stream), so e.g. policy & target networks can use different streams.
+    """
+
+    rngs = [np.random.default_rng(None if seed is None else [seed, m, stream]) for m in range(num_agents)]
+    weights = []
+    for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+        limit = np.sqrt(6 / (fan_in + fan_out))
+        weights.append(np.stack([rng.uniform(-limit, limit, (fan_in, fan_out)) for rng in rngs]).astype(np.float32))
+        weights.append(np.zeros((num_agents, 1, fan_out), dtype = np.float32))
+
+    return weights
+
+def stacked_q_values(weights, states):
+    """
+    Forward pass of every agent's network at once
+
+    Args:
+        weights (list):
+            Stacked [kernel, bias, ...], see init_stacked
+        states (Tensor):
+            States of shape (num_agents, batch, state_size)
+
+    Returns:
+        q_values (Tensor):
+            Of shape (num_agents, batch, num_outputs)
+    """
+
+    x = states
+    for i in range(0, len(weights) - 2, 2):
+        x = tf.nn.relu(tf.matmul(x, weights[i]) + weights[i + 1])
+
+    return tf.matmul(x, weights[-2]) + weights[-1]
+
+class EnsembleReplay():
+    """
+    One ring buffer of experiences per agent, held as (num_agents, capacity, ...) arrays. Every agent appends
+    the same number of experiences per step (one per room), so the agents share a write position, but each
+    samples its mini-batches from its own slice only.
+
+    Args:
+        num_agents (int):
+            Number of agents
+        capacity (int):
+            Experiences kept per agent
+        state_shape (tuple):
+            Shape of one state
+        seed (int):
+            Optional seed for sampling
+    """
+
+    def __init__(self, num_agents, capacity, state_shape = (1,), seed: Optional[int] = None):
+
+        self.num_agents = num_agents
+        self.capacity = capacity
+        self.states = np.zeros((num_agents, capacity, *state_shape), dtype = np.float32)
+        self.actions = np.zeros((num_agents, capacity), dtype = np.int32)
+        self.rewards = np.zeros((num_agents, capacity), dtype = np.float32)
+        self.new_states = np.zeros((num_agents, capacity, *state_shape), dtype = np.float32)
+        self.done_vals = np.zeros((num_agents, capacity), dtype = np.float32)
+        self.agents = np.arange(num_agents)[:, None]
+
+        self.pos = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def append_batch(self, states, actions, rewards, new_states, done_vals):
+        """
+        Appends K experiences per agent; every argument has a leading (num_agents, K) shape
+        """
+
+        num_new = np.shape(actions)[1]
+        idx = (self.pos + np.arange(num_new)) % self.capacity
+        self.states[:, idx] = states
+        self.actions[:, idx] = actions
+        self.rewards[:, idx] = rewards
+        self.new_states[:, idx] = new_states
+        self.done_vals[:, idx] = done_vals
+        self.pos = (self.pos + num_new) % self.capacity
+        self.size = min(self.size + num_new, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Returns (states, actions, rewards, new_states, done_vals), each with a leading (num_agents, batch_size)
+        shape, every agent's mini-batch drawn uniformly from its own experiences
+        """
+
+        idx = self.rng.integers(self.size, size = (self.num_agents, batch_size))
+
+        return (self.states[self.agents, idx], self.actions[self.agents, idx], self.rewards[self.agents, idx],
+                self.new_states[self.agents, idx], self.done_vals[self.agents, idx])
+
+class EnsembleTrainer():
+    """
+    Args:
+        configs (list):
+            One TrainingConfig per agent. The PER_AGENT fields may differ between agents, the SHARED ones
+            must not; prioritized replay, n-step returns & the fused learner aren't supported.
+        rooms_per_agent (int):
+            Rooms each agent plays per step (K)
+        heating_power, loss_coefficient:
+            See RoomSimulator; the reward mechanism is the configs' reward_mech
+        seed (int):
+            Seeds network initialisation, exploration, replay sampling & the rooms
+        save_dir (str):
+            Where the agents' networks & metrics go
+    """
+
+    def __init__(self, configs, rooms_per_agent = 1, heating_power = 0.5, loss_coefficient = 0.04, seed = 0,
+                 save_dir = "ensemble_outputs"):
+
+        for name in SHARED:
+            if len({getattr(config, name) for config in configs}) > 1:
+                raise ValueError(f"{name} must be the same for every agent of an ensemble")
+        if any(config.prioritized_replay or config.n_step > 1 or config.fused_updates for config in configs):
+            raise ValueError("Ensembles sample one-step experiences uniformly: prioritized_replay, n_step > 1 & fused_updates aren't supported")
+
+        self.configs = configs
+        self.config = configs[0]
+        self.num_agents = len(configs)
+        self.rooms_per_agent = rooms_per_agent
+        self.seed = seed
+        self.env = VectorRoomSimulator(self.num_agents * rooms_per_agent, heating_power, loss_coefficient,
+                                       reward_mech = self.config.reward_mech)
+        self.replay = EnsembleReplay(self.num_agents, self.config.memory, seed = seed)
+        self.save_dir = save_dir
+        os.makedirs(save_dir, exist_ok = True)
+
+        # per-agent hyperparameters, shaped to broadcast against the stacked weights
+        def per_agent(name, dtype = np.float32):
+            return np.array([getattr(config, name) for config in configs], dtype = dtype)
+        self.epsilon = per_agent("epsilon", np.float64)
+        self.e_min = per_agent("e_min", np.float64)
+        self.e_decay = per_agent("e_decay", np.float64)
+        self.alpha = tf.constant(per_agent("alpha")[:, None, None])
+        self.gamma = tf.constant(per_agent("gamma")[:, None])
+        self.tau = tf.constant(per_agent("tau")[:, None, None])
+        self.double = tf.constant(per_agent("double_dqn", bool)[:, None])
+        self.any_double = bool(per_agent("double_dqn", bool).any())
+
+        # stacked networks & Adam slots
+        weights = init_stacked(self.num_agents, [1, 64, 64, 3], seed)
+        self.weights = [tf.Variable(w) for w in weights]
+        self.target_weights = [tf.Variable(w) for w in init_stacked(self.num_agents, [1, 64, 64, 3], seed, stream = 1)]
+        self.m = [tf.Variable(tf.zeros_like(w)) for w in weights]
+        self.v = [tf.Variable(tf.zeros_like(w)) for w in weights]
+        self.iterations = tf.Variable(0.0)
+        self.rng = tf.random.Generator.from_seed(seed) if seed is not None else tf.random.Generator.from_non_deterministic_state()
+
+        self.metrics_store = MetricsStore(join(save_dir, 'metrics'), {
+            "episode": np.int64, "agent": np.int64, "score": np.float64, "epsilon": np.float64, "loss": np.float64,
+        }, chunk_rows = 64 * self.num_agents)
+
+    @tf.function
+    def act(self, states, epsilon):
+        """
+        Epsilon-greedy actions of shape (num_agents, K) for states of shape (num_agents, K, 1), with one
+        epsilon per agent. Exploration picks between the env's 2 actions, like utils.ActionSelector.
+        """
+
+        greedy = tf.argmax(stacked_q_values(self.weights, states), axis = -1, output_type = tf.int32)
+        shape = tf.shape(greedy)
+        explore = self.rng.uniform(shape) < epsilon[:, None]
+
+        return tf.where(explore, self.rng.uniform(shape, maxval = 2, dtype = tf.int32), greedy)
+
+    @tf.function
+    def update(self, states, actions, rewards, new_states, done_vals):
+        """
+        One gradient step (each agent on its own mini-batch & loss), Adam update with per-agent learning rates
+        & soft target update for the whole ensemble
+
+        Returns:
+            losses (Tensor):
+                Each agent's loss before the step, of shape (num_agents,)
+        """
+
+        with tf.GradientTape() as tape:
+            q_values = tf.gather(stacked_q_values(self.weights, states), actions, batch_dims = 2)
+            next_q = stacked_q_values(self.target_weights, new_states)
+            q_msa = tf.reduce_max(next_q, axis = -1)
+            if self.any_double:
+                next_actions = tf.argmax(stacked_q_values(self.weights, new_states), axis = -1, output_type = tf.int32)
+                q_msa = tf.where(self.double, tf.gather(next_q, next_actions, batch_dims = 2), q_msa)
+            targets = tf.stop_gradient(rewards + self.gamma * (1 - done_vals) * q_msa)
+            losses = tf.reduce_mean(tf.square(targets - q_values), axis = 1)
+            # agents share no weights, so the gradient of the sum is each agent's own gradient
+            loss = tf.reduce_sum(losses)
+
+        gradients = tape.gradient(loss, self.weights)
+
+        self.iterations.assign_add(1.0)
+        step_size = self.alpha * tf.sqrt(1 - BETA_2 ** self.iterations) / (1 - BETA_1 ** self.iterations)
+        for w, target, m, v, g in zip(self.weights, self.target_weights, self.m, self.v, gradients):
+            m.assign_add((g - m) * (1 - BETA_1))
+            v.assign_add((tf.square(g) - v) * (1 - BETA_2))
+            w.assign_sub(step_size * m / (tf.sqrt(v) + ADAM_EPSILON))
+            target.assign(self.tau * w + (1 - self.tau) * target)
+
+        return losses
+
+    def agent_weights(self, m):
+        """
+        Agent m's network as a NumpyPolicy weight list [kernel, bias, ...]
+        """
+
+        return [w.numpy()[m] if i % 2 == 0 else w.numpy()[m, 0] for i, w in enumerate(self.weights)]
+
+    def train(self, num_episodes = None):
+        """
+        Trains every agent for num_episodes days (each played in its K rooms) & evaluates them
+
+        Args:
+            num_episodes (int):
+                Days played (default: the configs' num_episodes)
+
+        Returns:
+            results (list):
+                evaluate.evaluate_policy's result for each agent
+        """
+
+        config, env = self.config, self.env
+        num_agents, rooms = self.num_agents, self.rooms_per_agent
+        num_episodes = config.num_episodes if num_episodes is None else num_episodes
+        score_avg = [RollingStats(config.avg_frequency) for _ in range(num_agents)]
+        self.metrics_store.truncate(0)
+
+        start_time = time.time()
+        state = env.reset(seed = self.seed)
+        for ep in range(num_episodes):
+            losses = []
+
+            for i in range(1, len(env.num_timesteps)+1):
+                states = state.reshape(num_agents, rooms, 1).astype(np.float32)
+                actions = self.act(states, self.epsilon.astype(np.float32)).numpy()
+                state, reward, done, info = env.step(actions.ravel())
+
+                # the last step auto-resets the rooms, so store the day's final state
+                new_states = info.get("final_observation", state).reshape(num_agents, rooms, 1)
+                self.replay.append_batch(states, actions, reward.reshape(num_agents, rooms), new_states,
+                                         done.reshape(num_agents, rooms))
+
+                if i % config.num_steps_upd == 0 and len(self.replay) >= config.batch_size:
+                    losses.append(self.update(*self.replay.sample(config.batch_size)))
+
+            # each agent's score is the mean over its rooms
+            scores = info["final_score"].reshape(num_agents, rooms).mean(axis = 1)
+            mean_losses = tf.reduce_mean(tf.stack(losses), axis = 0).numpy() if losses else np.full(num_agents, np.nan)
+            for m in range(num_agents):
+                score_avg[m].append(scores[m])
+                self.metrics_store.append({"episode": ep + 1, "agent": m, "score": scores[m],
+                                           "epsilon": self.epsilon[m], "loss": mean_losses[m]})
+            self.epsilon = np.maximum(self.epsilon * self.e_decay, self.e_min)
+
+            if (ep + 1) % config.avg_frequency == 0:
+                averages = np.array([stats.mean() for stats in score_avg])
+                print(f'Episode {ep + 1}: Average Reward over the last {config.avg_frequency} episodes: '
+                      f'{averages.mean():.2f} +/- {averages.std():.2f} over {num_agents} agents (best {averages.max():.2f})')
+
+        self.metrics_store.close()
+        print(f"Training {num_agents} agents x {rooms} rooms for {num_episodes} episodes took {(time.time() - start_time)/60:.1f} minutes")
+
+        # save & evaluate every agent
+        eval_env = VectorRoomSimulator(config.eval_days, env.h, env.l, reward_mech = env.reward_mech)
+        results = []
+        for m, agent_config in enumerate(self.configs):
+            policy = NumpyPolicy(self.agent_weights(m))
+            policy.save(join(self.save_dir, f"agent-{m}.npz"))
+            results.append({"agent": m, **agent_config.overrides(), **evaluate_policy(policy, eval_env, config.eval_seed)})
+        with open(join(self.save_dir, "results.json"), "w") as file:
+            json.dump(results, file, indent = 2)
+
+        return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Train an ensemble of DQN agents with stacked networks")
+    parser.add_argument("--agents", type = int, default = 8)
+    parser.add_argument("--rooms", type = int, default = 1, help = "rooms each agent plays per step")
+    parser.add_argument("--episodes", type = int, default = num_episodes)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--reward-mech", choices = ["V1", "V2"], default = REWARD_MECH)
+    parser.add_argument("--save-dir", default = "ensemble_outputs")
+    for name in ["alpha", "gamma", "tau", "e_decay"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type = float, nargs = "+", help = "values cycled over the agents")
+    args = parser.parse_args()
+
+    configs = []
+    for m in range(args.agents):
+        overrides = {name: values[m % len(values)] for name in ["alpha", "gamma", "tau", "e_decay"]
+                     if (values := getattr(args, name)) is not None}
+        configs.append(TrainingConfig(num_episodes = args.episodes, reward_mech = args.reward_mech, **overrides))
+
+    trainer = EnsembleTrainer(configs, args.rooms, seed = args.seed, save_dir = args.save_dir)
+    results = trainer.train()
+
+    print(f"{'agent':>5} {'mean':>7} {'in band':>8} {'duty':>6}  settings")
+    for result in results:
+        settings = {key: value for key, value in result.items() if key in PER_AGENT}
+        print(f"{result['agent']:5d} {result['mean_score']:7.2f} {result['band_occupancy']:8.1%} {result['duty_cycle']:6.1%}  {settings}")
+    scores = np.array([result["mean_score"] for result in results])
+    print(f"Evaluated score {scores.mean():.2f} +/- {scores.std():.2f} over {len(scores)} agents")
@@ -1,6 +1,99 @@
 from settings import *
 from weather import *
 
+def import_pygame():
+    """
+    Imports pygame into this module on first use, so that simulating rooms never pays for it
+    """
+
+    global pygame
+    try:
+        import pygame
+    except ImportError:
+        raise DependencyNotInstalled(
+            "pygame is not installed, run `pip install pygame`"
+        )
+
+def control_steps(dt, action_repeat):
+    """
+    Checks a control timestep & returns the number of dt-minute sub-steps in a day
+    """
+
+    if int(dt) != dt or dt <= 0 or (n * 15) % dt != 0:
+        raise ValueError(f"dt must be a whole number of minutes dividing the day, e.g. 1, 5 or 15, not {dt}")
+    steps = n * 15 // int(dt)
+    if action_repeat < 1 or steps % action_repeat != 0:
+        raise ValueError(f"action_repeat must divide the {steps} dt-minute steps of a day")
+
+    return steps
+
+def fine_grid(values, dt, hold = False):
+    """
+    Resamples a day of 15-minute values, of shape (..., n), onto a dt-minute grid of shape (..., n * 15 // dt).
+    Outdoor temperatures are interpolated linearly between the 15-minute points; setpoints, which change in
+    steps, are held (hold = True). Point j of the grid is the value at the start of sub-step j.
+    """
+
+    minutes = np.arange(n * 15 // int(dt)) * int(dt)
+    low = minutes // 15
+    if hold:
+        return np.asarray(values)[..., low]
+    high = np.minimum(low + 1, n - 1)
+    frac = (minutes % 15) / 15
+
+    return np.asarray(values)[..., low] * (1 - frac) + np.asarray(values)[..., high] * frac
+
+def exact_rc(heating_power, loss_coefficient, dt, action_repeat = 1):
+    """
+    Coefficients of the exact solution of the room's RC model over dt-minute sub-steps.
+
+    The 15-minute update T += h*a + l*(To - T) is exact for dT/dt = (To + (h/l)*a - T) / RC with
+    exp(-15 / RC) = 1 - l, so over dt minutes with To & a held constant
+
+        T -> Tss + (T - Tss) * decay,  Tss = To + rise * a,  decay = (1 - l)^(dt / 15),  rise = h / l
+
+    Returns:
+        rise (float):
+            Steady-state temperature rise with the heater on
+        powers (ndarray):
+            decay^(j+1) for each of the action_repeat sub-steps j, see rc_substeps
+        weights (ndarray):
+            (action_repeat, action_repeat) lower triangular matrix, see rc_substeps
+    """
+
+    if not 0 < loss_coefficient < 1:
+        raise ValueError("The exact RC update needs 0 < loss_coefficient < 1")
+    decay = (1 - loss_coefficient) ** (dt / 15)
+    j = np.arange(action_repeat)
+    lag = j[:, None] - j[None, :]
+    weights = np.where(lag >= 0, (1 - decay) * decay ** np.maximum(lag, 0), 0.0)
+
+    return heating_power / loss_coefficient, decay ** (j + 1), weights
+
+def rc_substeps(state, steady_state, powers, weights):
+    """
+    Room temperatures after each of r exact sub-steps in one array expression, no loop over sub-steps:
+
+        T_j = decay^j * T_0 + sum_{k<j} (1 - decay) * decay^(j-1-k) * Tss_k
+
+    Args:
+        state (ndarray):
+            Room temperatures of shape (...)
+        steady_state (ndarray):
+            Steady-state temperature of each sub-step, To + rise * a, of shape (..., r)
+        powers, weights (ndarray):
+            From exact_rc
+
+    Returns:
+        temps (ndarray):
+            Temperatures after each sub-step, of shape (..., r)
+    """
+
+    temps = steady_state @ weights.T
+    temps += np.asarray(state)[..., None] * powers
+
+    return temps
+
 class RoomSimulator(Env):
     """
     ### Parameters
@@ -8,7 +101,12 @@ class RoomSimulator(Env):
     heating_power: Number of degC the room's temperature goes up by in 15 minutes, if the heating is on, given no heat loss to surroundings (ideal value = 0.5).\n
     loss_coefficient: Given a temperature difference of 10C between inside and outside, the loss coefficient describes the number of degC the room's temperature drops by within 15 minutes. \n
     reward_mech: "V1" uses a reward mechanism with three bands. "V2" uses a reward mechanism with one band (see step module for more details)
-    render_mode: "human" 
+    render_mode: "human" or "rgb_array" (headless, render returns the frame) \n
+    weather_bank: Optional WeatherBank. If given, each reset picks a day from the bank instead of generating a new OutdoorTemp.\n
+    dt: Physics timestep in minutes (default 15). Any other value uses the exact solution of the room's RC model
+    (see exact_rc) on a dt-minute grid, with the outdoor temperature interpolated & the setpoint held.\n
+    action_repeat: Number of dt-minute sub-steps each action is held for, computed together in one array
+    expression (see rc_substeps). A step then lasts dt * action_repeat minutes.
 
     ### Description
 
@@ -47,14 +145,23 @@ class RoomSimulator(Env):
     ### Episode End
 
     The episode ends when the day is over or 96 fifteen minute intervals have elapsed. 
+
+    ### Control Interval
+
+    With dt & action_repeat, the episode has 1440 / (dt * action_repeat) steps, each sub-step is rewarded
+    as above & weighted by dt / 15, so a day's score stays on the same scale. dt = 15 with action_repeat = 1
+    is the original 15-minute update; e.g. dt = 1 & action_repeat = 15 simulates minute by minute with a
+    decision every 15 minutes, dt = 1 alone makes a decision every minute.
     
     """
 
     metadata = {
+        "render_modes": ["human", "rgb_array"],
         "render_fps":12
     }
     
-    def __init__(self, heating_power, loss_coefficient, reward_mech: Optional[str] = "V1", render_mode: Optional[str] = None):
+    def __init__(self, heating_power, loss_coefficient, reward_mech: Optional[str] = "V1", render_mode: Optional[str] = None,
+                 weather_bank: Optional[WeatherBank] = None, dt = 15, action_repeat = 1):
 
         # spaces
         self.observation_space = Box(low = -20, high = 60, shape = (1,))
@@ -65,13 +172,27 @@ class RoomSimulator(Env):
         self.l = loss_coefficient
         self.reward_mech = reward_mech
         self.reward_mech_list = ["V1","V2"]
-        self.num_timesteps = np.arange(0,len(t))
+        self.valid_reward_mech = reward_mech in self.reward_mech_list
+
+        # control interval
+        self.dt = dt
+        self.action_repeat = action_repeat
+        self.num_timesteps = np.arange(control_steps(dt, action_repeat) // action_repeat)
+        self.exact = dt != 15 or action_repeat != 1
+        if self.exact:
+            self.rise, self.powers, self.weights = exact_rc(heating_power, loss_coefficient, dt, action_repeat)
         self.done = None
+        self.rng = None
+        self.weather_bank = weather_bank
+        self.day = None
 
         # render
         self.render_mode = render_mode
         self.screen = None
         self.clock = None
+        self.background = None # static chart, legend & labels
+        self.canvas = None # background + this episode's lines
+        self.drawn_timestep = 0
         
         self.black = (0,0,0)
         self.white = (255,255,255)
@@ -90,6 +211,7 @@ class RoomSimulator(Env):
         self.chart_height = 600
         self.origin = (140, 660)
         self.xtick = 11.6665 # pixels/15min
+        self.step_xtick = self.xtick * dt * action_repeat / 15 # pixels/step
         self.ytick = 104/5 # pixels/degC   
         self.min_temp = 15
 
@@ -103,55 +225,101 @@ class RoomSimulator(Env):
 
     def step(self,action):
         
-        # update state (indoor temperature)
-        self.state += (self.h*action) + (self.l*(self.otemp[self.current_timestep] - self.state))
-        self.action = action
-
         # reward mechanism
-        if self.reward_mech in self.reward_mech_list:
-            pass
-        else:
+        if not self.valid_reward_mech:
             gym.logger.warn(
                 f"You have specified an invalid reward mechanism. Currently accepted reward mechanisms are {self.reward_mech_list}"
             ) 
             return
-        
-        if self.reward_mech == 'V1':
-            if abs(self.setpoint[int(self.current_timestep)] - self.state) <= 0.5: reward = 1
-            elif 0.5 < abs(self.setpoint[int(self.current_timestep)] - self.state) <= 1: reward = 0.6
-            elif 1 < abs(self.setpoint[int(self.current_timestep)] - self.state) <= 1.5: reward = 0.3
-            else: reward = 0
-        else: # V2
-            if abs(self.setpoint[int(self.current_timestep)] - self.state) <= 0.5: reward = 1
-            else: reward = 0
+
+        if self.exact:
+            # exact sub-steps, the action held throughout
+            steady_state = self.otemp_blocks[self.current_timestep] + self.rise * action
+            temps = rc_substeps(self.state, steady_state, self.powers, self.weights)
+            self.state = float(temps[-1])
+            self.action = action
+
+            error = np.abs(self.setpoint_blocks[self.current_timestep] - temps)
+            reward = float(band_reward(error, self.reward_mech).sum()) * (self.dt / 15)
+        else:
+            # update state (indoor temperature)
+            self.state += (self.h*action) + (self.l*(self.otemp[self.current_timestep] - self.state))
+            self.action = action
+
+            error = abs(self.setpoint[self.current_timestep] - self.state)
+            if self.reward_mech == 'V1':
+                if error <= 0.5: reward = 1
+                elif error <= 1: reward = 0.6
+                elif error <= 1.5: reward = 0.3
+                else: reward = 0
+            else: # V2
+                if error <= 0.5: reward = 1
+                else: reward = 0
 
         # is the day finished?
-        if self.current_timestep == len(t) -1:
+        if self.current_timestep == len(self.num_timesteps) -1:
             self.done = True
         else:
             self.done = False
 
         # update timestep & score
         self.current_timestep += 1
-        if self.current_timestep <= 95: self.ts[self.current_timestep] = self.state
+        if self.current_timestep < len(self.ts): self.ts[self.current_timestep] = self.state
         self.score += reward
         info = {self.score}
 
         return self.state, reward, self.done, info
             
-    def reset(self):
-        
-        self.state = random.uniform(18,20)
-        self.otemp = OutdoorTemp().o_temp_summer
+    def reset(self, seed: Optional[int] = None, day: Optional[int] = None):
+        """
+        Starts a new day. Passing a seed makes this and every following (unseeded) reset reproducible:
+        RoomSimulator.reset(seed = s + i) replays sub-environment i of VectorRoomSimulator.reset(seed = s).
+        With a weather bank, day picks a specific day from the bank instead of a random one.
+        """
+
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        if self.rng is None:
+            self.state = random.uniform(18,20)
+        else:
+            self.state = self.rng.uniform(18,20)
+
+        if self.weather_bank is not None:
+            if day is None:
+                day = random.randrange(len(self.weather_bank)) if self.rng is None else self.rng.integers(len(self.weather_bank))
+            self.day = day
+            self.otemp = self.weather_bank[day]
+        elif self.rng is None:
+            self.otemp = OutdoorTemp().o_temp_summer
+        else:
+            self.otemp = OutdoorTemp(self.rng).o_temp_summer
         self.setpoint = SETPOINT_SUMMER
+        if self.exact:
+            self.fine_otemp = fine_grid(self.otemp, self.dt)
+            self.fine_setpoint = fine_grid(self.setpoint, self.dt, hold = True)
+            # setpoint at the end of each step, as drawn & used by evaluate.py
+            self.setpoint = self.fine_setpoint[self.action_repeat - 1::self.action_repeat]
+            # (step, sub-step) views
+            self.otemp_blocks = self.fine_otemp.reshape(-1, self.action_repeat)
+            self.setpoint_blocks = self.fine_setpoint.reshape(-1, self.action_repeat)
         self.current_timestep = 0
         self.score = 0
-        self.ts = np.zeros(len(t))
+        self.action = 0
+        self.ts = np.zeros(len(self.num_timesteps))
         self.ts[self.current_timestep] = self.state
+        self.canvas = None # previous episode's lines
     
         return self.state
 
     def render(self):
+        """
+        "human" draws the frame in a pygame window. "rgb_array" draws it off-screen (no display needed)
+        & returns it as an array of shape (screen_height, screen_width, 3).
+
+        The axes, labels & legend are drawn once into a cached background, and each frame only adds the
+        line segments since the last frame, so a frame costs O(1) draw calls instead of O(t).
+        """
         
         if self.render_mode is None:
             gym.logger.warn(
@@ -160,20 +328,18 @@ class RoomSimulator(Env):
             )
             return 
 
-        try:
-            import pygame
-        except ImportError:
-            raise DependencyNotInstalled(
-                "pygame is not installed, run `pip install pygame`"
-            )
+        import_pygame()
 
         if self.screen is None:
-            pygame.init()
-            pygame.display.init()
             if self.render_mode == "human":
+                pygame.init()
+                pygame.display.init()
                 self.screen = pygame.display.set_mode(
                     (self.screen_width, self.screen_height)
                 )
+            elif self.render_mode == "rgb_array":
+                pygame.font.init()
+                self.screen = pygame.Surface((self.screen_width, self.screen_height))
             else:
                 gym.logger.warn(
                     "You have specified an unknown render_mode"
@@ -183,18 +349,36 @@ class RoomSimulator(Env):
         if self.clock is None:
             self.clock = pygame.time.Clock()
         
-        # imports
-        self.font = pygame.font.Font(None, 30)
-        self.font_big = pygame.font.Font(None,40)
-        self.heater = pygame.transform.rotozoom(pygame.image.load(join('media','heater.png')).convert_alpha(),0,0.1)
-        
+        # imports & static elements, loaded/drawn once
+        if self.background is None:
+            self.font = pygame.font.Font(None, 30)
+            self.font_big = pygame.font.Font(None,40)
+            heater = pygame.image.load(join(os.path.dirname(os.path.abspath(__file__)),'media','heater.png'))
+            if self.render_mode == "human": heater = heater.convert_alpha()
+            self.heater = pygame.transform.rotozoom(heater,0,0.1)
+
+            self.background = pygame.Surface((self.screen_width, self.screen_height))
+            self.background.fill(self.white)
+            self.draw_chart(self.background)
+            self.display_legend(self.background)
+
+        # lines drawn so far this episode
+        if self.canvas is None:
+            self.canvas = self.background.copy()
+            self.drawn_timestep = 0
+        self.draw_lines(self.canvas, self.drawn_timestep, self.current_timestep)
+        self.drawn_timestep = self.current_timestep
+
         # draw elements
-        self.screen.fill(self.white)
-        self.draw_chart()
-        self.draw_lines()
+        self.screen.blit(self.canvas, (0,0))
         self.display_score()
         self.display_heating_info()
-        self.display_legend()
+
+        if self.render_mode == "rgb_array":
+            # tobytes is one contiguous copy, ~4x faster than surfarray.array3d + transpose
+            frame = pygame.image.tobytes(self.screen, "RGB")
+            return np.frombuffer(frame, dtype = np.uint8).reshape(self.screen_height, self.screen_width, 3)
+
         pygame.display.update()
         
         # framerate
@@ -205,52 +389,55 @@ class RoomSimulator(Env):
     def close(self):
         import pygame
         
-        if self.screen is not None:
+        if self.screen is not None and self.render_mode == "human":
             pygame.display.quit()
             pygame.quit()
 
-    def draw_chart(self):
+    def draw_chart(self, surface):
         # chart box
         chart_rect = pygame.Rect(self.chart_xoffset,self.chart_yoffset,self.chart_width,self.chart_height)
-        pygame.draw.rect(self.screen,self.black,chart_rect,2)
+        pygame.draw.rect(surface,self.black,chart_rect,2)
     
         # time labels
         for i in range(5):
             x = self.origin[0] + i * (self.xtick*4*5)
-            pygame.draw.line(self.screen, self.black, (x, self.chart_yoffset + self.chart_height), (x, self.chart_yoffset + self.chart_height + 10))
+            pygame.draw.line(surface, self.black, (x, self.chart_yoffset + self.chart_height), (x, self.chart_yoffset + self.chart_height + 10))
             time_label = self.font.render(f'{i*5:02}:00', True, self.black)
-            self.screen.blit(time_label,(x-20, self.chart_yoffset + self.chart_height + 20))
+            surface.blit(time_label,(x-20, self.chart_yoffset + self.chart_height + 20))
 
         # temperature labels
         for i in range(6):
             y = self.origin[1] + -i * (self.ytick*5)
-            pygame.draw.line(self.screen,self.black,(100,y),(90,y))
+            pygame.draw.line(surface,self.black,(100,y),(90,y))
             temp_label = self.font.render(f"{self.min_temp+i*5}",True,self.black)
-            self.screen.blit(temp_label,(65, y-7.5))
+            surface.blit(temp_label,(65, y-7.5))
     
         y_axis_label = pygame.transform.rotate(self.font.render('Temperature (°C)', True, self.black),90)
         y_axis_label_rect = y_axis_label.get_rect(center = (self.chart_xoffset/2 - 10,self.screen_height/2))
-        self.screen.blit(y_axis_label, y_axis_label_rect)
+        surface.blit(y_axis_label, y_axis_label_rect)
 
-    def draw_lines(self):
+    def draw_lines(self, surface, start, stop):
+        """
+        Draws the setpoint & room temperature segments i -> i+1 for i in [start, stop)
+        """
+
+        stop = min(stop, len(self.ts) - 1)
 
         # setpoint
-        if self.current_timestep <= len(t) - 1:
-            for i in range(self.current_timestep):
-                x1 = self.origin[0] + self.xtick*i
-                x2 = self.origin[0] + self.xtick*(i+1)
-                y1 = self.origin[1] - ((self.setpoint[i]-self.min_temp)*self.ytick)
-                y2 = self.origin[1] - ((self.setpoint[i+1]-self.min_temp)*self.ytick)
-                pygame.draw.line(self.screen,self.setpoint_colour,(x1,y1),(x2,y2),2)
+        for i in range(start, stop):
+            x1 = self.origin[0] + self.step_xtick*i
+            x2 = self.origin[0] + self.step_xtick*(i+1)
+            y1 = self.origin[1] - ((self.setpoint[i]-self.min_temp)*self.ytick)
+            y2 = self.origin[1] - ((self.setpoint[i+1]-self.min_temp)*self.ytick)
+            pygame.draw.line(surface,self.setpoint_colour,(x1,y1),(x2,y2),2)
 
         # room temp
-        if self.current_timestep <= len(t) - 1:
-            for i in range(self.current_timestep):
-                x1 = self.origin[0] + i*self.xtick
-                x2 = self.origin[0] + (i+1)*self.xtick
-                y1 = self.origin[1] - ((self.ts[i]-self.min_temp)*self.ytick)
-                y2 = self.origin[1] - ((self.ts[i+1]-self.min_temp)*self.ytick)
-                pygame.draw.line(self.screen,self.ts_colour,(x1,y1),(x2,y2),2)
+        for i in range(start, stop):
+            x1 = self.origin[0] + i*self.step_xtick
+            x2 = self.origin[0] + (i+1)*self.step_xtick
+            y1 = self.origin[1] - ((self.ts[i]-self.min_temp)*self.ytick)
+            y2 = self.origin[1] - ((self.ts[i+1]-self.min_temp)*self.ytick)
+            pygame.draw.line(surface,self.ts_colour,(x1,y1),(x2,y2),2)
     
     def display_score(self):
         score_rect = pygame.Rect(self.rect_xoffset,self.chart_yoffset,self.rect_width,self.rect1_height)
@@ -267,7 +454,7 @@ class RoomSimulator(Env):
         pygame.draw.rect(self.screen, self.white,rect, 2)
         self.screen.blit(self.heater,heater_rect)
     
-    def display_legend(self):
+    def display_legend(self, surface):
 
         lines_xoffset = self.rect_width/2
         setpoint_lines_yoffset = 40
@@ -278,19 +465,273 @@ class RoomSimulator(Env):
         setpoint_txt = self.font.render("Setpoint",False,self.black)
         setpoint_txt_rect = setpoint_txt.get_rect(center = (self.rect_xoffset + self.rect_width/4,self.chart_height+self.chart_yoffset-setpoint_lines_yoffset))
 
-        pygame.draw.rect(self.screen, self.white,rect, 2)
-        pygame.draw.line(self.screen,self.ts_colour,(self.rect_xoffset + lines_xoffset, self.chart_height+self.chart_yoffset-self.rect1_height+setpoint_lines_yoffset), 
+        pygame.draw.rect(surface, self.white,rect, 2)
+        pygame.draw.line(surface,self.ts_colour,(self.rect_xoffset + lines_xoffset, self.chart_height+self.chart_yoffset-self.rect1_height+setpoint_lines_yoffset), 
                          (self.rect_xoffset + self.rect_width-30,self.chart_height+self.chart_yoffset-self.rect1_height+setpoint_lines_yoffset),2)
-        pygame.draw.line(self.screen,self.setpoint_colour,(self.rect_xoffset + lines_xoffset,self.chart_height+self.chart_yoffset-setpoint_lines_yoffset), 
+        pygame.draw.line(surface,self.setpoint_colour,(self.rect_xoffset + lines_xoffset,self.chart_height+self.chart_yoffset-setpoint_lines_yoffset), 
                          (self.rect_xoffset + self.rect_width-30,self.chart_height+self.chart_yoffset-setpoint_lines_yoffset),2)
-        self.screen.blit(room_txt,room_txt_rect)
-        self.screen.blit(setpoint_txt,setpoint_txt_rect)
+        surface.blit(room_txt,room_txt_rect)
+        surface.blit(setpoint_txt,setpoint_txt_rect)
     
     def pause(self):
         """
         Pauses the line chart output at the end of the day for X seconds
         """
-        if self.current_timestep == len(t) - 1:
+        if self.current_timestep == len(self.ts) - 1:
             pygame.time.delay(2000)
 
-    
\ No newline at end of file
+
+class StreamingRoomSimulator(RoomSimulator):
+    """
+    ### Parameters
+
+    heating_power, loss_coefficient, reward_mech, render_mode: see RoomSimulator.\n
+    num_days: Length of an episode in days, e.g. 7 for a week or 365 for a year.\n
+    start_day: Day of the year the episode starts on (0 = 1st January).\n
+    chunk_days: Number of days of weather & setpoints generated at a time.
+
+    ### Description
+
+    Simulates the room continuously for `num_days` days: the room temperature carries over midnight, the
+    outdoor temperature follows the seasons between its Winter & Summer ranges, and the setpoint follows
+    the schedule of the season (see `weather.seasonal_days`).
+
+    Weather & setpoints are generated lazily, `chunk_days` at a time, and only the current day's room
+    temperatures are kept (`ts` is a one-day ring buffer, which is what `render` draws), so memory use
+    doesn't grow with the horizon.
+
+    ### Episode End
+
+    The episode ends after `num_days` * 96 fifteen minute intervals. `current_timestep` counts the steps
+    of the current day & `day` is the current day of the year.
+    """
+
+    def __init__(self, heating_power, loss_coefficient, reward_mech: Optional[str] = "V1", render_mode: Optional[str] = None,
+                 num_days = 7, start_day = 0, chunk_days = 7):
+
+        super().__init__(heating_power, loss_coefficient, reward_mech, render_mode)
+        if not self.valid_reward_mech:
+            raise ValueError(
+                f"You have specified an invalid reward mechanism. Currently accepted reward mechanisms are {self.reward_mech_list}"
+            )
+
+        self.num_days = num_days
+        self.start_day = start_day
+        self.chunk_days = chunk_days
+        self.ts = np.zeros(len(t))
+
+    def step(self, action):
+
+        day_over = self.current_timestep == len(t) - 1
+        state, reward, done, info = super().step(action)
+
+        # move on to the next day, or end the episode
+        self.elapsed_steps += 1
+        self.done = self.elapsed_steps == self.num_days * len(t)
+        if day_over and not self.done:
+            self.next_day()
+
+        return state, reward, self.done, info
+
+    def reset(self, seed: Optional[int] = None, start_day: Optional[int] = None):
+        """
+        Starts a new episode on start_day (default: the start_day given at initialization). Passing a seed makes
+        this and every following (unseeded) reset reproducible.
+        """
+
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        elif self.rng is None:
+            self.rng = np.random.default_rng()
+
+        self.state = self.rng.uniform(18,20)
+        start_day = self.start_day if start_day is None else start_day
+        self.days = seasonal_days(start_day, self.num_days, self.rng, self.chunk_days)
+        self.chunk, self.chunk_pos = None, 0
+        self.day = start_day - 1
+        self.elapsed_steps = 0
+        self.score = 0
+        self.action = 0
+        self.next_day()
+
+        return self.state
+
+    def next_day(self):
+        """
+        Loads the next day's outdoor temperatures & setpoints, generating a new chunk when needed
+        """
+
+        if self.chunk is None or self.chunk_pos == len(self.chunk[0]):
+            self.chunk, self.chunk_pos = next(self.days), 0
+        self.otemp = self.chunk[0][self.chunk_pos]
+        self.setpoint = self.chunk[1][self.chunk_pos]
+        self.chunk_pos += 1
+        self.day = (self.day + 1) % DAYS_PER_YEAR
+
+        self.current_timestep = 0
+        self.ts[self.current_timestep] = self.state
+        self.canvas = None # the chart shows one day
+
+def band_reward(error, reward_mech):
+    """
+    Vectorized version of the reward bands used in RoomSimulator.step
+
+    Args:
+        error (ndarray):
+            Absolute difference between the setpoint and the room temperature
+        reward_mech (str):
+            "V1" or "V2"
+
+    Returns:
+        reward (ndarray):
+            Reward for each element of error
+    """
+
+    if reward_mech == 'V1':
+        return np.select([error <= 0.5, error <= 1, error <= 1.5], [1, 0.6, 0.3], 0)
+    else: # V2
+        return np.where(error <= 0.5, 1.0, 0.0)
+
+class VectorRoomSimulator():
+    """
+    ### Parameters
+
+    num_envs: Number of rooms stepped together.\n
+    heating_power, loss_coefficient, reward_mech, weather_bank, dt, action_repeat: see RoomSimulator.
+
+    ### Description
+
+    Steps `num_envs` independent copies of RoomSimulator in one call. Room temperature, outdoor temperature,
+    setpoint and score are held as NumPy arrays with a leading `(num_envs,)` axis, so there is no per-room
+    Python work inside `step`.
+
+    Given the same seed, sub-environment `i` produces exactly the same states & rewards as
+    `RoomSimulator.reset(seed = seed + i)` followed by the same actions.
+
+    ### Spaces
+
+    Observations, rewards & dones are `ndarray`s of shape `(num_envs,)`. Actions are an array of `{0, 1}`
+    of shape `(num_envs,)`.
+
+    ### Auto-reset
+
+    When a room's day is over it is reset straight away, and the returned observation is the first state
+    of its new day. The last state of the finished day & its score are in `info["final_observation"]`
+    and `info["final_score"]`.
+    """
+
+    def __init__(self, num_envs, heating_power, loss_coefficient, reward_mech: Optional[str] = "V1",
+                 weather_bank: Optional[WeatherBank] = None, dt = 15, action_repeat = 1):
+
+        self.reward_mech_list = ["V1","V2"]
+        if reward_mech not in self.reward_mech_list:
+            raise ValueError(
+                f"You have specified an invalid reward mechanism. Currently accepted reward mechanisms are {self.reward_mech_list}"
+            )
+
+        # spaces
+        self.num_envs = num_envs
+        self.single_observation_space = Box(low = -20, high = 60, shape = (1,))
+        self.single_action_space = Discrete(n = 2)
+        self.observation_space = Box(low = -20, high = 60, shape = (num_envs,))
+        self.action_space = MultiDiscrete(np.full(num_envs, 2))
+
+        # parameters
+        self.h = heating_power
+        self.l = loss_coefficient
+        self.reward_mech = reward_mech
+        self.rngs = None
+        self.weather_bank = weather_bank
+
+        # control interval (see RoomSimulator)
+        self.dt = dt
+        self.action_repeat = action_repeat
+        self.num_timesteps = np.arange(control_steps(dt, action_repeat) // action_repeat)
+        self.exact = dt != 15 or action_repeat != 1
+
+        # state, preallocated once
+        self.rooms = np.arange(num_envs)
+        self.base_otemp = summer_temp_profile()
+        self.state = np.zeros(num_envs)
+        self.otemp = np.zeros((num_envs, len(t)))
+        self.setpoint = SETPOINT_SUMMER
+        if self.exact:
+            self.rise, self.powers, self.weights = exact_rc(heating_power, loss_coefficient, dt, action_repeat)
+            self.fine_otemp = np.zeros((num_envs, control_steps(dt, action_repeat)))
+            self.fine_setpoint = fine_grid(SETPOINT_SUMMER, dt, hold = True)
+            self.setpoint = self.fine_setpoint[action_repeat - 1::action_repeat] # at the end of each step
+            # (room, step, sub-step) views, so a step gathers whole rows instead of single sub-steps
+            self.otemp_blocks = self.fine_otemp.reshape(num_envs, -1, action_repeat)
+            self.setpoint_blocks = self.fine_setpoint.reshape(-1, action_repeat)
+        self.current_timestep = np.zeros(num_envs, dtype = np.int64)
+        self.score = np.zeros(num_envs)
+        self.day = np.zeros(num_envs, dtype = np.int64)
+
+    def step(self, actions):
+
+        actions = np.asarray(actions)
+        self.action = actions
+        if self.exact:
+            # every room's sub-steps in one array expression, each action held throughout
+            steady_state = self.otemp_blocks[self.rooms, self.current_timestep] + self.rise * actions[:, None]
+            temps = rc_substeps(self.state, steady_state, self.powers, self.weights)
+            self.state[:] = temps[:, -1]
+            error = np.abs(self.setpoint_blocks[self.current_timestep] - temps)
+            reward = band_reward(error, self.reward_mech).sum(axis = 1) * (self.dt / 15)
+        else:
+            # update state (indoor temperature)
+            self.state += (self.h*actions) + (self.l*(self.otemp[self.rooms, self.current_timestep] - self.state))
+
+            # reward mechanism
+            reward = band_reward(np.abs(self.setpoint[self.current_timestep] - self.state), self.reward_mech)
+
+        # is the day finished?
+        done = self.current_timestep == len(self.num_timesteps) - 1
+
+        # update timestep & score
+        self.current_timestep += 1
+        self.score += reward
+        info = {}
+
+        # auto-reset finished rooms
+        if done.any():
+            idx = np.flatnonzero(done)
+            info["final_observation"] = self.state.copy()
+            info["final_score"] = self.score.copy()
+            self._reset_rooms(idx)
+
+        return self.state.copy(), reward, done, info
+
+    def reset(self, seed: Optional[int] = None, days = None):
+        """
+        Starts a new day in every room. With a weather bank, days is an optional array of shape (num_envs,)
+        choosing each room's day for this reset (later auto-resets pick days at random again).
+        """
+
+        if seed is not None:
+            self.rngs = [np.random.default_rng(seed + i) for i in range(self.num_envs)]
+        elif self.rngs is None:
+            self.rngs = [np.random.default_rng(s) for s in np.random.SeedSequence().spawn(self.num_envs)]
+
+        self._reset_rooms(self.rooms, days)
+
+        return self.state.copy()
+
+    def _reset_rooms(self, idx, days = None):
+        """
+        Starts a new day for the rooms in idx, drawing from each room's own generator in the same
+        order as RoomSimulator.reset
+        """
+
+        for k, i in enumerate(idx):
+            rng = self.rngs[i]
+            self.state[i] = rng.uniform(18,20)
+            if self.weather_bank is not None:
+                self.day[i] = rng.integers(len(self.weather_bank)) if days is None else days[k]
+                self.otemp[i] = self.weather_bank[self.day[i]]
+            else:
+                self.otemp[i] = self.base_otemp + rng.uniform(-0.5,0.5,size = len(t))
+        if self.exact:
+            self.fine_otemp[idx] = fine_grid(self.otemp[idx], self.dt)
+        self.current_timestep[idx] = 0
+        self.score[idx] = 0
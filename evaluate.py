@@ -0,0 +1,170 @@
+"""
+Batched, reproducible evaluation of trained models. Every model in the given output directories (.keras
+archives & training checkpoints) plays the same fixed set of seeded days greedily, all days stepped at once
+with a VectorRoomSimulator & a NumPy forward pass. Run from the repository root, e.g.
+
+    python evaluate.py V1_outputs V2_outputs --days 2000
+    python evaluate.py V1_outputs --weather-bank bank.npy --days 5000 --save-best V1_outputs/best_model.keras
+"""
+
+from settings import *
+from env import VectorRoomSimulator
+from weather import WeatherBank
+from inference import NumpyPolicy
+import checkpoint
+
+PERCENTILES = [5, 50, 95]
+
+def find_models(directory):
+    """
+    Returns the policy networks saved in an output directory: .keras archives (except target networks)
+    followed by its training checkpoints
+    """
+
+    archives = sorted(
+        join(directory, name) for name in os.listdir(directory)
+        if name.endswith(".keras") and "target" not in name
+    )
+
+    return archives + checkpoint.list_checkpoints(join(directory, "checkpoints"))
+
+def load_policy(path):
+    """
+    Returns a NumpyPolicy from a .keras archive, a checkpoint directory or a .npz written by inference.py
+    """
+
+    if os.path.isdir(path):
+        with np.load(join(path, "networks.npz")) as networks:
+            return NumpyPolicy([networks[f"policy_{i}"] for i in range(len(networks.files) // 2)])
+    if path.endswith(".npz"):
+        return NumpyPolicy.load(path)
+
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    from tensorflow.keras.models import load_model
+
+    return NumpyPolicy(load_model(path, compile = False).get_weights())
+
+def evaluate_policy(policy, env, seed, days = None):
+    """
+    Plays one greedy day in every room of env.
+
+    Args:
+        policy (callable):
+            Maps a batch of states to greedy actions, e.g. a NumpyPolicy or LookupPolicy
+        env (VectorRoomSimulator):
+            One room per evaluation day
+        seed (int):
+            Room i is reset with seed + i, so every policy sees the same days
+        days (ndarray):
+            Weather bank day of each room (weather bank envs only)
+
+    Returns:
+        result (dict):
+            Mean & percentile scores, fraction of steps within 0.5C of the setpoint (band occupancy)
+            & fraction of steps with the heater on (duty cycle)
+    """
+
+    state = env.reset(seed = seed, days = days)
+    in_band = np.zeros(env.num_envs)
+    heating = np.zeros(env.num_envs)
+
+    for i in env.num_timesteps:
+        actions = policy(state)
+        state, reward, done, info = env.step(actions)
+
+        # the last step auto-resets the rooms, so measure the final state of the day instead
+        room_temp = info.get("final_observation", state)
+        in_band += np.abs(env.setpoint[i] - room_temp) <= 0.5
+        heating += actions > 0
+
+    scores = info["final_score"]
+    result = {"mean_score": float(scores.mean())}
+    result.update({f"p{q}_score": float(s) for q, s in zip(PERCENTILES, np.percentile(scores, PERCENTILES))})
+    result["band_occupancy"] = float(in_band.mean() / len(env.num_timesteps))
+    result["duty_cycle"] = float(heating.mean() / len(env.num_timesteps))
+
+    return result
+
+def evaluate(directories, num_days = 1000, seed = 0, reward_mech = "V1", weather_bank = None):
+    """
+    Evaluates every model in directories on the same num_days days.
+
+    Args:
+        directories (list):
+            Output directories, e.g. ["V1_outputs", "V2_outputs"]. Directories named after a reward
+            mechanism ("V1_...", "V2_...") are scored with it, any other with reward_mech.
+        num_days (int):
+            Number of evaluation days
+        seed (int):
+            Seed of the evaluation days
+        reward_mech (str):
+            Default reward mechanism
+        weather_bank (WeatherBank):
+            Optional bank; its first num_days days are used
+
+    Returns:
+        results (list):
+            One dict per model (path, reward_mech & the metrics of evaluate_policy), best first within
+            each reward mechanism
+    """
+
+    days = None
+    if weather_bank is not None:
+        if num_days > len(weather_bank):
+            raise ValueError(f"The weather bank only holds {len(weather_bank)} days")
+        days = np.arange(num_days)
+
+    results = []
+    for directory in directories:
+        mech = os.path.basename(os.path.normpath(directory)).split("_")[0]
+        mech = mech if mech in ["V1", "V2"] else reward_mech
+        env = VectorRoomSimulator(num_days, 0.5, 0.04, reward_mech = mech, weather_bank = weather_bank)
+
+        for path in find_models(directory):
+            result = evaluate_policy(load_policy(path), env, seed, days)
+            results.append({"path": path, "reward_mech": mech, **result})
+
+    return sorted(results, key = lambda result: (result["reward_mech"], -result["mean_score"]))
+
+def save_best(result, path):
+    """
+    Writes the model of an evaluate() result to path as a .keras archive
+    """
+
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    import utils
+
+    network = utils.build_network((1,), 3)
+    network.set_weights(load_policy(result["path"]).weights)
+    network.save(path)
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description = "Rank trained models on a fixed set of seeded days")
+    parser.add_argument("directories", nargs = "*", default = ["V1_outputs", "V2_outputs"])
+    parser.add_argument("--days", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--reward-mech", default = "V1", help = "for directories not named after one")
+    parser.add_argument("--weather-bank", help = "evaluate on the first --days days of this bank")
+    parser.add_argument("--json", help = "write the results to this file")
+    parser.add_argument("--save-best", help = "write the top model (of the first reward mechanism) to this .keras file")
+    args = parser.parse_args()
+
+    weather_bank = WeatherBank(args.weather_bank) if args.weather_bank else None
+    start = time.perf_counter()
+    results = evaluate(args.directories, args.days, args.seed, args.reward_mech, weather_bank)
+
+    print(f"{'model':50} {'mean':>7} " + " ".join(f"{f'p{q}':>6}" for q in PERCENTILES) + f" {'in band':>8} {'duty':>6}")
+    for result in results:
+        print(f"{result['path']:50} {result['mean_score']:7.2f} "
+              + " ".join(f"{result[f'p{q}_score']:6.1f}" for q in PERCENTILES)
+              + f" {result['band_occupancy']:8.1%} {result['duty_cycle']:6.1%}")
+    print(f"Evaluated {len(results)} models on {args.days} days in {time.perf_counter() - start:.1f}s")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent = 2)
+    if args.save_best and results:
+        save_best(results[0], args.save_best)
@@ -0,0 +1,163 @@
+"""
+TensorFlow-free inference for trained policy networks. A .keras policy is exported once to a small .npz of
+Dense weights, which NumpyPolicy evaluates with plain NumPy; LookupPolicy goes further & tabulates the greedy
+action over the bounded observation range. Run from the repository root, e.g.
+
+    python inference.py V1_outputs/policy_network_5000.keras policy.npz --table policy_table.npz
+"""
+
+import numpy as np
+
+# RoomSimulator observation bounds (C)
+OBS_LOW = -20
+OBS_HIGH = 60
+
+class NumpyPolicy():
+    """
+    Forward pass of the Dense/ReLU policy network (utils.build_network) in float32 NumPy.
+
+    Args:
+        weights (list):
+            policy_network.get_weights(), i.e. [W1, b1, W2, b2, ..., Wout, bout]
+    """
+
+    def __init__(self, weights):
+
+        self.weights = [np.asarray(w, dtype = np.float32) for w in weights]
+        self.input_dim = self.weights[0].shape[0]
+        self.num_outputs = self.weights[-1].shape[0]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as file:
+            num_layers = len(file.files) // 2
+            return cls([file[f"{kind}_{i}"] for i in range(num_layers) for kind in ("kernel", "bias")])
+
+    def save(self, path):
+        arrays = {}
+        for i in range(0, len(self.weights), 2):
+            arrays[f"kernel_{i // 2}"], arrays[f"bias_{i // 2}"] = self.weights[i], self.weights[i + 1]
+        np.savez(path, **arrays)
+
+    def q_values(self, states):
+        """
+        Args:
+            states (ndarray):
+                A single state or a batch of states
+
+        Returns:
+            q_values (ndarray):
+                Q-values of shape (batch, num_outputs)
+        """
+
+        x = np.asarray(states, dtype = np.float32).reshape(-1, self.input_dim)
+        for i in range(0, len(self.weights) - 2, 2):
+            x = np.maximum(x @ self.weights[i] + self.weights[i + 1], 0)
+
+        return x @ self.weights[-2] + self.weights[-1]
+
+    def __call__(self, states):
+        """
+        Returns the greedy action of each state, of shape (batch,)
+        """
+
+        return np.argmax(self.q_values(states), axis = 1)
+
+    def lookup_table(self, low = OBS_LOW, high = OBS_HIGH, resolution = 0.01):
+        """
+        Tabulates the greedy action every `resolution` degrees over [low, high] (1-D observations only)
+        """
+
+        if self.input_dim != 1:
+            raise ValueError(f"Lookup tables need 1-D observations, the network takes {self.input_dim}")
+        num = int(round((high - low) / resolution)) + 1
+
+        return LookupPolicy(self(np.linspace(low, high, num)).astype(np.uint8), low, high)
+
+class LookupPolicy():
+    """
+    Greedy policy precomputed on an evenly spaced grid of states: each state takes the action of its nearest
+    grid point (states outside [low, high] are clipped), so picking an action is one index computation.
+    It can only differ from the network within half a grid step of a point where the greedy action changes.
+
+    Args:
+        actions (ndarray):
+            Greedy action at each grid point
+        low, high (float):
+            First & last grid point
+    """
+
+    def __init__(self, actions, low = OBS_LOW, high = OBS_HIGH):
+
+        self.actions = np.asarray(actions)
+        self.low = float(low)
+        self.high = float(high)
+        self.scale = (len(self.actions) - 1) / (self.high - self.low)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as file:
+            return cls(file["actions"], file["low"], file["high"])
+
+    def save(self, path):
+        np.savez(path, actions = self.actions, low = self.low, high = self.high)
+
+    def __call__(self, states):
+        if np.ndim(states) == 0:
+            # single state: plain float arithmetic is several times faster than the ufuncs below
+            idx = round((min(max(float(states), self.low), self.high) - self.low) * self.scale)
+            return self.actions[idx:idx + 1]
+        idx = np.rint((np.clip(states, self.low, self.high) - self.low) * self.scale).astype(np.intp)
+
+        return self.actions[np.reshape(idx, -1)]
+
+def export(model_path, out_path):
+    """
+    Writes the Dense weights of a saved .keras policy network to a .npz for NumpyPolicy.load
+
+    Returns:
+        policy (NumpyPolicy):
+            The exported policy
+        max_error (float):
+            Largest |Q-value| difference from the Keras model over the observation range
+    """
+
+    import os
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path, compile = False)
+    for layer in model.layers:
+        activation = layer.get_config().get("activation")
+        if type(layer).__name__ != "Dense" or activation not in ("relu", "linear"):
+            raise ValueError(f"Only Dense relu/linear layers can be exported, found {layer.name} ({activation})")
+    if model.layers[-1].get_config()["activation"] != "linear":
+        raise ValueError("The output layer must be linear")
+
+    policy = NumpyPolicy(model.get_weights())
+    policy.save(out_path)
+
+    states = np.linspace(OBS_LOW, OBS_HIGH, 8001, dtype = np.float32)[:, None]
+    max_error = float(np.abs(policy.q_values(states) - model.predict(states, verbose = 0)).max())
+
+    return policy, max_error
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Export a .keras policy network for NumPy inference")
+    parser.add_argument("model", help = "path to a .keras policy network")
+    parser.add_argument("out", help = "output .npz")
+    parser.add_argument("--table", help = "also write a lookup table policy to this .npz")
+    parser.add_argument("--resolution", type = float, default = 0.01, help = "lookup table grid step (C)")
+    args = parser.parse_args()
+
+    policy, max_error = export(args.model, args.out)
+    print(f"Exported {args.model} to {args.out}, max |Q| difference vs Keras: {max_error:.2e}")
+
+    if args.table:
+        table = policy.lookup_table(resolution = args.resolution)
+        table.save(args.table)
+        states = np.random.default_rng(0).uniform(OBS_LOW, OBS_HIGH, 100000)
+        agreement = np.mean(table(states) == policy(states))
+        print(f"Wrote a {len(table.actions)}-entry lookup table to {args.table}, agrees with the network on {agreement:.3%} of random states")
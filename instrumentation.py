@@ -0,0 +1,147 @@
+"""
+Low-overhead instrumentation for the training loop: per-phase timers & counters, a JSONL/CSV metrics sink
+and a profiler that only runs for a chosen window of episodes.
+"""
+
+import cProfile
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+
+class Phase():
+    """
+    Context manager adding the time spent inside it to its PhaseTimer. One is kept per phase name and reused,
+    so timing a phase costs two perf_counter calls.
+    """
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.seconds[self.name] += time.perf_counter() - self.start
+
+class PhaseTimer():
+    """
+    Accumulates wall-clock seconds per named phase & named counters until the next snapshot, e.g.
+
+        with timer.phase("env_step"):
+            env.step(action)
+        timer.count("env_steps")
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.phases = {}
+
+    def phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = Phase(self, name)
+
+        return self.phases[name]
+
+    def count(self, name, n = 1):
+        self.counters[name] += n
+
+    def snapshot(self):
+        """
+        Returns {"<phase>_s": seconds, "<counter>": count} accumulated since the last snapshot & resets them.
+        Every phase used so far is included (0 if it didn't run), so records keep the same columns.
+        """
+
+        record = {f"{name}_s": self.seconds.get(name, 0.0) for name in self.phases}
+        record.update(self.counters)
+        self.seconds.clear()
+        self.counters.clear()
+
+        return record
+
+class MetricsSink():
+    """
+    Streams one record (dict) per line to a JSONL file, or per row to a CSV file, flushing as it goes so a
+    crashed run keeps everything written so far. The format follows the file extension.
+
+    Args:
+        path (str):
+            "*.jsonl" or "*.csv"
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.csv = path.endswith(".csv")
+        self.file = open(path, "w", newline = "")
+        self.writer = None
+
+    def write(self, record):
+        if self.csv:
+            if self.writer is None:
+                # columns are fixed by the first record
+                self.writer = csv.DictWriter(self.file, fieldnames = list(record), extrasaction = "ignore", restval = 0)
+                self.writer.writeheader()
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class EpisodeProfiler():
+    """
+    Profiles episodes [start, stop) only, with cProfile or the TensorFlow profiler.
+
+    Args:
+        start (int):
+            First profiled episode
+        stop (int):
+            Episode at which profiling stops
+        kind (str):
+            "cprofile" (writes <out_dir>/episodes_<start>_<stop>.prof) or "tf" (TensorBoard trace in out_dir)
+        out_dir (str):
+            Where the profile is written
+    """
+
+    def __init__(self, start, stop, kind = "cprofile", out_dir = "profiles"):
+
+        if kind not in ("cprofile", "tf"):
+            raise ValueError(f"Unknown profiler {kind}, expected 'cprofile' or 'tf'")
+        self.start = start
+        self.stop = stop
+        self.kind = kind
+        self.out_dir = out_dir
+        self.profile = None
+        self.running = False
+
+    def episode_start(self, ep):
+        if ep != self.start:
+            return
+        os.makedirs(self.out_dir, exist_ok = True)
+        if self.kind == "cprofile":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            import tensorflow as tf
+            tf.profiler.experimental.start(self.out_dir)
+        self.running = True
+
+    def episode_end(self, ep):
+        if self.running and ep + 1 >= self.stop:
+            self.finish()
+
+    def finish(self):
+        if not self.running:
+            return
+        if self.kind == "cprofile":
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(self.out_dir, f"episodes_{self.start}_{self.stop}.prof"))
+        else:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+        self.running = False
@@ -0,0 +1,146 @@
+"""
+Learner Module containing the gradient steps used to train the policy network
+"""
+
+import numpy as np
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+import tensorflow as tf
+
+import utils
+
+def learn_step(policy_network, target_network, optimizer, experiences, gamma, tau, weights = None, double = False):
+    """
+    One gradient descent step in the policy network followed by a soft update of the target network.
+    Shared by agent_learn & agent_learn_fused, and traced into their graphs.
+    """
+
+    # tf needs to know what operations happened during the forward pass, and in what order, so 
+    # that it can use back-propagation to compute gradients
+    with tf.GradientTape() as tape:
+        # forward pass
+        loss, td_errors = utils.compute_loss_tf(policy_network, target_network, experiences, gamma, weights, double)
+
+    # backward pass
+    gradients = tape.gradient(loss, policy_network.trainable_variables)
+
+    # perform a gradient descent step in policy network
+    optimizer.apply_gradients(zip(gradients, policy_network.trainable_variables))
+
+    # update target network
+    utils.update_target_network(target_network, policy_network, tau)
+
+    return loss, td_errors
+
+# @tf.function allows computations to be carried out in graph-mode instead of eager execution
+@tf.function
+def agent_learn(policy_network, target_network, optimizer, experiences, gamma, tau, weights = None, double = False):
+    """
+    Agent performs a gradient descent step in the policy network &
+    updates weights within the target network using a softmax update.
+
+    Args:
+        policy_network (Sequential):
+            Policy network used to predict the best action in the env
+        target_network (Sequential):
+            Network outputting the targets (optimal sets of Q-values)
+        optimizer (Optimizer):
+            Optimizer of the policy network
+        experiences (tuple):
+            tuple of experiences in the form (states, actions, reward, new_states, done_vals)
+        gamma (float or Tensor):
+            Discount factor used in Bellman's equation, or one per experience for n-step returns
+        tau (float):
+            Soft update rate of the target network
+        weights (Tensor):
+            Optional importance-sampling weights from prioritized replay
+        double (bool):
+            Use Double DQN targets
+
+    Returns:
+        loss (Tensor):
+            Loss before the gradient step
+        td_errors (Tensor):
+            TD error of each experience, used to refresh replay priorities
+    """
+
+    return learn_step(policy_network, target_network, optimizer, experiences, gamma, tau, weights, double)
+
+@tf.function
+def agent_learn_fused(policy_network, target_network, optimizer, device_replay, num_updates, batch_size, gamma, tau,
+                      double = False):
+    """
+    Runs num_updates gradient steps & target network updates inside one compiled graph (a tf.while_loop),
+    each on a mini-batch sampled uniformly on-device from a DeviceReplay. This replaces num_updates
+    separate agent_learn calls, and their NumPy -> Tensor conversions, with a single dispatch.
+
+    Args:
+        policy_network, target_network, optimizer, gamma, tau, double:
+            See agent_learn
+        device_replay (DeviceReplay):
+            Replay memory mirrored into tf.Variables
+        num_updates (Tensor):
+            Number of gradient steps, K
+        batch_size (int):
+            Number of experiences per mini-batch
+
+    Returns:
+        mean_loss (Tensor):
+            Loss averaged over the K steps
+    """
+
+    def body(k, total_loss):
+        idx = tf.random.uniform((batch_size,), maxval = device_replay.size, dtype = tf.int32)
+        experiences = tuple(tf.gather(field, idx) for field in device_replay.fields)
+        loss, _ = learn_step(policy_network, target_network, optimizer, experiences, gamma, tau, double = double)
+
+        return k + 1, total_loss + loss
+
+    _, total_loss = tf.while_loop(
+        lambda k, total_loss: k < num_updates, body, (tf.constant(0), tf.constant(0.0))
+    )
+
+    return total_loss / tf.cast(num_updates, tf.float32)
+
+class DeviceReplay():
+    """
+    Mirror of a ReplayBuffer held in tf.Variables (on the GPU when there is one), so agent_learn_fused
+    can sample mini-batches without leaving the graph. sync only copies the experiences appended since
+    the last sync.
+
+    Args:
+        memory_buffer (ReplayBuffer):
+            The host-side buffer to mirror
+    """
+
+    def __init__(self, memory_buffer):
+
+        self.states = tf.Variable(memory_buffer.states, dtype = tf.float32, trainable = False)
+        self.actions = tf.Variable(memory_buffer.actions.astype(np.float32), trainable = False)
+        self.rewards = tf.Variable(memory_buffer.rewards, dtype = tf.float32, trainable = False)
+        self.new_states = tf.Variable(memory_buffer.new_states, dtype = tf.float32, trainable = False)
+        self.done_vals = tf.Variable(memory_buffer.done_vals, dtype = tf.uint8, trainable = False)
+        self.size = tf.Variable(memory_buffer.size, dtype = tf.int32, trainable = False)
+        self.fields = (self.states, self.actions, self.rewards, self.new_states, self.done_vals)
+        self.synced_count = memory_buffer.count
+
+    def sync(self, memory_buffer):
+        """
+        Copies the experiences appended to memory_buffer since the last sync onto the device
+        """
+
+        num_new = min(memory_buffer.count - self.synced_count, memory_buffer.capacity)
+        if num_new > 0:
+            idx = (memory_buffer.pos - num_new + np.arange(num_new)) % memory_buffer.capacity
+            for field, host_field in zip(self.fields, memory_buffer.fields()):
+                field.scatter_nd_update(idx[:, None], host_field[idx].astype(field.dtype.as_numpy_dtype))
+        self.size.assign(memory_buffer.size)
+        self.synced_count = memory_buffer.count
+
+def build_optimizer(optimizer, network):
+    """
+    Creates the optimizer's slot variables up front; tf.function can't create them inside a tf.while_loop
+    """
+
+    if not optimizer.built:
+        optimizer.build(network.trainable_variables)
@@ -0,0 +1,186 @@
+"""
+Append-only columnar store for per-episode training metrics, plus O(1) rolling statistics.
+
+A store is a directory holding one raw little-endian binary file per column (<column>.bin) & a small
+columns.json. Rows are buffered in memory & appended to the column files a chunk at a time, so the file
+only ever grows by appends, a crash loses at most one unflushed chunk, and readers can memory-map any
+column without loading the rest.
+"""
+
+import json
+import os
+import numpy as np
+
+class MetricsStore():
+    """
+    Args:
+        path (str):
+            Store directory, created if needed. An existing store is appended to.
+        columns (dict):
+            column name -> dtype. Needed to create a store; an existing one keeps its own columns.
+        chunk_rows (int):
+            Rows buffered in memory between flushes
+    """
+
+    def __init__(self, path, columns = None, chunk_rows = 256):
+
+        self.path = path
+        meta_path = os.path.join(path, "columns.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                columns = json.load(file)
+        elif columns is None:
+            raise FileNotFoundError(f"No metrics store in {path}")
+        else:
+            os.makedirs(path, exist_ok = True)
+            columns = {name: np.dtype(dtype).str for name, dtype in columns.items()}
+            with open(meta_path, "w") as file:
+                json.dump(columns, file)
+
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self.chunk_rows = chunk_rows
+        self.buffer = {name: np.zeros(chunk_rows, dtype = dtype) for name, dtype in self.columns.items()}
+        self.buffered = 0
+        self.flushed_rows = self.stored_rows()
+
+    def column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def stored_rows(self):
+        """
+        Number of complete rows on disk (a row cut short by a crash is ignored)
+        """
+
+        sizes = [
+            os.path.getsize(self.column_path(name)) // dtype.itemsize if os.path.exists(self.column_path(name)) else 0
+            for name, dtype in self.columns.items()
+        ]
+
+        return min(sizes)
+
+    def __len__(self):
+        return self.flushed_rows + self.buffered
+
+    def append(self, record):
+        """
+        Appends one row. Columns missing from record (or None) are stored as NaN for floats & 0 for integers.
+        """
+
+        for name, column in self.buffer.items():
+            value = record.get(name)
+            column[self.buffered] = (np.nan if column.dtype.kind == "f" else 0) if value is None else value
+        self.buffered += 1
+        if self.buffered == self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        for name, column in self.buffer.items():
+            with open(self.column_path(name), "r+b" if os.path.exists(self.column_path(name)) else "wb") as file:
+                # write after the last complete row, overwriting any partial one
+                file.seek(self.flushed_rows * column.dtype.itemsize)
+                file.write(column[:self.buffered].astype(column.dtype.newbyteorder("<"), copy = False).tobytes())
+                file.truncate()
+        self.flushed_rows += self.buffered
+        self.buffered = 0
+
+    def truncate(self, rows):
+        """
+        Drops every row after the first `rows`, e.g. to go back to a checkpoint
+        """
+
+        self.flush()
+        for name, dtype in self.columns.items():
+            if os.path.exists(self.column_path(name)):
+                os.truncate(self.column_path(name), min(rows, self.flushed_rows) * dtype.itemsize)
+        self.flushed_rows = min(rows, self.flushed_rows)
+
+    def column(self, name):
+        """
+        Returns the flushed rows of a column as a read-only memory map
+        """
+
+        dtype = self.columns[name].newbyteorder("<")
+        if self.flushed_rows == 0:
+            return np.zeros(0, dtype = dtype)
+
+        return np.memmap(self.column_path(name), dtype = dtype, mode = "r", shape = (self.flushed_rows,))
+
+    def downsample(self, name, max_points = 2000, block_rows = 1 << 20):
+        """
+        Summarizes a column in at most max_points equal bins, reading it block by block so memory stays
+        bounded however long the run was.
+
+        Returns:
+            rows (ndarray):
+                First row of each bin
+            mean, low, high (ndarray):
+                Mean, min & max of each bin (NaNs ignored)
+        """
+
+        data = self.column(name)
+        bin_rows = max(-(-len(data) // max_points), 1)
+        block_rows = max(block_rows // bin_rows, 1) * bin_rows # blocks hold whole bins
+
+        means, lows, highs = [], [], []
+        for start in range(0, len(data), block_rows):
+            block = np.asarray(data[start:start + block_rows], dtype = np.float64)
+            pad = -len(block) % bin_rows
+            bins = np.pad(block, (0, pad), constant_values = np.nan).reshape(-1, bin_rows)
+            means.append(np.nanmean(bins, axis = 1))
+            lows.append(np.nanmin(bins, axis = 1))
+            highs.append(np.nanmax(bins, axis = 1))
+        if not means:
+            return (np.zeros(0, dtype = np.int64),) + (np.zeros(0),) * 3
+
+        return np.arange(0, len(data), bin_rows), np.concatenate(means), np.concatenate(lows), np.concatenate(highs)
+
+    def close(self):
+        self.flush()
+
+class RollingStats():
+    """
+    Mean & standard deviation of the last `window` values, updated in O(1) per value.
+
+    Args:
+        window (int):
+            Number of most recent values covered
+    """
+
+    def __init__(self, window):
+
+        self.window = window
+        self.values = np.zeros(window)
+        self.pos = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+
+    def append(self, value):
+        old = self.values[self.pos] if self.count >= self.window else 0.0
+        self.values[self.pos] = value
+        self.sum += value - old
+        self.sum_sq += value * value - old * old
+        self.count += 1
+        self.pos = (self.pos + 1) % self.window
+
+        # re-sum once per lap, so float round-off can't build up over a long run
+        if self.pos == 0:
+            self.sum, self.sum_sq = self.values.sum(), (self.values ** 2).sum()
+
+    def extend(self, values):
+        for value in values:
+            self.append(float(value))
+
+    def __len__(self):
+        return min(self.count, self.window)
+
+    def mean(self):
+        return self.sum / len(self) if len(self) else float("nan")
+
+    def std(self):
+        if not len(self):
+            return float("nan")
+
+        return float(np.sqrt(max(self.sum_sq / len(self) - self.mean() ** 2, 0.0)))
@@ -0,0 +1,246 @@
+"""
+Batched model-predictive control (MPC) baseline for RoomSimulator. Run from the repository root, e.g.
+
+    python mpc.py --days 2000                                        # every on/off sequence, 8 step horizon
+    python mpc.py --days 2000 --method cem --horizon 16              # cross-entropy search
+    python mpc.py --days 2000 --model V1_outputs/best_model.keras    # vs a DQN on the same days
+
+Every step, each room plans heater on/off sequences over the next `horizon` steps with the env's own model &
+reward, takes the first action of the best sequence & plans again at the next step (receding horizon). The
+room update T += h*a + l*(To - T) is linear, so with the heater off the room follows a free response fixed
+by its temperature & the outdoor forecast, and switching the heater on adds a response that is the same for
+every room:
+
+    temps = free_response (rooms, H) + candidates (..., H) @ heat_response (H, H)
+
+Scoring candidates is then one broadcast add, one band_reward & one weighted sum over the horizon, for every
+room & candidate at once; there is no tree search or loop over candidates. The outdoor temperature forecast
+is the env's own day, i.e. perfect.
+"""
+
+from settings import *
+from env import VectorRoomSimulator, band_reward, exact_rc
+
+def all_sequences(horizon):
+    """
+    Returns every heater on/off sequence of length horizon, of shape (2**horizon, horizon)
+    """
+
+    return (np.arange(2 ** horizon)[:, None] >> np.arange(horizon)[::-1]) & 1
+
+class MPCController():
+    """
+    Receding-horizon controller for every room of a VectorRoomSimulator, called like a policy:
+    actions = controller(state) before each env.step, so it works with evaluate.evaluate_policy.
+
+    Args:
+        env (VectorRoomSimulator):
+            Rooms to control; their heating_power, loss_coefficient, reward_mech, dt, action_repeat & days
+            are the controller's model
+        horizon (int):
+            Number of steps planned ahead
+        method (str):
+            "cem" (cross-entropy search over sampled sequences) or "exhaustive" (every 2**horizon sequence)
+        samples (int):
+            Sequences scored per room & cem iteration
+        elites (int):
+            Best sequences the cem sampling distribution is refit to
+        iterations (int):
+            cem iterations per step
+        smoothing (float):
+            Weight of the elites in each cem refit
+        tie_break (float):
+            Weight of a penalty on the absolute setpoint error, which only orders sequences of equal reward;
+            e.g. 1e-4 helps cem over long horizons, where many sampled sequences score the same
+        chunk_size (int):
+            Rooms planned together, bounding the (rooms, candidates, sub-steps) arrays
+        seed (int):
+            Seed of the cem samples
+    """
+
+    def __init__(self, env, horizon = 8, method = "exhaustive", samples = 64, elites = 8, iterations = 3, smoothing = 0.8,
+                 tie_break = 0.0, chunk_size = 256, seed = 0):
+
+        if method not in ("cem", "exhaustive"):
+            raise ValueError(f"Unknown MPC method {method}, expected 'cem' or 'exhaustive'")
+        if horizon < 1 or (method == "exhaustive" and horizon > 12):
+            raise ValueError("horizon must be >= 1, and <= 12 for exhaustive search (2**horizon sequences)")
+        if method == "cem" and not 0 < elites <= samples:
+            raise ValueError("cem needs 0 < elites <= samples")
+        self.env = env
+        self.horizon = horizon
+        self.method = method
+        self.samples = samples
+        self.elites = elites
+        self.iterations = iterations
+        self.smoothing = smoothing
+        self.tie_break = tie_break
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+
+        # the env's update over horizon * action_repeat sub-steps, see env.exact_rc & env.rc_substeps;
+        # dt = 15 with action_repeat = 1 is the original update T += h*a + l*(To - T)
+        self.substeps = horizon * env.action_repeat
+        rise, self.powers, weights = exact_rc(env.h, env.l, env.dt, self.substeps)
+        self.otemp_response = weights.T
+        hold = np.repeat(np.eye(horizon), env.action_repeat, axis = 1) # decision k held for its sub-steps
+        self.heat_response = rise * hold @ weights.T
+        self.reward_weight = env.dt / 15
+        if method == "exhaustive":
+            # heater response during step k of every on/off prefix a_0 ... a_k, see plan
+            r = env.action_repeat
+            self.prefix_response = [
+                all_sequences(k + 1) @ self.heat_response[:k + 1, k * r:(k + 1) * r] for k in range(horizon)
+            ]
+            self.sequences = all_sequences(horizon)
+
+        # best sequence of the last step of each room, shifted by one step, seeds the next cem search
+        self.plans = np.zeros((env.num_envs, horizon))
+
+    def forecast(self, state, rooms):
+        """
+        Returns the heater-off room temperatures over the horizon, the setpoints & the reward weight of every
+        sub-step (0 past the end of the day), each of shape (len(rooms), horizon * action_repeat)
+        """
+
+        env = self.env
+        otemp, setpoint = (env.fine_otemp, env.fine_setpoint) if env.exact else (env.otemp, env.setpoint)
+        j = env.current_timestep[rooms, None] * env.action_repeat + np.arange(self.substeps)
+        weight = (j < len(setpoint)) * self.reward_weight
+        j = np.minimum(j, len(setpoint) - 1)
+        free = state[:, None] * self.powers + otemp[rooms[:, None], j] @ self.otemp_response
+
+        return free, setpoint[j], weight
+
+    def score(self, free, setpoint, weight, response):
+        """
+        Scores heater sequences from the temperature response they add to the free response.
+
+        Args:
+            free, setpoint, weight (ndarray):
+                From forecast, of shape (rooms, sub-steps)
+            response (ndarray):
+                Heater response of each candidate, (candidates, sub-steps) shared by every room or
+                (rooms, candidates, sub-steps)
+
+        Returns:
+            scores (ndarray):
+                Summed reward over the horizon, of shape (rooms, candidates)
+        """
+
+        temps = free[:, None, :] + response
+        error = np.abs(setpoint[:, None, :] - temps)
+        reward = band_reward(error, self.env.reward_mech) - self.tie_break * error
+
+        return (reward @ weight[:, :, None])[..., 0]
+
+    def plan(self, state, rooms):
+        """
+        Returns the best heater sequence of each room in rooms, of shape (len(rooms), horizon)
+        """
+
+        free, setpoint, weight = self.forecast(state, rooms)
+
+        if self.method == "exhaustive":
+            # the reward of step k only depends on the first k + 1 actions, so score the 2**(k+1) prefixes
+            # level by level (2**(horizon+1) step rewards in all, not horizon * 2**horizon); prefix p has
+            # children 2p & 2p+1, as in all_sequences
+            r = self.env.action_repeat
+            scores = np.zeros((len(rooms), 1))
+            for k, response in enumerate(self.prefix_response):
+                block = slice(k * r, (k + 1) * r)
+                scores = np.repeat(scores, 2, axis = 1) + self.score(free[:, block], setpoint[:, block], weight[:, block], response)
+            return self.sequences[scores.argmax(axis = 1)]
+
+        # cross-entropy search: sample sequences from independent per-step on probabilities, refit the
+        # probabilities to the elite sequences & repeat; the previous plan is always a candidate
+        best = self.plans[rooms]
+        best_scores = self.score(free, setpoint, weight, (best @ self.heat_response)[:, None, :])[:, 0]
+        probs = np.full((len(rooms), self.horizon), 0.5)
+        for _ in range(self.iterations):
+            candidates = (self.rng.random((len(rooms), self.samples, self.horizon)) < probs[:, None, :]).astype(np.float64)
+            scores = self.score(free, setpoint, weight, candidates @ self.heat_response)
+
+            top = scores.argmax(axis = 1)
+            improved = scores[np.arange(len(rooms)), top] > best_scores
+            best = np.where(improved[:, None], candidates[np.arange(len(rooms)), top], best)
+            best_scores = np.maximum(best_scores, scores[np.arange(len(rooms)), top])
+
+            elite = np.argpartition(-scores, self.elites - 1, axis = 1)[:, :self.elites]
+            elite_mean = np.take_along_axis(candidates, elite[:, :, None], axis = 1).mean(axis = 1)
+            probs = (1 - self.smoothing) * probs + self.smoothing * elite_mean
+
+        return best
+
+    def __call__(self, state):
+        """
+        Returns the first action of each room's best heater sequence, of shape (num_envs,)
+        """
+
+        state = np.asarray(state, dtype = np.float64)
+        actions = np.empty(self.env.num_envs, dtype = np.int64)
+
+        for start in range(0, self.env.num_envs, self.chunk_size):
+            rooms = self.env.rooms[start:start + self.chunk_size]
+            plans = self.plan(state[rooms], rooms)
+            actions[rooms] = plans[:, 0]
+            # shifted plan, the last step held
+            self.plans[rooms, :-1] = plans[:, 1:]
+            self.plans[rooms, -1] = plans[:, -1]
+
+        return actions
+
+def compare(num_days = 1000, seed = 0, reward_mech = "V1", heating_power = 0.5, loss_coefficient = 0.04,
+            policy = None, **kwargs):
+    """
+    Scores an MPCController (and optionally a greedy policy) on the same seeded days as evaluate.py.
+
+    Args:
+        kwargs:
+            MPCController arguments, e.g. horizon & method
+
+    Returns:
+        results (dict):
+            "mpc" & "policy" (if a policy was given): evaluate.evaluate_policy's result
+    """
+
+    from evaluate import evaluate_policy
+
+    env = VectorRoomSimulator(num_days, heating_power, loss_coefficient, reward_mech = reward_mech)
+    results = {"mpc": evaluate_policy(MPCController(env, **kwargs), env, seed)}
+    if policy is not None:
+        results["policy"] = evaluate_policy(policy, env, seed)
+
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Score a model-predictive controller (and a DQN) on seeded days")
+    parser.add_argument("--days", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--reward-mech", default = "V1")
+    parser.add_argument("--method", default = "exhaustive", choices = ["exhaustive", "cem"])
+    parser.add_argument("--horizon", type = int, default = 8, help = "steps planned ahead")
+    parser.add_argument("--samples", type = int, default = 64, help = "cem sequences per room & iteration")
+    parser.add_argument("--iterations", type = int, default = 3, help = "cem iterations per step")
+    parser.add_argument("--tie-break", type = float, default = 0.0, help = "weight of the setpoint error penalty")
+    parser.add_argument("--model", help = "also score this policy (.keras, .npz or checkpoint) on the same days")
+    args = parser.parse_args()
+
+    policy = None
+    if args.model:
+        from evaluate import load_policy
+        policy = load_policy(args.model)
+
+    start = time.perf_counter()
+    results = compare(args.days, args.seed, args.reward_mech, policy = policy, horizon = args.horizon,
+                      method = args.method, samples = args.samples, iterations = args.iterations,
+                      tie_break = args.tie_break)
+    seconds = time.perf_counter() - start
+
+    for name, result in results.items():
+        label = f"mpc ({args.method}, horizon {args.horizon})" if name == "mpc" else args.model
+        print(f"{label}: {result['mean_score']:.2f} mean score (p5 {result['p5_score']:.2f}, p95 {result['p95_score']:.2f}), "
+              f"{result['band_occupancy']:.1%} in band, {result['duty_cycle']:.1%} duty")
+    print(f"Scored {args.days} days in {seconds:.1f}s")
@@ -0,0 +1,170 @@
+"""
+Multi-zone building simulator: RoomSimulator's heating & outdoor losses for every zone, plus heat exchanged
+between neighbouring zones through a (sparse) conductance matrix.
+"""
+
+from settings import *
+from weather import *
+from env import band_reward
+
+def zone_edges(conductance):
+    """
+    Returns the couplings (i, j, g) of a conductance matrix, one per pair of zones i < j. Only entries
+    above the diagonal are read, so a symmetric matrix & its upper triangle give the same building.
+
+    Args:
+        conductance (ndarray or scipy.sparse matrix):
+            conductance[i, j] is the fraction of the temperature difference between zones i & j that
+            flows between them in 15 minutes
+    """
+
+    if hasattr(conductance, "tocoo"):
+        coo = conductance.tocoo()
+        i, j, g = coo.row, coo.col, coo.data
+    else:
+        conductance = np.asarray(conductance, dtype = np.float64)
+        i, j = np.nonzero(conductance)
+        g = conductance[i, j]
+
+    upper = (i < j) & (g != 0)
+
+    return i[upper].astype(np.intp), j[upper].astype(np.intp), np.asarray(g[upper], dtype = np.float64)
+
+def grid_conductance(rows, cols, conductance = 0.02):
+    """
+    Returns the sparse conductance matrix of a rows x cols floor plan where each zone exchanges heat with
+    its 4 neighbours (zone index = row * cols + col)
+    """
+
+    from scipy.sparse import coo_matrix
+
+    idx = np.arange(rows * cols).reshape(rows, cols)
+    i = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    j = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+
+    return coo_matrix((np.full(len(i), conductance), (i, j)), shape = (rows * cols, rows * cols))
+
+class MultiZoneSimulator(Env):
+    """
+    ### Parameters
+
+    heating_power: degC each zone's heater adds in 15 minutes, scalar or one value per zone.\\n
+    loss_coefficient: Fraction of the indoor-outdoor temperature difference lost in 15 minutes, scalar or one
+    value per zone (e.g. 0 for interior zones).\\n
+    conductance: (num_zones, num_zones) ndarray or scipy.sparse matrix coupling the zones, see zone_edges.\\n
+    reward_mech: "V1" or "V2", applied to every zone (see RoomSimulator).\\n
+    setpoint: Setpoint profile of shape (n,) shared by all zones, or (num_zones, n). Default SETPOINT_SUMMER.\\n
+    weather_bank: Optional WeatherBank, see RoomSimulator.
+
+    ### Description
+
+    Simulates the zones of a building over a Summer's day. Every 15 minutes each zone's temperature changes by
+
+        h_i * a_i + l_i * (To - T_i) + sum_j g_ij * (T_j - T_i)
+
+    All zones update together: the inter-zone term is computed from the list of coupled pairs with two
+    `np.bincount` calls, so a step costs O(num_zones + couplings) with no per-zone Python work, and
+    hundreds of zones with a sparse floor plan are cheap.
+
+    ### Action Space
+
+    `MultiDiscrete` of shape `(num_zones,)`, each zone's heater off (0) or on (1).
+
+    ### Observation Space
+
+    Zone temperatures, a `ndarray` of shape `(num_zones,)` in (-20, 60).
+
+    ### Rewards
+
+    The sum over zones of RoomSimulator's band reward; per-zone rewards are in `info["zone_rewards"]`.
+
+    ### Starting State
+
+    Each zone's temperature is assigned a uniformly random value in `(18, 20)`
+
+    ### Episode End
+
+    The episode ends when the day is over or 96 fifteen minute intervals have elapsed.
+    """
+
+    metadata = {"render_modes": []}
+
+    def __init__(self, heating_power, loss_coefficient, conductance, reward_mech: Optional[str] = "V1",
+                 setpoint: Optional[np.ndarray] = None, weather_bank: Optional[WeatherBank] = None):
+
+        self.reward_mech_list = ["V1","V2"]
+        if reward_mech not in self.reward_mech_list:
+            raise ValueError(
+                f"You have specified an invalid reward mechanism. Currently accepted reward mechanisms are {self.reward_mech_list}"
+            )
+
+        # zones & couplings
+        self.num_zones = conductance.shape[0]
+        self.edge_i, self.edge_j, self.edge_g = zone_edges(conductance)
+        self.h = np.broadcast_to(np.asarray(heating_power, dtype = np.float64), (self.num_zones,))
+        self.l = np.broadcast_to(np.asarray(loss_coefficient, dtype = np.float64), (self.num_zones,))
+
+        # the explicit update overshoots (and can oscillate) if a zone loses more than its whole
+        # temperature difference in one step
+        coupling = np.bincount(self.edge_i, self.edge_g, self.num_zones) + np.bincount(self.edge_j, self.edge_g, self.num_zones)
+        if np.any(self.l + coupling >= 1):
+            raise ValueError("Each zone's loss_coefficient plus its total conductance must be below 1")
+
+        # spaces
+        self.observation_space = Box(low = -20, high = 60, shape = (self.num_zones,))
+        self.action_space = MultiDiscrete(np.full(self.num_zones, 2))
+
+        # parameters
+        self.reward_mech = reward_mech
+        self.num_timesteps = np.arange(0,len(t))
+        self.setpoint = np.broadcast_to(SETPOINT_SUMMER if setpoint is None else setpoint, (self.num_zones, len(t)))
+        self.weather_bank = weather_bank
+        self.rng = None
+        self.day = None
+
+    def step(self, actions):
+
+        # heat exchanged between coupled zones, flowing from j into i
+        flow = self.edge_g * (self.state[self.edge_j] - self.state[self.edge_i])
+        exchange = np.bincount(self.edge_i, flow, self.num_zones) - np.bincount(self.edge_j, flow, self.num_zones)
+
+        # update state (zone temperatures)
+        self.action = np.asarray(actions)
+        self.state += (self.h*self.action) + (self.l*(self.otemp[self.current_timestep] - self.state)) + exchange
+
+        # reward mechanism
+        zone_rewards = band_reward(np.abs(self.setpoint[:, self.current_timestep] - self.state), self.reward_mech)
+        reward = float(zone_rewards.sum())
+
+        # is the day finished?
+        self.done = self.current_timestep == len(t) - 1
+
+        # update timestep & score
+        self.current_timestep += 1
+        self.score += reward
+        info = {"zone_rewards": zone_rewards}
+
+        return self.state.copy(), reward, self.done, info
+
+    def reset(self, seed: Optional[int] = None, day: Optional[int] = None):
+        """
+        Starts a new day in every zone. Passing a seed makes this and every following (unseeded) reset
+        reproducible. With a weather bank, day picks a specific day from the bank.
+        """
+
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        elif self.rng is None:
+            self.rng = np.random.default_rng()
+
+        self.state = self.rng.uniform(18,20,size = self.num_zones)
+        if self.weather_bank is not None:
+            self.day = self.rng.integers(len(self.weather_bank)) if day is None else day
+            self.otemp = self.weather_bank[self.day]
+        else:
+            self.otemp = OutdoorTemp(self.rng).o_temp_summer
+        self.current_timestep = 0
+        self.score = 0
+        self.action = np.zeros(self.num_zones, dtype = np.int64)
+
+        return self.state.copy()
@@ -0,0 +1,229 @@
+"""
+Vectorized PID baseline for RoomSimulator. Run from the repository root, e.g.
+
+    python pid.py --days 2000                                        # notebook gains
+    python pid.py --days 2000 --kp 1 2 4 --ki 0 0.02 0.05            # gain sweep
+    python pid.py --days 2000 --model V1_outputs/best_model.keras    # vs a DQN on the same days
+    python pid.py --days 2000 --weather-bank bank.npy                # on a weather bank's days
+
+The room is the notebook's RC model, dTi/dt = (To - Ti) / (R*C) + Qh / C. Over a step with constant To & Qh
+it has the exact solution
+
+    Ti(t + dt) = Ti_ss + (Ti(t) - Ti_ss) * exp(-dt / (R*C)),  Ti_ss = To + R*Qh
+
+so no ODE solver is needed. With R & C from PIDController.from_room this is exactly RoomSimulator's update,
+T += h*a + l*(To - T), with the heater on a fraction a = Qh / Qh_max of the time.
+
+from_room, compare & the command line take gains in heater duty (fraction of Qh_max) per degC, so they
+don't depend on the plant's R & C; the defaults ROOM_GAINS come from a grid search on 1000 seeded days
+(kp in 0.5 ... 16, ki in 0 ... 1, kd in 0 ... 2) with the default room.
+"""
+
+from settings import *
+from env import VectorRoomSimulator, band_reward
+
+# kp, ki, kd in heater duty per degC (see from_room)
+ROOM_GAINS = (2.0, 0.02, 0.5)
+
+def rc_step(temps, otemp, heat, r, c, dt = 1.0):
+    """
+    Exact RC model step with constant outdoor temperature & heating power
+
+    Args:
+        temps (ndarray):
+            Room temperatures
+        otemp (ndarray):
+            Outdoor temperatures
+        heat (ndarray):
+            Heating power (W)
+        r, c (float):
+            Thermal resistance & capacitance of the room
+        dt (float):
+            Step length, in the same time units as r*c
+    """
+
+    steady_state = otemp + r * heat
+
+    return steady_state + (temps - steady_state) * np.exp(-dt / (r * c))
+
+class PIDController():
+    """
+    A batch of PID controllers heating RC-model rooms, stepped together as NumPy arrays. Gains broadcast
+    against the rooms, so e.g. kp of shape (num_gains, 1) with days of shape (num_days, n) runs every gain
+    setting on every day.
+
+    Args:
+        kp, ki, kd (float or ndarray):
+            Proportional, integral & derivative gains
+        r, c (float):
+            Thermal resistance & capacitance of the room (notebook values by default)
+        heat_min, heat_max (float):
+            Heater output is clamped to [heat_min, heat_max]
+        heat_bias (float):
+            Heater output with zero error
+        dt (float):
+            Step length (1 = one 15 minute step)
+        anti_windup (bool):
+            Stop integrating while the heater is saturated in the direction of the error
+    """
+
+    def __init__(self, kp = 40.0, ki = 8.0, kd = 1.0, r = 5.0, c = 1000.0, heat_min = 0.0, heat_max = 500.0,
+                 heat_bias = 0.0, dt = 1.0, anti_windup = True):
+
+        self.kp = np.asarray(kp, dtype = np.float64)
+        self.ki = np.asarray(ki, dtype = np.float64)
+        self.kd = np.asarray(kd, dtype = np.float64)
+        self.r = r
+        self.c = c
+        self.heat_min = heat_min
+        self.heat_max = heat_max
+        self.heat_bias = heat_bias
+        self.dt = dt
+        self.anti_windup = anti_windup
+
+    @classmethod
+    def from_room(cls, heating_power, loss_coefficient, heat_max = 500.0, kp = ROOM_GAINS[0], ki = ROOM_GAINS[1],
+                  kd = ROOM_GAINS[2], **kwargs):
+        """
+        PID controller whose RC model matches RoomSimulator(heating_power, loss_coefficient). The gains are
+        in heater duty per degC (e.g. kp = 2: full heat 0.5C below the setpoint) & scaled by heat_max here,
+        unlike the constructor's, which are in W per degC for the notebook's R & C.
+        """
+
+        rc = -1 / np.log(1 - loss_coefficient) # exp(-1 / RC) = 1 - l
+        r = heating_power / (loss_coefficient * heat_max) # R * heat_max = h / l, the steady-state rise at full heat
+        kp, ki, kd = (np.asarray(gain, dtype = np.float64) * heat_max for gain in (kp, ki, kd))
+
+        return cls(kp, ki, kd, r = r, c = rc / r, heat_max = heat_max, **kwargs)
+
+    def simulate(self, otemp, setpoint, temp0):
+        """
+        Runs the controllers over a horizon.
+
+        Args:
+            otemp (ndarray):
+                Outdoor temperatures of shape (..., steps), e.g. VectorRoomSimulator.otemp, a slice of a
+                WeatherBank, or seasonal_days chunks joined end to end
+            setpoint (ndarray):
+                Setpoints, broadcastable to otemp
+            temp0 (ndarray):
+                Initial room temperatures, broadcastable to otemp[..., 0]
+
+        Returns:
+            temps (ndarray):
+                Room temperature after each step, of shape (batch..., steps)
+            heat (ndarray):
+                Heating power during each step, of the same shape
+        """
+
+        steps = otemp.shape[-1]
+        setpoint = np.broadcast_to(setpoint, otemp.shape)
+        shape = np.broadcast_shapes(self.kp.shape, self.ki.shape, self.kd.shape, otemp.shape[:-1])
+        temp = np.broadcast_to(temp0, shape).astype(np.float64)
+        integral = np.zeros(shape)
+        prev_error = None
+        temps = np.empty((*shape, steps))
+        heat = np.empty((*shape, steps))
+
+        for i in range(steps):
+            error = setpoint[..., i] - temp
+            new_integral = integral + error * self.dt
+            deriv = 0.0 if prev_error is None else (error - prev_error) / self.dt
+            q = self.heat_bias + self.kp * error + self.ki * new_integral + self.kd * deriv
+
+            if self.anti_windup:
+                saturated = ((q > self.heat_max) & (error > 0)) | ((q < self.heat_min) & (error < 0))
+                integral = np.where(saturated, integral, new_integral)
+            else:
+                integral = new_integral
+            q = np.clip(q, self.heat_min, self.heat_max)
+
+            temp = rc_step(temp, otemp[..., i], q, self.r, self.c, self.dt)
+            temps[..., i], heat[..., i] = temp, q
+            prev_error = error
+
+        return temps, heat
+
+def compare(num_days = 1000, seed = 0, reward_mech = "V1", heating_power = 0.5, loss_coefficient = 0.04,
+            kp = ROOM_GAINS[0], ki = ROOM_GAINS[1], kd = ROOM_GAINS[2], policy = None, weather_bank = None, days = None):
+    """
+    Scores PID controllers (and optionally a greedy policy) on the same seeded days as evaluate.py,
+    with RoomSimulator's reward.
+
+    Args:
+        kp, ki, kd (float or ndarray):
+            Gains in heater duty per degC, see PIDController.from_room
+        weather_bank (WeatherBank):
+            Optional bank the days are drawn from, as in VectorRoomSimulator
+        days (ndarray):
+            Weather bank day of each room, as in evaluate.evaluate_policy (weather bank only)
+
+    Returns:
+        results (dict):
+            "pid": mean score, band occupancy & duty cycle per gain setting (arrays broadcast from the gains),
+            and "policy": evaluate.evaluate_policy's result if a policy was given
+    """
+
+    env = VectorRoomSimulator(num_days, heating_power, loss_coefficient, reward_mech = reward_mech, weather_bank = weather_bank)
+    temp0 = env.reset(seed = seed, days = days)
+    otemp, setpoint = env.otemp.copy(), env.setpoint
+
+    controller = PIDController.from_room(heating_power, loss_coefficient, kp = np.asarray(kp)[..., None],
+                                         ki = np.asarray(ki)[..., None], kd = np.asarray(kd)[..., None])
+    temps, heat = controller.simulate(otemp, setpoint, temp0)
+    error = np.abs(setpoint - temps)
+
+    results = {"pid": {
+        "mean_score": band_reward(error, reward_mech).sum(axis = -1).mean(axis = -1),
+        "band_occupancy": (error <= 0.5).mean(axis = (-2, -1)),
+        "duty_cycle": (heat / controller.heat_max).mean(axis = (-2, -1)),
+    }}
+    if policy is not None:
+        from evaluate import evaluate_policy
+        results["policy"] = evaluate_policy(policy, env, seed, days)
+
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Score PID controllers (and a DQN) on seeded days")
+    parser.add_argument("--days", type = int, default = 1000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--reward-mech", default = "V1")
+    parser.add_argument("--kp", type = float, nargs = "+", default = [ROOM_GAINS[0]], help = "heater duty per degC")
+    parser.add_argument("--ki", type = float, nargs = "+", default = [ROOM_GAINS[1]])
+    parser.add_argument("--kd", type = float, nargs = "+", default = [ROOM_GAINS[2]])
+    parser.add_argument("--model", help = "also score this policy (.keras, .npz or checkpoint) on the same days")
+    parser.add_argument("--weather-bank", help = "score on the first --days days of this bank")
+    args = parser.parse_args()
+
+    weather_bank, days = None, None
+    if args.weather_bank:
+        from weather import WeatherBank
+        weather_bank = WeatherBank(args.weather_bank)
+        if args.days > len(weather_bank):
+            raise ValueError(f"The weather bank only holds {len(weather_bank)} days")
+        days = np.arange(args.days)
+
+    # every combination of gains
+    kp, ki, kd = np.meshgrid(args.kp, args.ki, args.kd, indexing = "ij")
+    policy = None
+    if args.model:
+        from evaluate import load_policy
+        policy = load_policy(args.model)
+
+    start = time.perf_counter()
+    results = compare(args.days, args.seed, args.reward_mech, kp = kp.ravel(), ki = ki.ravel(), kd = kd.ravel(), policy = policy,
+                      weather_bank = weather_bank, days = days)
+    pid = results["pid"]
+
+    print(f"{'kp':>7} {'ki':>7} {'kd':>7} {'mean':>7} {'in band':>8} {'duty':>6}")
+    for i in np.argsort(-pid["mean_score"]):
+        print(f"{kp.ravel()[i]:7.2f} {ki.ravel()[i]:7.2f} {kd.ravel()[i]:7.2f} {pid['mean_score'][i]:7.2f} "
+              f"{pid['band_occupancy'][i]:8.1%} {pid['duty_cycle'][i]:6.1%}")
+    if policy is not None:
+        result = results["policy"]
+        print(f"{args.model}: {result['mean_score']:.2f} mean score, {result['band_occupancy']:.1%} in band, "
+              f"{result['duty_cycle']:.1%} duty")
+    print(f"Scored {kp.size} gain settings on {args.days} days in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,99 @@
+"""
+Records RoomSimulator episodes straight into a video file, without a display. Run from the repository root, e.g.
+
+    python recording.py V1_outputs/policy_network_5000.keras --episodes 100 --out V1_eval.mp4
+"""
+
+from settings import *
+from env import RoomSimulator
+
+class VideoWriter():
+    """
+    Streams rgb_array frames into a video file with imageio-ffmpeg, one frame at a time, so memory stays
+    flat however many episodes are recorded.
+
+    Args:
+        path (str):
+            Output file, e.g. "episodes.mp4"
+        fps (int):
+            Frames per second of the video
+    """
+
+    def __init__(self, path, fps = RoomSimulator.metadata["render_fps"]):
+
+        try:
+            import imageio
+        except ImportError:
+            raise DependencyNotInstalled(
+                "imageio is not installed, run `pip install imageio imageio-ffmpeg`"
+            )
+
+        # 1800x800 frames are multiples of 8, not of ffmpeg's default block size of 16
+        self.writer = imageio.get_writer(path, fps = fps, macro_block_size = 8)
+
+    def write(self, frame):
+        self.writer.append_data(frame)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def record_episodes(env, choose_action, path, num_episodes = 1, seed: Optional[int] = None):
+    """
+    Plays num_episodes episodes & writes every frame to a video.
+
+    Args:
+        env (RoomSimulator):
+            Environment created with render_mode="rgb_array"
+        choose_action (callable):
+            Maps a state to an action
+        path (str):
+            Output video file
+        num_episodes (int):
+            Number of episodes (days) to record back to back
+        seed (int):
+            Optional seed for the first reset
+
+    Returns:
+        scores (list):
+            Score of each episode
+    """
+
+    scores = []
+    with VideoWriter(path) as video:
+        for ep in range(num_episodes):
+            done = False
+            state = env.reset(seed = seed if ep == 0 else None)
+            video.write(env.render())
+
+            while not done:
+                state, reward, done, info = env.step(choose_action(state))
+                video.write(env.render())
+            scores.append(env.score)
+
+    return scores
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Record greedy episodes of a trained policy network to a video")
+    parser.add_argument("model", help = "path to a .keras policy network")
+    parser.add_argument("--episodes", type = int, default = 1)
+    parser.add_argument("--out", default = "episodes.mp4")
+    parser.add_argument("--reward-mech", default = "V1")
+    parser.add_argument("--seed", type = int, default = None)
+    args = parser.parse_args()
+
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    from tensorflow.keras.models import load_model
+    import utils
+
+    env = RoomSimulator(0.5,0.04,reward_mech=args.reward_mech,render_mode="rgb_array")
+    action_selector = utils.ActionSelector(load_model(args.model), env.action_space.n)
+    scores = record_episodes(env, lambda state: action_selector(state)[0], args.out, args.episodes, args.seed)
+    print(f'Recorded {args.episodes} episodes to {args.out}. Mean score: {np.mean(scores):.2f}')
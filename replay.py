@@ -0,0 +1,314 @@
+"""
+Experience replay stored in preallocated, contiguous NumPy arrays
+"""
+
+import numpy as np
+from typing import Optional
+
+class ReplayBuffer():
+    """
+    Ring buffer holding the most recent `capacity` experiences, one preallocated array per field.
+    Once full, new experiences overwrite the oldest ones (like a deque with maxlen).
+
+    Args:
+        capacity (int):
+            Max number of experiences stored
+        state_shape (tuple):
+            Shape of a single state, (1,) for RoomSimulator
+        seed (int):
+            Seed for the sampling generator
+    """
+
+    def __init__(self, capacity, state_shape = (1,), seed: Optional[int] = None):
+
+        self.capacity = capacity
+        self.state_shape = tuple(state_shape)
+        self.states = np.zeros((capacity, *self.state_shape), dtype = np.float32)
+        self.actions = np.zeros(capacity, dtype = np.int32)
+        self.rewards = np.zeros(capacity, dtype = np.float32)
+        self.new_states = np.zeros((capacity, *self.state_shape), dtype = np.float32)
+        self.done_vals = np.zeros(capacity, dtype = np.uint8)
+
+        self.pos = 0 # index the next experience is written to
+        self.size = 0
+        self.count = 0 # total experiences ever appended
+        self.rng = np.random.default_rng(seed)
+        self.batches = {} # preallocated sample outputs, keyed by batch size
+
+    def __len__(self):
+        return self.size
+
+    def fields(self):
+        return (self.states, self.actions, self.rewards, self.new_states, self.done_vals)
+
+    def append(self, state, action, reward, new_state, done_val):
+        """
+        Stores a single experience & returns the index it was written to
+        """
+
+        idx = self.pos
+        self.states[self.pos] = state
+        self.actions[self.pos] = action
+        self.rewards[self.pos] = reward
+        self.new_states[self.pos] = new_state
+        self.done_vals[self.pos] = done_val
+
+        self.pos = (self.pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.count += 1
+
+        return idx
+
+    def append_batch(self, states, actions, rewards, new_states, done_vals):
+        """
+        Stores a batch of experiences, e.g. one step of a VectorRoomSimulator. Every argument has a
+        leading batch axis; states of shape (num_envs,) are reshaped to (num_envs, *state_shape).
+        Returns the indices the experiences were written to.
+        """
+
+        num = len(actions)
+        idx = self.write_indices(num)
+        # only the last `capacity` experiences of an oversized batch survive
+        keep = slice(max(num - self.capacity, 0), num)
+
+        self.states[idx] = np.reshape(states, (num, *self.state_shape))[keep]
+        self.actions[idx] = np.asarray(actions)[keep]
+        self.rewards[idx] = np.asarray(rewards)[keep]
+        self.new_states[idx] = np.reshape(new_states, (num, *self.state_shape))[keep]
+        self.done_vals[idx] = np.asarray(done_vals)[keep]
+
+        return idx
+
+    def write_indices(self, num):
+        """
+        Returns the ring indices the next num experiences go to & advances the write position
+        """
+
+        num_kept = min(num, self.capacity)
+        idx = (self.pos + max(num - self.capacity, 0) + np.arange(num_kept)) % self.capacity
+
+        self.pos = (self.pos + num) % self.capacity
+        self.size = min(self.size + num, self.capacity)
+        self.count += num
+
+        return idx
+
+    def sample_indices(self, batch_size):
+        return self.rng.integers(0, self.size, size = batch_size)
+
+    def sample(self, batch_size):
+        """
+        Returns a mini-batch of uniformly sampled (with replacement) experiences.
+
+        Args:
+            batch_size (int):
+                Number of experiences in the mini-batch
+
+        Returns:
+            batch (tuple):
+                Arrays (states, actions, rewards, new_states, done_vals), each with a leading axis of
+                batch_size. They are reused by the next call with the same batch_size, so copy them
+                (e.g. with tf.convert_to_tensor) before sampling again.
+        """
+
+        return self.gather(self.sample_indices(batch_size))
+
+    def n_step_returns(self, idx, n_step, gamma, stride = 1):
+        """
+        Vectorized n-step returns for the experiences at idx, read straight from the ring arrays. The
+        experience after idx in the same episode is at idx + stride (1 when experiences are appended one
+        step at a time, num_envs for append_batch of a VectorRoomSimulator step). A return is cut short at
+        the end of an episode, at the newest experience, or where the next experience doesn't continue the
+        trajectory (its state isn't this one's new_state, e.g. at the boundary between two actors' blocks).
+
+        Args:
+            idx (ndarray):
+                Buffer indices of the sampled experiences
+            n_step (int):
+                Maximum number of rewards summed
+            gamma (float):
+                Discount factor
+            stride (int):
+                Index distance between consecutive steps of a trajectory
+
+        Returns:
+            rewards (ndarray):
+                Discounted sum of up to n_step rewards, r_0 + gamma * r_1 + ...
+            new_states (ndarray):
+                State the return bootstraps from
+            done_vals (ndarray):
+                Whether the episode ended within the return
+            discounts (ndarray):
+                gamma ** (number of rewards summed), to discount the bootstrap Q-value with
+        """
+
+        rewards = self.rewards[idx].astype(np.float64)
+        new_states = self.new_states[idx]
+        done_vals = self.done_vals[idx]
+        discounts = np.full(len(idx), gamma)
+
+        # experiences appended after each sampled one
+        age = (self.pos - 1 - idx) % self.capacity
+        active = done_vals == 0
+        for k in range(1, n_step):
+            nxt = (idx + k * stride) % self.capacity
+            active &= (age >= k * stride) & np.all(self.states[nxt] == new_states, axis = tuple(range(1, new_states.ndim)))
+
+            rewards += np.where(active, discounts * self.rewards[nxt], 0)
+            new_states = np.where(active.reshape(-1, *[1] * (new_states.ndim - 1)), self.new_states[nxt], new_states)
+            done_vals = np.where(active, self.done_vals[nxt], done_vals)
+            discounts = np.where(active, discounts * gamma, discounts)
+            active &= done_vals == 0
+
+        return rewards.astype(np.float32), new_states, done_vals, discounts.astype(np.float32)
+
+    def gather(self, idx):
+        """
+        Copies the experiences at idx into the preallocated batch arrays
+        """
+
+        if len(idx) not in self.batches:
+            self.batches[len(idx)] = tuple(np.empty((len(idx), *field.shape[1:]), dtype = field.dtype) for field in self.fields())
+        batch = self.batches[len(idx)]
+
+        for field, out in zip(self.fields(), batch):
+            np.take(field, idx, axis = 0, out = out)
+
+        return batch
+
+class SumTree():
+    """
+    Binary tree stored in a flat array, where every parent holds the sum of its two children and the
+    leaves hold the priorities. Both sampling by priority and updating priorities are O(log N), and
+    each is vectorized over a whole batch of indices.
+
+    Args:
+        capacity (int):
+            Number of leaves needed (rounded up to a power of 2)
+    """
+
+    def __init__(self, capacity):
+
+        self.num_leaves = 1 << max(capacity - 1, 1).bit_length()
+        self.depth = self.num_leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.num_leaves) # tree[1] is the root, leaf i is tree[num_leaves + i]
+
+    def total(self):
+        return self.tree[1]
+
+    def priorities(self, idx):
+        return self.tree[self.num_leaves + idx]
+
+    def update(self, idx, priorities):
+        """
+        Sets the priorities of leaves idx & recomputes their ancestors, one tree level at a time
+        """
+
+        nodes = self.num_leaves + np.asarray(idx)
+        self.tree[nodes] = priorities
+
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """
+        Returns the leaf index of each value, where leaf i covers the cumulative priority range
+        [sum(p[:i]), sum(p[:i+1]))
+        """
+
+        nodes = np.ones(len(values), dtype = np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = np.where(go_right, values - self.tree[left], values)
+            nodes = np.where(go_right, left + 1, left)
+
+        return nodes - self.num_leaves
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer that samples experience i with probability p_i^alpha / sum(p^alpha), where p_i is
+    its last absolute TD error (Schaul et al., 2016). New experiences get the highest priority seen so
+    far, so each one is replayed at least once with high probability.
+
+    Args:
+        capacity, state_shape, seed:
+            See ReplayBuffer
+        alpha (float):
+            How much prioritization is used (0 is uniform sampling)
+        beta (float):
+            Initial importance-sampling exponent, annealed towards 1 by beta_increment per sample
+        beta_increment (float):
+            Amount added to beta on every call to sample_prioritized
+        eps (float):
+            Added to every |TD error| so no experience ends up with zero probability
+    """
+
+    def __init__(self, capacity, state_shape = (1,), seed: Optional[int] = None, alpha = 0.6, beta = 0.4,
+                 beta_increment = 1e-4, eps = 1e-5):
+
+        super().__init__(capacity, state_shape, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.eps = eps
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def append(self, state, action, reward, new_state, done_val):
+        idx = super().append(state, action, reward, new_state, done_val)
+        self.tree.update([idx], self.max_priority ** self.alpha)
+
+        return idx
+
+    def append_batch(self, states, actions, rewards, new_states, done_vals):
+        idx = super().append_batch(states, actions, rewards, new_states, done_vals)
+        self.tree.update(idx, self.max_priority ** self.alpha)
+
+        return idx
+
+    def sample_indices(self, batch_size):
+        """
+        Draws one value from each of batch_size equal slices of the total priority (stratified sampling)
+        """
+
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        # guards against float round-off walking past the last stored experience
+        return np.minimum(self.tree.find(values), self.size - 1)
+
+    def sample_prioritized(self, batch_size):
+        """
+        Returns a mini-batch sampled by priority.
+
+        Args:
+            batch_size (int):
+                Number of experiences in the mini-batch
+
+        Returns:
+            batch (tuple):
+                See ReplayBuffer.sample
+            idx (ndarray):
+                Buffer indices of the experiences, to pass back to update_priorities
+            weights (ndarray):
+                Importance-sampling weights (N * P(i))^-beta, normalized by their max
+        """
+
+        idx = self.sample_indices(batch_size)
+        probs = self.tree.priorities(idx) / self.tree.total()
+        weights = (self.size * probs) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return self.gather(idx), idx, weights
+
+    def update_priorities(self, idx, td_errors):
+        """
+        Sets the priorities of the experiences at idx from their new TD errors
+        """
+
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(idx, priorities ** self.alpha)
@@ -0,0 +1,192 @@
+"""
+Early stopping & compute budgets for training runs. Every eval_frequency episodes the policy network plays a
+fixed set of seeded days greedily (see evaluate.py), which is far less noisy than the moving average of
+training scores. Training stops once that score reaches a target or stops improving, or once a wall-clock
+or env-step budget is spent.
+
+Every evaluation & the final decision are appended to a JSONL log, one record per line, e.g.
+
+    {"episode": 1200, "env_steps": 115200, "seconds": 431.2, "eval_score": 61.3, "band_occupancy": 0.52,
+     "best_score": 61.3, "best_episode": 1200, "stale": 0, "decision": "improved"}
+    {"episode": 2200, ..., "stale": 10, "decision": "stop", "reason": "plateau"}
+
+The log is also how a resumed run picks up the best score & patience count; the time already spent comes
+from the checkpoint being resumed (or the last log record for checkpoints without it). Scores are null
+until the first evaluation.
+"""
+
+from settings import *
+from env import VectorRoomSimulator
+from evaluate import evaluate_policy
+from inference import NumpyPolicy
+import json
+
+class TrainingScheduler():
+    """
+    Args:
+        env (RoomSimulator):
+            Training env; the evaluation rooms use its heating_power, loss_coefficient & reward_mech
+        eval_frequency (int):
+            Episodes between evaluations, 0 to only enforce the budgets
+        eval_days (int):
+            Number of seeded days per evaluation
+        eval_seed (int):
+            Seed of the evaluation days
+        patience (int):
+            Evaluations without an improvement of at least min_delta before stopping
+        min_delta (float):
+            Smallest increase of the evaluated score counted as an improvement
+        min_episodes (int):
+            No plateau stop before this many episodes (while epsilon is still high)
+        target_score (float):
+            Stop once the evaluated score reaches this (None = no target)
+        max_seconds (float):
+            Wall-clock budget, summed over resumed runs (None = no budget)
+        max_env_steps (int):
+            Env-step budget (None = no budget)
+        log_path (str):
+            JSONL decision log (None = not logged)
+        best_path (str):
+            The policy network is saved here whenever the evaluated score improves (None = not saved)
+    """
+
+    def __init__(self, env, eval_frequency = 100, eval_days = 200, eval_seed = 0, patience = 10, min_delta = 0.5,
+                 min_episodes = 0, target_score = None, max_seconds = None, max_env_steps = None,
+                 log_path = None, best_path = None):
+
+        if eval_frequency < 0 or patience < 1:
+            raise ValueError("eval_frequency must be >= 0 and patience >= 1")
+        if env.reward_mech not in env.reward_mech_list:
+            raise ValueError(
+                f"Invalid reward mechanism {env.reward_mech!r}, the evaluation rooms accept {env.reward_mech_list}"
+            )
+        self.eval_frequency = eval_frequency
+        self.patience = patience
+        self.min_delta = min_delta
+        self.min_episodes = min_episodes
+        self.target_score = target_score
+        self.max_seconds = max_seconds
+        self.max_env_steps = max_env_steps
+        self.log_path = log_path
+        self.best_path = best_path
+        self.eval_env = VectorRoomSimulator(eval_days, env.h, env.l, reward_mech = env.reward_mech)
+        self.eval_seed = eval_seed
+
+        self.best_score = -np.inf
+        self.best_episode = None
+        self.stale = 0
+        self.seconds = 0.0 # spent by earlier (resumed) runs
+        self.start = time.perf_counter()
+        self.reason = None
+
+    def elapsed(self):
+        return self.seconds + time.perf_counter() - self.start
+
+    def restore(self, episode, seconds = None):
+        """
+        Starts the log at `episode`: records of later episodes (written after the checkpoint being resumed)
+        are dropped, and the best score, patience count & time spent are read back from the rest.
+        Pass 0 for a fresh run, which empties the log.
+
+        Args:
+            episode (int):
+                Episodes completed by the checkpoint being resumed
+            seconds (float):
+                Training time saved with that checkpoint, which also counts the time since the last
+                log record (None = the last record's)
+        """
+
+        records = []
+        if self.log_path is not None and os.path.exists(self.log_path):
+            with open(self.log_path) as file:
+                records = [json.loads(line) for line in file if line.strip()]
+        records = [record for record in records if record["episode"] <= episode]
+
+        if records:
+            last = records[-1]
+            self.best_score, self.best_episode, self.stale = last["best_score"], last["best_episode"], last["stale"]
+            self.best_score = -np.inf if self.best_score is None else self.best_score
+            self.seconds = last["seconds"]
+        if seconds is not None:
+            self.seconds = seconds
+        self.start = time.perf_counter()
+
+        if self.log_path is not None:
+            with open(self.log_path, "w") as file:
+                file.writelines(json.dumps(record) + "\n" for record in records)
+
+    def rounded_best(self):
+        # -inf (no evaluation yet) isn't valid JSON
+        return None if self.best_score == -np.inf else round(self.best_score, 3)
+
+    def log(self, record):
+        if "eval_score" in record:
+            print(f"Episode {record['episode']}: evaluated score {record['eval_score']:.2f} (best {record['best_score']:.2f} "
+                  f"at episode {record['best_episode']}, {record['stale']} evaluations without improvement)")
+        if record["decision"] == "stop":
+            print(f"Stopping after {record['episode']} episodes: {record['reason']}")
+        if self.log_path is not None:
+            with open(self.log_path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+
+    def evaluate(self, policy_network):
+        """
+        Returns evaluate.evaluate_policy's result for the network on the evaluation days
+        """
+
+        return evaluate_policy(NumpyPolicy(policy_network.get_weights()), self.eval_env, self.eval_seed)
+
+    def update(self, episode, env_steps, policy_network):
+        """
+        Called after every episode; evaluates the policy when due & checks the stopping rules.
+
+        Args:
+            episode (int):
+                Number of episodes completed
+            env_steps (int):
+                Env steps taken so far (including resumed runs)
+            policy_network (Sequential):
+                Network to evaluate
+
+        Returns:
+            stop (bool):
+                Whether training should stop; the reason is in self.reason
+        """
+
+        record = {"episode": episode, "env_steps": int(env_steps), "seconds": round(self.elapsed(), 1)}
+
+        if self.eval_frequency and episode % self.eval_frequency == 0:
+            result = self.evaluate(policy_network)
+            score = result["mean_score"]
+            improved = score >= self.best_score + self.min_delta
+            if improved:
+                self.best_score, self.best_episode, self.stale = score, episode, 0
+                if self.best_path is not None:
+                    policy_network.save(self.best_path)
+            else:
+                self.stale += 1
+
+            record.update({
+                "eval_score": round(score, 3), "band_occupancy": round(result["band_occupancy"], 4),
+                "best_score": self.rounded_best(), "best_episode": self.best_episode, "stale": self.stale,
+                "decision": "improved" if improved else "continue",
+            })
+            if self.target_score is not None and score >= self.target_score:
+                self.reason = "target"
+            elif self.stale >= self.patience and episode >= self.min_episodes:
+                self.reason = "plateau"
+
+        if self.reason is None:
+            if self.max_env_steps is not None and env_steps >= self.max_env_steps:
+                self.reason = "env_step_budget"
+            elif self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+                self.reason = "time_budget"
+
+        if self.reason is not None:
+            record.update(decision = "stop", reason = self.reason)
+        if "decision" in record:
+            if self.reason is not None and "best_score" not in record:
+                record.update(best_score = self.rounded_best(), best_episode = self.best_episode, stale = self.stale)
+            self.log(record)
+
+        return self.reason is not None
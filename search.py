@@ -0,0 +1,261 @@
+"""
+Concurrent hyperparameter search with asynchronous successive halving (ASHA). Trials sample a TrainingConfig
+from SEARCH_SPACE & train on a process pool. Rung k trains a trial to min_episodes * eta**k episodes and scores
+it greedily on fixed seeded days (see scheduler.py). A trial only continues to the next rung once it is in the
+top 1/eta of the trials scored at its rung, so most of the compute goes to the strongest configs. Trials
+resume from their own checkpoints between rungs. Run from the repository root, e.g.
+
+    python search.py --trials 27 --workers 4 --min-episodes 100 --max-episodes 2700 --eta 3
+
+Each trial writes to <out_dir>/trial-<id>; the leaderboard (config, rung reached, evaluated score & compute
+spent per trial) is rewritten to <out_dir>/leaderboard.csv & .json as jobs finish, and every finished job is
+appended to <out_dir>/search.jsonl.
+"""
+
+from settings import *
+import contextlib
+import csv
+import json
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# field -> ("log", low, high), ("uniform", low, high) or ("choice", [values]), see TrainingConfig for the fields
+SEARCH_SPACE = {
+    "alpha": ("log", 1e-4, 3e-3),
+    "tau": ("log", 1e-4, 1e-2),
+    "gamma": ("choice", [0.95, 0.99, 0.995]),
+    "e_decay": ("choice", [0.99, 0.995, 0.9975]),
+    "memory": ("choice", [1000, 10000, 50000]),
+    "batch_size": ("choice", [20, 32, 64]),
+    "num_steps_upd": ("choice", [1, 2, 4, 8]),
+}
+
+# every trial: no early stopping (the search decides when trials stop) & only the latest checkpoint kept
+TRIAL_SETTINGS = {"eval_frequency": 0, "checkpoint_keep": 1}
+
+def sample_config(space, rng):
+    """
+    Returns TrainingConfig overrides drawn from a search space
+    """
+
+    overrides = {}
+    for name, (kind, *args) in space.items():
+        if kind == "log":
+            overrides[name] = float(f"{np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))):.3g}")
+        elif kind == "uniform":
+            overrides[name] = float(f"{rng.uniform(*args):.3g}")
+        elif kind == "choice":
+            overrides[name] = args[0][rng.integers(len(args[0]))]
+            overrides[name] = overrides[name].item() if hasattr(overrides[name], "item") else overrides[name]
+        else:
+            raise ValueError(f"Unknown distribution {kind} for {name}, expected 'log', 'uniform' or 'choice'")
+
+    return overrides
+
+def run_trial(trial_dir, overrides, episodes, heating_power, loss_coefficient, reward_mech):
+    """
+    Trains a trial to `episodes` episodes in total, resuming from its latest checkpoint, & scores it on the
+    evaluation days. Training output goes to <trial_dir>/log.txt.
+
+    Returns:
+        result (dict):
+            episodes, score (mean evaluated score), band_occupancy, env_steps (total) & seconds (this job)
+    """
+
+    start = time.perf_counter()
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    import tensorflow as tf
+    # trials share the machine, so each keeps to one core
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    from training import Trainer, TrainingConfig
+    from env import RoomSimulator
+    import checkpoint
+
+    os.makedirs(trial_dir, exist_ok = True)
+    with open(join(trial_dir, "log.txt"), "a") as log, contextlib.redirect_stdout(log):
+        config = TrainingConfig(**{**overrides, **TRIAL_SETTINGS, "num_episodes": episodes, "reward_mech": reward_mech})
+        trainer = Trainer(config, RoomSimulator(heating_power, loss_coefficient, reward_mech = config.reward_mech), trial_dir)
+        latest = checkpoint.latest_checkpoint(trainer.checkpoint_dir)
+        if latest is not None:
+            trainer.resume(latest)
+        trainer.train()
+        result = trainer.scheduler.evaluate(trainer.policy_network)
+
+    return {
+        "episodes": len(trainer.metrics_store),
+        "score": result["mean_score"],
+        "band_occupancy": result["band_occupancy"],
+        "env_steps": trainer.env_steps,
+        "seconds": time.perf_counter() - start,
+    }
+
+class SuccessiveHalving():
+    """
+    Asynchronous successive halving bookkeeping. Rung k trains to min_episodes * eta**k episodes (the last rung
+    to max_episodes). A trial scored at rung k is promoted as soon as it is in the top 1/eta of every trial
+    scored at rung k so far, so workers never wait for a rung to fill up.
+
+    Args:
+        min_episodes (int):
+            Episodes of the first rung
+        max_episodes (int):
+            Episodes of the last rung
+        eta (int):
+            Reduction factor between rungs
+    """
+
+    def __init__(self, min_episodes, max_episodes, eta = 3):
+
+        if eta < 2 or not 0 < min_episodes <= max_episodes:
+            raise ValueError("Successive halving needs eta >= 2 and 0 < min_episodes <= max_episodes")
+        self.eta = eta
+        self.budgets = []
+        budget = min_episodes
+        while budget < max_episodes:
+            self.budgets.append(budget)
+            budget *= eta
+        self.budgets.append(max_episodes)
+        self.scores = [{} for _ in self.budgets] # trial -> score, per rung
+        self.promoted = [set() for _ in self.budgets]
+
+    def record(self, trial, rung, score):
+        self.scores[rung][trial] = score
+
+    def next_promotion(self):
+        """
+        Returns (trial, rung) of the best promotable trial, highest rung first, or None
+        """
+
+        for rung in reversed(range(len(self.budgets) - 1)):
+            ranked = sorted(self.scores[rung], key = lambda trial: -self.scores[rung][trial])
+            for trial in ranked[:len(ranked) // self.eta]:
+                if trial not in self.promoted[rung]:
+                    self.promoted[rung].add(trial)
+                    return trial, rung + 1
+
+        return None
+
+def write_leaderboard(rows, out_dir):
+    with open(join(out_dir, "leaderboard.json"), "w") as file:
+        json.dump(rows, file, indent = 2)
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    with open(join(out_dir, "leaderboard.csv"), "w", newline = "") as file:
+        writer = csv.DictWriter(file, fieldnames = fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def search(num_trials = 27, workers = None, min_episodes = 100, max_episodes = 2700, eta = 3, out_dir = "search",
+           space = None, seed = 0, heating_power = 0.5, loss_coefficient = 0.04, reward_mech = "V1"):
+    """
+    Runs an ASHA search over training configs.
+
+    Args:
+        num_trials (int):
+            Number of configs sampled
+        workers (int):
+            Process pool size (default: number of CPUs)
+        min_episodes, max_episodes, eta:
+            Rung budgets, see SuccessiveHalving
+        out_dir (str):
+            Trial directories, leaderboard & search log
+        space (dict):
+            Search space (default SEARCH_SPACE), see sample_config
+        seed (int):
+            Seed of the config sampler
+        heating_power, loss_coefficient, reward_mech:
+            Training env, see RoomSimulator
+
+    Returns:
+        leaderboard (list):
+            One dict per trial (trial, rung, episodes, score, band_occupancy, env_steps, seconds & its config
+            overrides), furthest rung first, then best score
+    """
+
+    from settings_training import TrainingConfig
+
+    space = SEARCH_SPACE if space is None else space
+    rng = np.random.default_rng(seed)
+    asha = SuccessiveHalving(min_episodes, max_episodes, eta)
+    os.makedirs(out_dir, exist_ok = True)
+    log_path = join(out_dir, "search.jsonl")
+    open(log_path, "w").close()
+
+    configs, rows = [], {}
+    env_args = (heating_power, loss_coefficient, reward_mech)
+
+    def next_job():
+        job = asha.next_promotion()
+        if job is None and len(configs) < num_trials:
+            overrides = sample_config(space, rng)
+            TrainingConfig(**overrides) # invalid combinations fail here, not in a worker
+            configs.append(overrides)
+            shutil.rmtree(join(out_dir, f"trial-{len(configs) - 1}"), ignore_errors = True)
+            job = (len(configs) - 1, 0)
+
+        return job
+
+    # spawn, so workers start without this process' TensorFlow state; one job per worker process so
+    # finished trials' graphs & models are freed with it
+    workers = workers or os.cpu_count()
+    leaderboard = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context = context, max_tasks_per_child = 1) as pool:
+        running = {}
+
+        def fill():
+            while len(running) < workers:
+                job = next_job()
+                if job is None:
+                    return
+                trial, rung = job
+                future = pool.submit(run_trial, join(out_dir, f"trial-{trial}"), configs[trial], asha.budgets[rung], *env_args)
+                running[future] = job
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                trial, rung = running.pop(future)
+                result = future.result()
+                asha.record(trial, rung, result["score"])
+
+                seconds = rows[trial]["seconds"] if trial in rows else 0.0
+                rows[trial] = {"trial": trial, "rung": rung, **result, "seconds": seconds + result["seconds"], **configs[trial]}
+                with open(log_path, "a") as file:
+                    file.write(json.dumps({"trial": trial, "rung": rung, **result}) + "\n")
+                print(f"Trial {trial} rung {rung} ({result['episodes']} episodes): score {result['score']:.2f}, "
+                      f"{result['seconds']:.0f}s")
+
+            leaderboard = sorted(rows.values(), key = lambda row: (-row["rung"], -row["score"]))
+            write_leaderboard(leaderboard, out_dir)
+            fill()
+
+    return leaderboard
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Asynchronous successive halving search over training configs")
+    parser.add_argument("--trials", type = int, default = 27)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--min-episodes", type = int, default = 100, help = "episodes of the first rung")
+    parser.add_argument("--max-episodes", type = int, default = 2700, help = "episodes of the last rung")
+    parser.add_argument("--eta", type = int, default = 3, help = "only the top 1/eta of each rung is promoted")
+    parser.add_argument("--out-dir", default = "search")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--reward-mech", default = "V1")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    leaderboard = search(args.trials, args.workers, args.min_episodes, args.max_episodes, args.eta, args.out_dir,
+                         seed = args.seed, reward_mech = args.reward_mech)
+
+    names = list(SEARCH_SPACE)
+    print(f"{'trial':>5} {'rung':>4} {'episodes':>8} {'score':>7} {'env steps':>10} {'seconds':>8}  " + " ".join(f"{name:>13}" for name in names))
+    for row in leaderboard[:20]:
+        print(f"{row['trial']:5d} {row['rung']:4d} {row['episodes']:8d} {row['score']:7.2f} {row['env_steps']:10d} {row['seconds']:8.0f}  "
+              + " ".join(f"{str(row[name]):>13}" for name in names))
+    print(f"{args.trials} trials in {time.perf_counter() - start:.0f}s, "
+          f"{sum(row['seconds'] for row in leaderboard):.0f}s of training")
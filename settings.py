@@ -1,33 +1,18 @@
 # Environment stuff
-import pygame
+# Only light dependencies live here so that the simulation core (env, weather) imports with NumPy &
+# gymnasium alone. pygame is imported by RoomSimulator.render, TensorFlow by utils/settings_training.
 import gymnasium as gym
 from gymnasium import Env
-from gymnasium.spaces import Box, Discrete
-from gym.error import DependencyNotInstalled
+from gymnasium.spaces import Box, Discrete, MultiDiscrete
+from gymnasium.error import DependencyNotInstalled
 from datetime import time as tim, datetime, timedelta
 
-# Deep Q-Learning
-import utils
-
-# Deep Learning
-import os
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
-import tensorflow as tf
-from tensorflow.keras import Sequential, Input
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.metrics import MSE
-from tensorflow.keras.models import load_model
-
-# PID
-from scipy.integrate import odeint
-
 # Helper functions 
 import random
 import numpy as np
 import copy
 import time
-import matplotlib.pyplot as plt
+import os
 from collections import namedtuple, deque
 from typing import Optional
 from os.path import join
@@ -40,4 +25,9 @@ MAX_TEMP_SUMMER = 25
 SETPOINT_SUMMER = np.ones(n) * 21
 
 MIN_TEMP_WINTER = 0
-MAX_TEMP_WINTER = 14
\ No newline at end of file
+MAX_TEMP_WINTER = 14
+SETPOINT_WINTER = np.where((t >= 7*4) & (t < 22*4), 21, 17) # 17C night setback outside 07:00-22:00
+
+# SEASONS (long-horizon simulation)
+DAYS_PER_YEAR = 365
+COLDEST_DAY = 15 # day of the year (0 = 1st January)
\ No newline at end of file
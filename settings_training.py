@@ -1,48 +1,14 @@
-# Environment stuff
-import pygame
-import gymnasium as gym
-from gymnasium import Env
-from gymnasium.spaces import Box, Discrete
-from gym.error import DependencyNotInstalled
-from datetime import time as tim, datetime, timedelta
+# Shared constants & light imports (NumPy, gymnasium, weather), see settings.py
+from settings import *
 
 # Deep Q-Learning
 import utils
+from replay import ReplayBuffer, PrioritizedReplayBuffer
 
 # Deep Learning
-import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 import tensorflow as tf
-from tensorflow.keras import Sequential, Input
-from tensorflow.keras.layers import Dense
 from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.metrics import MSE
-from tensorflow.keras.models import load_model
-
-# PID
-from scipy.integrate import odeint
-
-# Helper functions 
-import random
-import numpy as np
-import copy
-import time
-import matplotlib.pyplot as plt
-import pickle
-import os
-from collections import namedtuple, deque
-from typing import Optional
-from os.path import join
-
-# WEATHER STUFF
-n = 96 # number of 15min periods in a day
-t = np.linspace(0,95,n) # timestep array
-MIN_TEMP_SUMMER = 12
-MAX_TEMP_SUMMER = 25
-SETPOINT_SUMMER = np.ones(n) * 21
-
-MIN_TEMP_WINTER = 0
-MAX_TEMP_WINTER = 14
 
 # HYPERPARAMETERS 
 TAU = 1e-3
@@ -59,12 +25,97 @@ MEMORY = 1000
 BATCH_SIZE = 20 
 NUM_STEPS_UPD = 4
 
+# Reward mechanism of the training env ("V1" or "V2", see RoomSimulator)
+REWARD_MECH = "V1"
+
+# Learning targets
+DOUBLE_DQN = False # the policy network picks the next action, the target network evaluates it
+N_STEP = 1 # rewards summed per return before bootstrapping
+
+# Prioritized Experience Replay
+PRIORITIZED_REPLAY = False
+PER_ALPHA = 0.6 # 0 = uniform sampling
+PER_BETA = 0.4 # importance-sampling exponent, annealed towards 1
+PER_BETA_INCREMENT = 1e-4 # per mini-batch
+PER_EPS = 1e-5
+
+# Fused learner: run this many updates (every NUM_STEPS_UPD * FUSED_UPDATES steps) in one
+# compiled call, sampling from a device-resident copy of the replay memory. 0 = off
+FUSED_UPDATES = 0
+
+# Distributed actor/learner (python training.py --distributed)
+NUM_ACTORS = 4
+WEIGHT_SYNC_UPDATES = 50 # the learner publishes new weights every N updates
+ACTOR_SYNC_STEPS = 96 # actors pick up new weights at most every N env steps
+ACTOR_MAX_LEAD_STEPS = 4 * 96 # actors pause once they are N env steps ahead of the learner
+
+# Checkpoints (every save_frequency episodes, written in the background; python training.py --resume)
+CHECKPOINT_KEEP = 3 # most recent checkpoints kept
+
+# Early stopping & compute budget (see scheduler.py; decisions logged to <reward_mech>_outputs/scheduler.jsonl)
+EVAL_FREQUENCY = 100 # episodes between greedy evaluations on fixed days, 0 = budgets only
+EVAL_DAYS = 200
+EVAL_SEED = 1000000 # away from evaluate.py's default days, which stay held out
+PATIENCE = 10 # evaluations without a MIN_DELTA improvement before stopping
+MIN_DELTA = 0.5
+MIN_EPISODES = 1000 # no plateau stop before this (epsilon is still high)
+TARGET_SCORE = None # stop once the evaluated score reaches this
+MAX_MINUTES = None # wall-clock budget
+MAX_ENV_STEPS = None # env-step budget
+
 # episode
 num_episodes = 3000
-experiences = namedtuple('Experience', 'state, action, reward, new_state, done_val')
-memory_buffer = deque(maxlen = MEMORY)
-epsilon = EPSILON
-score_hist = []
 avg_frequency = 200
-best_avg_score = 0
 save_frequency = 500
+
+class TrainingConfig():
+    """
+    Hyperparameters & run settings of one training run (see training.Trainer). Every field defaults to the
+    global of the same name above, upper case for hyperparameters, so editing this file still changes the
+    default run; any field can be overridden by keyword, e.g. TrainingConfig(alpha = 3e-4, batch_size = 64).
+    """
+
+    DEFAULTS = {
+        "tau": TAU, "gamma": GAMMA, "alpha": ALPHA,
+        "epsilon": EPSILON, "e_min": E_MIN, "e_decay": E_DECAY,
+        "memory": MEMORY, "batch_size": BATCH_SIZE, "num_steps_upd": NUM_STEPS_UPD,
+        "reward_mech": REWARD_MECH, "double_dqn": DOUBLE_DQN, "n_step": N_STEP,
+        "prioritized_replay": PRIORITIZED_REPLAY, "per_alpha": PER_ALPHA, "per_beta": PER_BETA,
+        "per_beta_increment": PER_BETA_INCREMENT, "per_eps": PER_EPS,
+        "fused_updates": FUSED_UPDATES,
+        "checkpoint_keep": CHECKPOINT_KEEP,
+        "eval_frequency": EVAL_FREQUENCY, "eval_days": EVAL_DAYS, "eval_seed": EVAL_SEED, "patience": PATIENCE,
+        "min_delta": MIN_DELTA, "min_episodes": MIN_EPISODES, "target_score": TARGET_SCORE,
+        "max_minutes": MAX_MINUTES, "max_env_steps": MAX_ENV_STEPS,
+        "num_episodes": num_episodes, "avg_frequency": avg_frequency, "save_frequency": save_frequency,
+    }
+
+    def __init__(self, **overrides):
+
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown training settings {sorted(unknown)}, expected some of {list(self.DEFAULTS)}")
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, overrides.get(name, default))
+
+        if self.reward_mech not in ("V1", "V2"):
+            raise ValueError(f"Invalid reward mechanism {self.reward_mech!r}, expected 'V1' or 'V2'")
+        if self.fused_updates and (self.prioritized_replay or self.n_step > 1):
+            raise ValueError("The fused learner samples one-step experiences uniformly on-device, so it can't be used with prioritized_replay or n_step > 1")
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+    def overrides(self):
+        """
+        Returns the fields that differ from the defaults
+        """
+
+        return {name: value for name, value in self.to_dict().items() if value != self.DEFAULTS[name]}
+
+    def make_replay(self, seed = None):
+        if self.prioritized_replay:
+            return PrioritizedReplayBuffer(self.memory, seed = seed, alpha = self.per_alpha, beta = self.per_beta,
+                                           beta_increment = self.per_beta_increment, eps = self.per_eps)
+
+        return ReplayBuffer(self.memory, seed = seed)
@@ -0,0 +1,201 @@
+"""
+Parameter sweeps over building physics. A policy (or baseline) is scored on every cell of a grid, or random
+sample, of heating_power x loss_coefficient x weather seed. Cells are spread over a process pool, each worker
+steps all of a cell's days at once in a VectorRoomSimulator, and finished cells are cached on disk by their
+parameters & a hash of the policy, so a rerun only computes new cells. Run from the repository root, e.g.
+
+    python sweep.py V1_outputs/best_model.keras --heating-power 0.3 0.5 0.7 --loss-coefficient 0.02 0.04 0.06
+    python sweep.py pid:1000,0,100 --random 50 --seeds 0 1 2 --csv pid_sweep.csv
+    python sweep.py thermostat --days 2000
+"""
+
+from settings import *
+from env import VectorRoomSimulator
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+class Thermostat():
+    """
+    Baseline policy: heating on whenever the room is below the setpoint
+    """
+
+    def __init__(self, setpoint = 21.0):
+        self.setpoint = setpoint
+
+    def __call__(self, states):
+        return (np.asarray(states) < self.setpoint).astype(np.int64)
+
+def load_sweep_policy(spec):
+    """
+    Returns (policy, hash) for a policy spec: "thermostat", "pid[:kp,ki,kd]" or a model path
+    (.keras, .npz or checkpoint directory, see evaluate.load_policy). PID gains are returned as a tuple.
+    """
+
+    if spec == "thermostat":
+        return Thermostat(), "thermostat"
+    if spec.split(":")[0] == "pid":
+        from pid import ROOM_GAINS
+        gains = tuple(float(g) for g in spec.split(":")[1].split(",")) if ":" in spec else ROOM_GAINS
+        return gains, f"pid:{gains}"
+
+    from evaluate import load_policy
+    policy = load_policy(spec)
+    digest = hashlib.sha256()
+    for w in policy.weights:
+        digest.update(np.ascontiguousarray(w).tobytes())
+
+    return policy, digest.hexdigest()
+
+def run_cell(policy, cell, num_days, reward_mech):
+    """
+    Scores a policy on one cell (heating_power, loss_coefficient, seed). The cell's rooms are reset with
+    seeds seed * num_days + i, so different seeds never share a day.
+    """
+
+    heating_power, loss_coefficient, seed = cell
+    if isinstance(policy, tuple):
+        from pid import compare
+        kp, ki, kd = policy
+        pid = compare(num_days, seed * num_days, reward_mech, heating_power, loss_coefficient, kp, ki, kd)["pid"]
+        return {key: value.item() for key, value in pid.items()} # one gain setting, arrays of shape (1,)
+
+    from evaluate import evaluate_policy
+    env = VectorRoomSimulator(num_days, heating_power, loss_coefficient, reward_mech = reward_mech)
+    result = evaluate_policy(policy, env, seed * num_days)
+
+    return {key: result[key] for key in ["mean_score", "band_occupancy", "duty_cycle"]}
+
+def cell_key(policy_hash, cell, num_days, reward_mech):
+    params = json.dumps([policy_hash, *cell, num_days, reward_mech])
+
+    return hashlib.sha256(params.encode()).hexdigest()[:32]
+
+def grid_cells(heating_powers, loss_coefficients, seeds):
+    return [(float(h), float(l), int(s)) for h in heating_powers for l in loss_coefficients for s in seeds]
+
+def random_cells(num, heating_power_range, loss_coefficient_range, seeds, seed = 0):
+    rng = np.random.default_rng(seed)
+    heating_powers = rng.uniform(*heating_power_range, size = num).round(4)
+    loss_coefficients = rng.uniform(*loss_coefficient_range, size = num).round(4)
+
+    return [(float(h), float(l), int(s)) for h, l in zip(heating_powers, loss_coefficients) for s in seeds]
+
+def sweep(spec, cells, num_days = 500, reward_mech = "V1", workers = None, cache_dir = "sweep_cache"):
+    """
+    Scores a policy on every cell, reusing cached cells.
+
+    Args:
+        spec (str):
+            Policy spec, see load_sweep_policy
+        cells (list):
+            (heating_power, loss_coefficient, seed) tuples
+        num_days (int):
+            Days (rooms) per cell
+        reward_mech (str):
+            "V1" or "V2"
+        workers (int):
+            Process pool size (default: number of CPUs); 0 runs every cell in this process
+        cache_dir (str):
+            One small JSON file per finished cell is kept here
+
+    Returns:
+        results (list):
+            One dict per cell: heating_power, loss_coefficient, seed, mean_score, band_occupancy & duty_cycle
+    """
+
+    policy, policy_hash = load_sweep_policy(spec)
+    os.makedirs(cache_dir, exist_ok = True)
+    paths = [join(cache_dir, f"{cell_key(policy_hash, cell, num_days, reward_mech)}.json") for cell in cells]
+
+    results = [None] * len(cells)
+    todo = []
+    for i, path in enumerate(paths):
+        if os.path.exists(path):
+            with open(path) as file:
+                results[i] = json.load(file)
+        else:
+            todo.append(i)
+
+    def finish(i, metrics):
+        results[i] = dict(zip(["heating_power", "loss_coefficient", "seed"], cells[i]), **metrics)
+        with open(paths[i] + ".tmp", "w") as file:
+            json.dump(results[i], file)
+        os.replace(paths[i] + ".tmp", paths[i])
+
+    if workers == 0:
+        for i in todo:
+            finish(i, run_cell(policy, cells[i], num_days, reward_mech))
+    elif todo:
+        # spawn, so workers never inherit a TensorFlow runtime loaded to read a .keras model
+        with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context("spawn")) as pool:
+            futures = {i: pool.submit(run_cell, policy, cells[i], num_days, reward_mech) for i in todo}
+            for i, future in futures.items():
+                finish(i, future.result())
+
+    return results
+
+def summarize(results):
+    """
+    Averages the results over seeds: one row per (heating_power, loss_coefficient), with the mean score's
+    standard deviation across seeds
+    """
+
+    groups = {}
+    for result in results:
+        groups.setdefault((result["heating_power"], result["loss_coefficient"]), []).append(result)
+
+    rows = []
+    for (heating_power, loss_coefficient), group in sorted(groups.items()):
+        scores = np.array([result["mean_score"] for result in group])
+        rows.append({
+            "heating_power": heating_power,
+            "loss_coefficient": loss_coefficient,
+            "seeds": len(group),
+            "mean_score": float(scores.mean()),
+            "score_std": float(scores.std()),
+            "band_occupancy": float(np.mean([result["band_occupancy"] for result in group])),
+            "duty_cycle": float(np.mean([result["duty_cycle"] for result in group])),
+        })
+
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    import csv
+
+    parser = argparse.ArgumentParser(description = "Score a policy over heating_power x loss_coefficient x weather seeds")
+    parser.add_argument("policy", help = "model path (.keras/.npz/checkpoint), 'thermostat' or 'pid[:kp,ki,kd]' (heater duty per degC)")
+    parser.add_argument("--heating-power", type = float, nargs = "+", default = [0.3, 0.4, 0.5, 0.6, 0.7])
+    parser.add_argument("--loss-coefficient", type = float, nargs = "+", default = [0.02, 0.03, 0.04, 0.05, 0.06])
+    parser.add_argument("--random", type = int, help = "sample this many (heating_power, loss_coefficient) pairs instead of the grid")
+    parser.add_argument("--heating-power-range", type = float, nargs = 2, default = [0.2, 1.0])
+    parser.add_argument("--loss-coefficient-range", type = float, nargs = 2, default = [0.01, 0.1])
+    parser.add_argument("--seeds", type = int, nargs = "+", default = [0])
+    parser.add_argument("--days", type = int, default = 500, help = "days (rooms) per cell")
+    parser.add_argument("--reward-mech", default = "V1")
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--cache-dir", default = "sweep_cache")
+    parser.add_argument("--csv", help = "write the per-cell results to this file")
+    args = parser.parse_args()
+
+    if args.random:
+        cells = random_cells(args.random, args.heating_power_range, args.loss_coefficient_range, args.seeds)
+    else:
+        cells = grid_cells(args.heating_power, args.loss_coefficient, args.seeds)
+
+    start = time.perf_counter()
+    results = sweep(args.policy, cells, args.days, args.reward_mech, args.workers, args.cache_dir)
+
+    print(f"{'heating':>8} {'loss':>7} {'mean':>7} {'std':>6} {'in band':>8} {'duty':>6}")
+    for row in summarize(results):
+        print(f"{row['heating_power']:8.3f} {row['loss_coefficient']:7.4f} {row['mean_score']:7.2f} {row['score_std']:6.2f} "
+              f"{row['band_occupancy']:8.1%} {row['duty_cycle']:6.1%}")
+    print(f"{len(cells)} cells x {args.days} days in {time.perf_counter() - start:.1f}s")
+
+    if args.csv:
+        with open(args.csv, "w", newline = "") as file:
+            writer = csv.DictWriter(file, fieldnames = list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
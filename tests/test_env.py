@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from env import RoomSimulator, VectorRoomSimulator
+
+@pytest.mark.parametrize("reward_mech", ["V1", "V2"])
+@pytest.mark.parametrize("timestep", [{}, {"dt": 5, "action_repeat": 3}])
+def test_vector_env_matches_scalar_env(reward_mech, timestep):
+    num_envs, seed = 8, 100
+    vector_env = VectorRoomSimulator(num_envs, 0.5, 0.04, reward_mech = reward_mech, **timestep)
+    envs = [RoomSimulator(0.5, 0.04, reward_mech = reward_mech, **timestep) for _ in range(num_envs)]
+
+    states = vector_env.reset(seed = seed)
+    np.testing.assert_array_equal(states, [env.reset(seed = seed + i) for i, env in enumerate(envs)])
+
+    actions = np.random.default_rng(0).integers(2, size = (len(vector_env.num_timesteps), num_envs))
+    for step_actions in actions:
+        states, rewards, dones, info = vector_env.step(step_actions)
+        results = [env.step(int(action)) for env, action in zip(envs, step_actions)]
+
+        room_temps = info.get("final_observation", states)
+        np.testing.assert_allclose(room_temps, [result[0] for result in results], rtol = 0, atol = 1e-12)
+        np.testing.assert_allclose(rewards, [result[1] for result in results], rtol = 0, atol = 1e-12)
+        np.testing.assert_array_equal(dones, [result[2] for result in results])
+
+    # the day ends together, with the same scores
+    assert dones.all()
+    np.testing.assert_allclose(info["final_score"], [env.score for env in envs], rtol = 0, atol = 1e-9)
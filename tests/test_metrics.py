@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+from metrics import MetricsStore, RollingStats
+
+COLUMNS = {"episode": np.int64, "score": np.float64, "loss": np.float64}
+
+def test_append_flushes_in_chunks(tmp_path):
+    store = MetricsStore(str(tmp_path), COLUMNS, chunk_rows = 4)
+    for ep in range(6):
+        store.append({"episode": ep, "score": ep / 2, "loss": None if ep == 0 else 1.0})
+
+    # the 5th & 6th rows are still buffered
+    assert len(store) == 6 and store.stored_rows() == 4
+    np.testing.assert_array_equal(store.column("episode"), [0, 1, 2, 3])
+
+    store.close()
+    assert store.stored_rows() == 6
+    np.testing.assert_array_equal(store.column("score"), np.arange(6) / 2)
+    assert np.isnan(store.column("loss")[0]) and store.column("loss")[1] == 1.0 # missing values are NaN
+
+def test_truncate_on_resume(tmp_path):
+    store = MetricsStore(str(tmp_path), COLUMNS, chunk_rows = 4)
+    for ep in range(10):
+        store.append({"episode": ep, "score": float(ep)})
+    store.flush()
+    rows_at_checkpoint = 6
+    store.close()
+
+    # a resumed run re-opens the store (its own columns) & cuts it back to the checkpoint
+    resumed = MetricsStore(str(tmp_path), chunk_rows = 4)
+    assert resumed.columns == {name: np.dtype(dtype) for name, dtype in COLUMNS.items()}
+    assert len(resumed) == 10
+    resumed.truncate(rows_at_checkpoint)
+    for ep in range(rows_at_checkpoint, 8):
+        resumed.append({"episode": ep, "score": -float(ep)})
+    resumed.close()
+
+    np.testing.assert_array_equal(resumed.column("episode"), np.arange(8))
+    np.testing.assert_array_equal(resumed.column("score"), [0, 1, 2, 3, 4, 5, -6, -7])
+    assert os.path.getsize(tmp_path / "score.bin") == 8 * 8
+
+def test_partial_row_is_ignored(tmp_path):
+    store = MetricsStore(str(tmp_path), COLUMNS, chunk_rows = 2)
+    for ep in range(2):
+        store.append({"episode": ep, "score": 1.0, "loss": 1.0})
+    with open(tmp_path / "episode.bin", "ab") as file:
+        file.write(b"\0" * 3) # crash half way through a write
+
+    assert MetricsStore(str(tmp_path)).stored_rows() == 2
+
+def test_missing_store_needs_columns(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MetricsStore(str(tmp_path / "missing"))
+
+@pytest.mark.parametrize("window", [1, 5, 8])
+def test_rolling_stats_match_numpy(window):
+    values = np.random.default_rng(0).normal(20, 3, size = 37)
+    stats = RollingStats(window)
+    assert len(stats) == 0 and np.isnan(stats.mean()) and np.isnan(stats.std())
+
+    for n, value in enumerate(values, start = 1):
+        stats.append(value)
+        last = values[max(n - window, 0):n]
+        assert len(stats) == len(last)
+        assert stats.mean() == pytest.approx(last.mean())
+        assert stats.std() == pytest.approx(last.std(), abs = 1e-9)
+
+def test_rolling_stats_extend():
+    stats = RollingStats(3)
+    stats.extend(np.array([1.0, 2.0, 3.0, 4.0]))
+
+    assert stats.mean() == pytest.approx(3.0) and stats.std() == pytest.approx(np.std([2.0, 3.0, 4.0]))
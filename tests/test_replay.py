@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+import utils
+from replay import ReplayBuffer, SumTree, PrioritizedReplayBuffer
+
+# an episode of 3 steps ending in done, then 3 steps of the next one, the last being the newest experience
+EPISODES = [(0, 1, 1), (1, 2, 2), (2, 4, 3), (10, 8, 11), (11, 16, 12), (12, 32, 13)]
+DONE_AT = 2
+
+def filled_buffer(priorities, alpha = 1.0, beta = 0.5):
+    memory = PrioritizedReplayBuffer(len(priorities), seed = 0, alpha = alpha, beta = beta, beta_increment = 0.1, eps = 0.0)
+    for i in range(len(priorities)):
+        memory.append(i, 0, 0.0, i + 1, False)
+    memory.tree.update(np.arange(len(priorities)), np.asarray(priorities, dtype = np.float64) ** alpha)
+
+    return memory
+
+def episodic_buffer(memory):
+    for i, (state, reward, new_state) in enumerate(EPISODES):
+        memory.append(state, 0, reward, new_state, i == DONE_AT)
+
+    return memory
+
+def test_sum_tree_prefix_sums():
+    tree = SumTree(5) # rounded up to 8 leaves
+    tree.update(np.arange(5), [1.0, 2.0, 0.0, 3.0, 4.0])
+
+    assert tree.num_leaves == 8 and tree.total() == 10.0
+    # leaf i covers [sum(p[:i]), sum(p[:i+1])), empty leaves are never found
+    values = np.array([0.0, 0.999, 1.0, 2.999, 3.0, 5.999, 6.0, 9.999])
+    np.testing.assert_array_equal(tree.find(values), [0, 0, 1, 1, 3, 3, 4, 4])
+
+def test_sum_tree_update_recomputes_ancestors():
+    tree = SumTree(4)
+    tree.update(np.arange(4), [1.0, 1.0, 1.0, 1.0])
+    tree.update([1, 1, 3], [5.0, 5.0, 0.5]) # duplicates in one batch are fine
+
+    np.testing.assert_array_equal(tree.priorities(np.arange(4)), [1.0, 5.0, 1.0, 0.5])
+    assert tree.tree[2] == 6.0 and tree.tree[3] == 1.5 and tree.total() == 7.5
+    np.testing.assert_array_equal(tree.find(np.array([0.5, 1.0, 6.0, 7.0])), [0, 1, 2, 3])
+
+def test_prioritized_sampling_follows_priorities():
+    memory = filled_buffer([1.0, 0.0, 3.0, 0.0])
+
+    # stratified: each of the 400 equal slices of the total priority gives one sample
+    idx = memory.sample_indices(400)
+    np.testing.assert_array_equal(np.bincount(idx, minlength = 4), [100, 0, 300, 0])
+
+def test_importance_sampling_weights():
+    memory = filled_buffer([1.0, 3.0], beta = 0.5)
+    _, idx, weights = memory.sample_prioritized(4)
+
+    # (N * P(i))^-beta, normalized by the largest
+    probs = np.array([0.25, 0.75])[idx]
+    expected = (2 * probs) ** -0.5
+    np.testing.assert_allclose(weights, expected / expected.max(), rtol = 1e-6)
+    assert weights.dtype == np.float32
+    assert memory.beta == pytest.approx(0.6) # annealed once per sample
+
+def test_update_priorities():
+    memory = filled_buffer([1.0, 1.0, 1.0], alpha = 0.5)
+    memory.eps = 0.25
+    memory.update_priorities(np.array([0, 2]), np.array([-3.75, 0.0]))
+
+    # (|td error| + eps)^alpha, & new experiences get the highest priority seen so far
+    np.testing.assert_allclose(memory.tree.priorities(np.arange(3)), [2.0, 1.0, 0.5])
+    assert memory.max_priority == 4.0
+    memory.append(3, 0, 0.0, 4, False) # overwrites experience 0
+    assert memory.tree.priorities(np.array([0]))[0] == 2.0
+
+def test_n_step_returns_stop_at_episode_end_and_newest_experience():
+    memory = episodic_buffer(ReplayBuffer(8, seed = 0))
+    rewards, new_states, done_vals, discounts = memory.n_step_returns(np.arange(6), n_step = 3, gamma = 0.5)
+
+    # 1 + 0.5*2 + 0.25*4, cut at the done of experience 2 & at the newest experience 5
+    np.testing.assert_allclose(rewards, [3, 4, 4, 24, 32, 32])
+    np.testing.assert_array_equal(new_states[:, 0], [3, 3, 3, 13, 13, 13])
+    np.testing.assert_array_equal(done_vals, [1, 1, 1, 0, 0, 0])
+    np.testing.assert_allclose(discounts, [0.125, 0.25, 0.5, 0.125, 0.25, 0.5])
+
+def test_n_step_returns_follow_stride():
+    memory = ReplayBuffer(8, seed = 0)
+    # two envs stepped together, their experiences interleaved
+    memory.append_batch(np.array([[0], [100]]), np.zeros(2), np.array([1, 10]), np.array([[1], [101]]), np.zeros(2))
+    memory.append_batch(np.array([[1], [101]]), np.zeros(2), np.array([2, 20]), np.array([[2], [102]]), np.zeros(2))
+
+    rewards, new_states, _, discounts = memory.n_step_returns(np.array([0, 1]), n_step = 2, gamma = 0.5, stride = 2)
+    np.testing.assert_allclose(rewards, [2, 20])
+    np.testing.assert_array_equal(new_states[:, 0], [2, 102])
+    np.testing.assert_allclose(discounts, [0.25, 0.25])
+
+    # with the wrong stride the next experience is the other env's, which doesn't continue the trajectory
+    rewards, new_states, _, discounts = memory.n_step_returns(np.array([0, 1]), n_step = 2, gamma = 0.5, stride = 1)
+    np.testing.assert_allclose(rewards, [1, 10])
+    np.testing.assert_array_equal(new_states[:, 0], [1, 101])
+    np.testing.assert_allclose(discounts, [0.5, 0.5])
+
+def test_n_step_experiences_from_prioritized_buffer():
+    memory = episodic_buffer(PrioritizedReplayBuffer(8, seed = 0, alpha = 1.0, beta = 0.5, beta_increment = 0.0, eps = 0.0))
+    memory.tree.update(np.arange(6), [1.0, 0.0, 0.0, 0.0, 3.0, 0.0]) # only 0 & 4 are sampled
+
+    (states, _, returns, new_states, done_vals), gammas, idx, weights = utils.get_n_step_experiences(memory, 8, 3, 0.5)
+
+    assert set(idx.tolist()) == {0, 4}
+    first = idx == 0
+    np.testing.assert_array_equal(states.numpy()[:, 0], np.where(first, 0, 11))
+    np.testing.assert_allclose(returns.numpy(), np.where(first, 3, 32))
+    np.testing.assert_array_equal(new_states.numpy()[:, 0], np.where(first, 3, 13))
+    np.testing.assert_array_equal(done_vals.numpy(), np.where(first, 1, 0))
+    np.testing.assert_allclose(gammas.numpy(), np.where(first, 0.125, 0.25))
+    # the n-step return doesn't change the importance-sampling weights
+    expected = (6 * np.where(first, 0.25, 0.75)) ** -0.5
+    np.testing.assert_allclose(weights.numpy(), expected / expected.max(), rtol = 1e-6)
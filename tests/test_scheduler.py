@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from env import RoomSimulator
+from scheduler import TrainingScheduler
+
+def strict_loads(line):
+    def reject(constant):
+        raise ValueError(f"{constant} isn't valid JSON")
+
+    return json.loads(line, parse_constant = reject)
+
+def test_budget_stop_before_first_evaluation(tmp_path):
+    log_path = tmp_path / "scheduler.jsonl"
+    scheduler = TrainingScheduler(RoomSimulator(0.5, 0.04), eval_frequency = 0, max_env_steps = 96, log_path = str(log_path))
+    scheduler.restore(0)
+
+    assert scheduler.update(1, 96, None)
+    record = strict_loads(log_path.read_text().splitlines()[-1])
+    assert record["reason"] == "env_step_budget" and record["best_score"] is None
+
+    # & reads back as no evaluation yet
+    scheduler.restore(1)
+    assert scheduler.best_score == -float("inf")
+
+def test_restore_time_spent(tmp_path):
+    log_path = tmp_path / "scheduler.jsonl"
+    log_path.write_text(json.dumps({"episode": 100, "env_steps": 9600, "seconds": 5.0, "eval_score": 40.0,
+                                    "best_score": 40.0, "best_episode": 100, "stale": 0, "decision": "improved"}) + "\n")
+    scheduler = TrainingScheduler(RoomSimulator(0.5, 0.04), log_path = str(log_path))
+
+    # the last record's time, or the checkpoint's, which includes the time since that record
+    scheduler.restore(150)
+    assert scheduler.elapsed() == pytest.approx(5.0, abs = 1.0)
+    scheduler.restore(150, seconds = 42.0)
+    assert scheduler.elapsed() == pytest.approx(42.0, abs = 1.0)
+    assert scheduler.best_score == 40.0
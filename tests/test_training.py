@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from env import RoomSimulator
+from training import Trainer, TrainingConfig
+
+def tiny_config(**overrides):
+    return TrainingConfig(**{
+        "num_episodes": 1, "eval_frequency": 0, "memory": 200, "batch_size": 8, "avg_frequency": 1,
+        "save_frequency": 1, "checkpoint_keep": 1, **overrides,
+    })
+
+def test_trainers_one_after_another(tmp_path):
+    # agent_learn is shared by every trainer in the process & retraced for each new one
+    for k in range(2):
+        trainer = Trainer(tiny_config(), RoomSimulator(0.5, 0.04, reward_mech = "V1"), str(tmp_path / f"run-{k}"))
+        trainer.train()
+
+        losses = trainer.metrics_store.column("loss")
+        assert len(losses) == 1 and np.isfinite(losses[0])
+
+@pytest.mark.parametrize("fused_updates", [16, 32])
+def test_fused_updates_match_serial(tmp_path, fused_updates):
+    # 4 episodes = 384 env steps = 96 updates of num_steps_upd 4, whether or not they are fused; a fused
+    # call (64 or 128 env steps) doesn't line up with the 96-step episodes
+    updates = []
+    for fused in [0, fused_updates]:
+        config = tiny_config(num_episodes = 4, memory = 1000, batch_size = 4, num_steps_upd = 4, fused_updates = fused,
+                             save_frequency = 4)
+        trainer = Trainer(config, RoomSimulator(0.5, 0.04, reward_mech = "V1"), str(tmp_path / f"fused-{fused}"))
+        trainer.train()
+        updates.append(int(trainer.optimizer.iterations.numpy()))
+
+    assert updates == [96, 96]
+
+def seeded_trainer(config, save_dir):
+    env = RoomSimulator(0.5, 0.04, reward_mech = "V1")
+    env.reset(seed = 0)
+    trainer = Trainer(config, env, save_dir)
+    trainer.action_selector.rng.reset_from_seed(0)
+    trainer.memory_buffer.rng = np.random.default_rng(0)
+
+    return trainer
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    config = tiny_config(num_episodes = 4, save_frequency = 2, checkpoint_keep = 2, e_decay = 0.9)
+    trainer = seeded_trainer(config, str(tmp_path / "run"))
+    trainer.train()
+    scores = trainer.metrics_store.column("score")
+    weights = trainer.policy_network.get_weights()
+
+    # fresh objects (other rng states), resumed half way through from the same directory
+    resumed = seeded_trainer(config, str(tmp_path / "run"))
+    resumed.action_selector.rng.reset_from_seed(1)
+    resumed.env.reset(seed = 1)
+    resumed.resume(str(tmp_path / "run" / "checkpoints" / "ckpt-2"))
+    resumed.train()
+
+    np.testing.assert_array_equal(resumed.metrics_store.column("score"), scores)
+    assert resumed.env_steps == trainer.env_steps
+    for resumed_weight, weight in zip(resumed.policy_network.get_weights(), weights):
+        np.testing.assert_allclose(resumed_weight, weight, rtol = 1e-5, atol = 1e-6)
@@ -1,120 +1,414 @@
 from settings_training import *
 from env import RoomSimulator
+from learner import agent_learn, agent_learn_fused, DeviceReplay, build_optimizer
+from instrumentation import PhaseTimer, MetricsSink, EpisodeProfiler
+from metrics import MetricsStore, RollingStats
+from scheduler import TrainingScheduler
+import checkpoint
+import argparse
 
-# @tf.function allows computations to be carried out in graph-mode instead of eager execution
-@tf.function
-def agent_learn(policy_network, target_network, experiences, gamma, tau):
+class Trainer():
     """
-    Agent performs a gradient descent step in the policy network &
-    updates weights within the target network using a softmax update.
+    One DQN training run: networks, optimizer, replay memory, loop state & outputs, all set up from a
+    TrainingConfig, so several trainers (e.g. search.py's trials) can live in one process.
 
     Args:
-        policy_network (Sequential):
-            Policy network used to predict the best action in the env
-        target_network (Sequential):
-            Network outputting the targets (optimal sets of Q-values)
-        experiences (tuple):
-            tuple of experiences in the form (states, actions, reward, new_states, done_vals)
-        gamma (float):
-            Discount factor used in Bellman's equation
+        config (TrainingConfig):
+            Hyperparameters & run settings
+        env (RoomSimulator):
+            Env to train in
+        save_dir (str):
+            Where models, checkpoints, metrics & the scheduler log go (default <reward_mech>_outputs)
     """
-    # tf needs to know what operations happened during the forward pass, and in what order, so 
-    # that it can use back-propagation to compute gradients
-    with tf.GradientTape() as tape:
-        # forward pass
-        loss = utils.compute_loss_tf(policy_network, target_network, experiences, gamma)
-
-    # backward pass
-    gradients = tape.gradient(loss, policy_network.trainable_variables)
-
-    # perform a gradient descent step in policy network
-    optimizer.apply_gradients(zip(gradients, policy_network.trainable_variables))
-
-    # update target network
-    utils.update_target_network(target_network, policy_network, tau)
-
-# load environment
-env = RoomSimulator(0.5,0.04,reward_mech='V3')
-state_shape = np.shape(np.expand_dims(env.reset(), axis = 0))
-
-# load networks
-policy_network = Sequential(
-    [
-        Input(shape = state_shape),
-        Dense(units = 64, activation = 'relu'),
-        Dense(units = 64, activation = 'relu'),
-        Dense(units = 3, activation = 'linear')
-    ]
-)
-
-target_network = Sequential(
-    [
-        Input(shape = state_shape),
-        Dense(units = 64, activation = 'relu'),
-        Dense(units = 64, activation = 'relu'),
-        Dense(units = 3, activation = 'linear')
-    ]
-)
-optimizer = Adam(learning_rate = ALPHA)
-
-save_dir = env.reward_mech + '_outputs'
-if not os.path.exists(save_dir):
-    os.makedirs(save_dir)
-
-start_time = time.time()
-for ep in range(num_episodes):
-    # standard resets
-    done = False
-    score = 0
-    state = env.reset()
-
-    for i in range(1, len(env.num_timesteps)+1):
-
-        # epsilon-greedy strategy
-        state_net = np.expand_dims(state, axis = 0)
-        q_values = policy_network(state_net)
-        action = utils.choose_action(env, epsilon, q_values)
-
-        # take action & store experience
-        new_state, reward, done, info = env.step(action)
-        experience = experiences(state, action, reward, new_state, done)
-        memory_buffer.append(experience)
-
-        # update networks?
-        if utils.check_update(i, NUM_STEPS_UPD, memory_buffer, BATCH_SIZE):
-            exps = utils.get_experiences(memory_buffer, BATCH_SIZE)
-            agent_learn(policy_network, target_network, exps, GAMMA, TAU)
-
-        # reset state and update score
-        state = new_state
-        score += reward
-
-        # is the episode over?
-        if done:
-            break
-
-    # append results
-    score_hist.append(score)
-    score_avg = np.mean(score_hist[-avg_frequency:])
-
-    # update epsilon
-    epsilon = utils.update_epsilon(epsilon, E_MIN, E_DECAY)
-
-    # output metrics & save best models
-    if (ep + 1) % avg_frequency == 0:
-        print(f'Episode {ep + 1}: Average Reward over the last {avg_frequency} episodes: {score_avg}')
-        if score_avg > best_avg_score:
-            policy_network.save(join(f'{save_dir}','best_model.keras'))
-            best_avg_score = score_avg
-    
-    if (ep+1) % save_frequency == 0:
-        policy_network.save(join(f'{save_dir}',f'policy_network_{ep+1}.keras'))
-
-# Save final policies
-policy_network.save(join(f'{save_dir}','final_policy_network.keras'))
-target_network.save(join(f'{save_dir}','final_target_network.keras'))
-# Save scores 
-with open(join(f'{save_dir}','score_hist.pkl'), 'wb') as file:
-    pickle.dump(score_hist, file)
-time_taken = time.time() - start_time
-print(f"Training for {num_episodes} episodes took {time_taken/60:.0f} minutes")
+
+    def __init__(self, config, env, save_dir = None):
+
+        self.config = config
+        self.env = env
+        state_shape = np.shape(np.expand_dims(env.reset(), axis = 0))
+
+        # load networks
+        self.policy_network = utils.build_network(state_shape, 3)
+        self.target_network = utils.build_network(state_shape, 3)
+        self.action_selector = utils.ActionSelector(self.policy_network, env.action_space.n)
+        self.optimizer = Adam(learning_rate = config.alpha)
+        # slot variables up front, not inside agent_learn's trace, which is shared by every trainer
+        # in the process & retraced for each new one
+        build_optimizer(self.optimizer, self.policy_network)
+        self.memory_buffer = config.make_replay()
+        if config.fused_updates:
+            self.device_replay = DeviceReplay(self.memory_buffer)
+
+        self.save_dir = env.reward_mech + '_outputs' if save_dir is None else save_dir
+        if not os.path.exists(self.save_dir):
+            os.makedirs(self.save_dir)
+        self.checkpoint_dir = join(self.save_dir, 'checkpoints')
+        self.checkpointer = checkpoint.Checkpointer(self.checkpoint_dir, config.checkpoint_keep)
+
+        # loop state
+        self.start_episode = 0
+        self.epsilon = config.epsilon
+        self.best_avg_score = 0
+        self.env_steps = 0
+        self.resumed_seconds = None # training time before the checkpoint being resumed
+
+        # instrumentation (set up by the command line flags)
+        self.timer = PhaseTimer()
+        for phase in ["act", "env_step", "store", "sample", "learn", "save", "drain", "publish"]:
+            self.timer.phase(phase)
+        self.metrics_sink = None
+        self.profiler = None
+
+        # early stopping & compute budgets (see scheduler.py)
+        self.scheduler = TrainingScheduler(
+            env, config.eval_frequency, config.eval_days, config.eval_seed, config.patience, config.min_delta,
+            config.min_episodes, config.target_score, config.max_minutes and config.max_minutes * 60,
+            config.max_env_steps, join(self.save_dir, 'scheduler.jsonl'), join(self.save_dir, 'best_eval_model.keras')
+        )
+
+        # per-episode metrics, appended to <save_dir>/metrics as training goes (see metrics.py)
+        self.metrics_store = MetricsStore(join(self.save_dir, 'metrics'), {
+            "episode": np.int64, "score": np.float64, "epsilon": np.float64, "loss": np.float64, "steps": np.int64,
+        }, chunk_rows = 64)
+        self.score_avg = RollingStats(config.avg_frequency)
+
+    def learn(self):
+        """
+        Performs one network update (fused_updates updates in fused mode) from the memory buffer
+        & returns the loss
+        """
+
+        config, timer = self.config, self.timer
+        if config.fused_updates:
+            with timer.phase("sample"):
+                self.device_replay.sync(self.memory_buffer)
+            with timer.phase("learn"):
+                return agent_learn_fused(self.policy_network, self.target_network, self.optimizer, self.device_replay,
+                                         tf.constant(config.fused_updates), config.batch_size, config.gamma, config.tau,
+                                         config.double_dqn)
+
+        with timer.phase("sample"):
+            if config.n_step > 1:
+                exps, gamma, idx, weights = utils.get_n_step_experiences(self.memory_buffer, config.batch_size,
+                                                                         config.n_step, config.gamma)
+            elif config.prioritized_replay:
+                exps, idx, weights = utils.get_prioritized_experiences(self.memory_buffer, config.batch_size)
+                gamma = config.gamma
+            else:
+                exps, gamma, weights = utils.get_experiences(self.memory_buffer, config.batch_size), config.gamma, None
+        with timer.phase("learn"):
+            loss, td_errors = agent_learn(self.policy_network, self.target_network, self.optimizer, exps, gamma,
+                                          config.tau, weights, config.double_dqn)
+            if config.prioritized_replay:
+                self.memory_buffer.update_priorities(idx, td_errors.numpy())
+
+        return loss
+
+    def end_episode(self, ep, score):
+        """
+        Episode bookkeeping shared by the serial & distributed loops: records the score, decays epsilon,
+        prints the moving average & saves the best & periodic models
+        """
+
+        config = self.config
+
+        # append results
+        self.score_avg.append(score)
+
+        # update epsilon
+        self.epsilon = utils.update_epsilon(self.epsilon, config.e_min, config.e_decay)
+
+        # output metrics & save best models
+        with self.timer.phase("save"):
+            if (ep + 1) % config.avg_frequency == 0:
+                print(f'Episode {ep + 1}: Average Reward over the last {config.avg_frequency} episodes: {self.score_avg.mean()}')
+                if self.score_avg.mean() > self.best_avg_score:
+                    self.policy_network.save(join(f'{self.save_dir}','best_model.keras'))
+                    self.best_avg_score = self.score_avg.mean()
+
+            # resumable checkpoint, written in the background
+            if (ep+1) % config.save_frequency == 0:
+                self.save_checkpoint(ep + 1)
+
+    def save_checkpoint(self, episodes):
+        self.metrics_store.flush()
+        self.checkpointer.save(checkpoint.snapshot(episodes, self.epsilon, self.best_avg_score, len(self.metrics_store),
+                                                   self.policy_network, self.target_network, self.optimizer,
+                                                   self.memory_buffer, self.scheduler.elapsed(), self.action_selector.rng,
+                                                   getattr(self.env, "rng", None)))
+
+    def resume(self, path):
+        """
+        Restores the networks, optimizer, replay buffer, loop state & random generators from a checkpoint directory
+        """
+
+        ckpt = checkpoint.load_checkpoint(path)
+        self.policy_network.set_weights(ckpt["policy_weights"])
+        self.target_network.set_weights(ckpt["target_weights"])
+        build_optimizer(self.optimizer, self.policy_network)
+        for variable, value in zip(self.optimizer.variables, ckpt["optimizer"]):
+            variable.assign(value)
+        checkpoint.restore_replay(self.memory_buffer, ckpt)
+
+        state = ckpt["state"]
+        self.epsilon, self.best_avg_score, self.start_episode = state["epsilon"], state["best_avg_score"], state["episode"]
+        self.metrics_store.truncate(state["metrics_rows"])
+        self.score_avg.extend(self.metrics_store.column("score")[-self.config.avg_frequency:])
+        self.env_steps = int(self.metrics_store.column("steps").sum())
+        self.resumed_seconds = state.get("seconds") # not in older checkpoints
+        # same exploration & days as the uninterrupted run
+        if state.get("action_rng") is not None:
+            self.action_selector.rng.reset(state["action_rng"])
+        if state.get("env_rng") is not None:
+            self.env.rng = np.random.default_rng()
+            self.env.rng.bit_generator.state = state["env_rng"]
+        print(f'Resumed from {path} after {self.start_episode} episodes')
+
+    def record_episode(self, ep, score, steps, losses, seconds):
+        """
+        Counts the episode's env steps & appends its score, epsilon, mean loss & steps to the metrics store, and writes them with
+        steps/sec & phase timings to the metrics sink if there is one (phase timers are reset either way).
+        Called before end_episode, so epsilon is the one the episode was played with & the row is in the
+        store before a checkpoint records the store's length.
+
+        Args:
+            ep (int):
+                Episode index
+            score (float):
+                Episode score
+            steps (int):
+                Env steps taken since the last record
+            losses (list):
+                Loss tensors returned by learn() since the last record
+            seconds (float):
+                Wall-clock time since the last record
+        """
+
+        self.env_steps += steps
+        phases = self.timer.snapshot()
+        record = {
+            "episode": ep + 1,
+            "score": float(score),
+            "epsilon": float(self.epsilon),
+            "loss": float(tf.reduce_mean(tf.stack(losses))) if losses else None,
+            "steps": steps,
+        }
+        self.metrics_store.append(record)
+
+        if self.metrics_sink is not None:
+            self.metrics_sink.write({**record, "steps_per_sec": steps / seconds, **phases})
+
+    def end_training(self, start_time, episodes):
+        # checkpoint the last episode too, so an early-stopped run can be resumed with a larger budget
+        if episodes % self.config.save_frequency != 0:
+            self.save_checkpoint(episodes)
+        self.checkpointer.close()
+        # Save final policies
+        self.policy_network.save(join(f'{self.save_dir}','final_policy_network.keras'))
+        self.target_network.save(join(f'{self.save_dir}','final_target_network.keras'))
+        # Save scores
+        self.metrics_store.close()
+        time_taken = time.time() - start_time
+        print(f"Training for {episodes - self.start_episode} episodes took {time_taken/60:.0f} minutes")
+
+    def train(self):
+        """
+        Collects experience & learns serially in this process
+        """
+
+        config, env, timer, profiler = self.config, self.env, self.timer, self.profiler
+        start_time = time.time()
+        self.scheduler.restore(self.start_episode, self.resumed_seconds)
+        if self.start_episode == 0: self.metrics_store.truncate(0) # fresh run
+        ep = self.start_episode - 1
+        for ep in range(self.start_episode, config.num_episodes):
+            if profiler is not None: profiler.episode_start(ep)
+            episode_start = time.perf_counter()
+            losses = []
+
+            # standard resets
+            done = False
+            score = 0
+            state = env.reset()
+
+            for i in range(1, len(env.num_timesteps)+1):
+
+                # epsilon-greedy strategy
+                with timer.phase("act"):
+                    action = self.action_selector(state, self.epsilon)[0]
+
+                # take action & store experience
+                with timer.phase("env_step"):
+                    new_state, reward, done, info = env.step(action)
+                with timer.phase("store"):
+                    self.memory_buffer.append(state, action, reward, new_state, done)
+
+                # update networks? (fused mode: same number of updates per env step, batched into one call);
+                # counted over the whole run, as a fused call can span episodes
+                if utils.check_update(self.env_steps + i, config.num_steps_upd * max(config.fused_updates, 1),
+                                      self.memory_buffer, config.batch_size):
+                    losses.append(self.learn())
+
+                # reset state and update score
+                state = new_state
+                score += reward
+
+                # is the episode over?
+                if done:
+                    break
+
+            self.record_episode(ep, score, i, losses, time.perf_counter() - episode_start)
+            self.end_episode(ep, score)
+            if profiler is not None: profiler.episode_end(ep)
+
+            # early stopping & budgets
+            if self.scheduler.update(ep + 1, self.env_steps, self.policy_network):
+                break
+
+        self.end_training(start_time, ep + 1)
+
+    def train_distributed(self, num_actors, weight_sync_updates, actor_sync_steps, max_lead_steps):
+        """
+        Collects experience in num_actors actor processes (see distributed.py) while this process learns.
+        Keeps the serial loop's ratio of one update per num_steps_upd env steps, and its bookkeeping.
+
+        Args:
+            num_actors (int):
+                Number of actor processes
+            weight_sync_updates (int):
+                The learner publishes new weights every this many updates
+            actor_sync_steps (int):
+                Actors pick up published weights at most every this many env steps
+            max_lead_steps (int):
+                Actors pause once they are this many env steps ahead of the learner
+        """
+
+        from distributed import ActorPool
+
+        config, env, timer, profiler = self.config, self.env, self.timer, self.profiler
+        updates_per_call = max(config.fused_updates, 1)
+        steps_per_call = config.num_steps_upd * updates_per_call
+        pool = ActorPool(num_actors, [w.shape for w in self.policy_network.get_weights()],
+                         {"heating_power": env.h, "loss_coefficient": env.l, "reward_mech": env.reward_mech},
+                         actor_sync_steps = actor_sync_steps)
+        pool.publish(self.policy_network.get_weights())
+        pool.set_epsilon(self.epsilon)
+        pool.set_step_limit(max_lead_steps)
+        pool.start()
+
+        start_time = time.time()
+        self.scheduler.restore(self.start_episode, self.resumed_seconds)
+        if self.start_episode == 0: self.metrics_store.truncate(0) # fresh run
+        ep, num_updates, unpublished_updates, pending_steps, received_steps = self.start_episode, 0, 0, 0, 0
+        losses, record_start = [], time.perf_counter()
+        stop = False
+        if profiler is not None: profiler.episode_start(ep)
+        try:
+            while ep < config.num_episodes and not stop:
+                busy = False
+
+                # store transitions
+                with timer.phase("drain"):
+                    batch = pool.drain()
+                if batch is not None:
+                    with timer.phase("store"):
+                        self.memory_buffer.append_batch(*batch)
+                    pending_steps += len(batch[1])
+                    received_steps += len(batch[1])
+                    busy = True
+
+                # update networks & share new weights
+                while pending_steps >= steps_per_call and len(self.memory_buffer) >= config.batch_size:
+                    losses.append(self.learn())
+                    pending_steps -= steps_per_call
+                    num_updates += updates_per_call
+                    unpublished_updates += updates_per_call
+                    if unpublished_updates >= weight_sync_updates:
+                        with timer.phase("publish"):
+                            pool.publish(self.policy_network.get_weights())
+                        unpublished_updates = 0
+                    busy = True
+                pool.set_step_limit(received_steps - pending_steps + max_lead_steps)
+
+                # finished episodes
+                for score, steps in pool.drain_episodes():
+                    if ep == config.num_episodes:
+                        break
+                    now = time.perf_counter()
+                    self.record_episode(ep, score, steps, losses, now - record_start)
+                    losses, record_start = [], now
+                    self.end_episode(ep, score)
+                    pool.set_epsilon(self.epsilon)
+                    if profiler is not None:
+                        profiler.episode_end(ep)
+                        profiler.episode_start(ep + 1)
+                    ep += 1
+                    if ep % config.avg_frequency == 0:
+                        elapsed = time.time() - start_time
+                        print(f'Episode {ep}: {pool.env_steps()/elapsed:.0f} env steps/sec, {num_updates/elapsed:.1f} updates/sec, '
+                              f'{pool.dropped} transitions dropped')
+                    busy = True
+
+                    # early stopping & budgets
+                    if self.scheduler.update(ep, self.env_steps, self.policy_network):
+                        stop = True
+                        break
+
+                if not busy:
+                    if all(process.poll() is not None for process in pool.processes):
+                        raise RuntimeError("All actor processes have exited")
+                    time.sleep(0.001)
+        finally:
+            pool.close()
+
+        self.end_training(start_time, ep)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Train a DQN agent on RoomSimulator")
+    parser.add_argument("--distributed", action = "store_true", help = "collect experience in separate actor processes")
+    parser.add_argument("--num-actors", type = int, default = NUM_ACTORS)
+    parser.add_argument("--weight-sync-updates", type = int, default = WEIGHT_SYNC_UPDATES)
+    parser.add_argument("--actor-sync-steps", type = int, default = ACTOR_SYNC_STEPS)
+    parser.add_argument("--max-lead-steps", type = int, default = ACTOR_MAX_LEAD_STEPS)
+    parser.add_argument("--metrics", help = "stream per-episode metrics to this .jsonl or .csv file")
+    parser.add_argument("--profile", help = "profile episodes START:STOP, e.g. 100:110")
+    parser.add_argument("--profiler", choices = ["cprofile", "tf"], default = "cprofile")
+    parser.add_argument("--profile-dir", help = "default: <reward_mech>_outputs/profiles")
+    parser.add_argument("--resume", nargs = "?", const = "latest",
+                        help = "resume from a checkpoint directory (default: the latest one in <reward_mech>_outputs/checkpoints)")
+    parser.add_argument("--eval-frequency", type = int, default = EVAL_FREQUENCY, help = "episodes between greedy evaluations, 0 = budgets only")
+    parser.add_argument("--patience", type = int, default = PATIENCE, help = "evaluations without improvement before stopping")
+    parser.add_argument("--target-score", type = float, default = TARGET_SCORE, help = "stop once the evaluated score reaches this")
+    parser.add_argument("--max-minutes", type = float, default = MAX_MINUTES, help = "wall-clock budget (summed over resumed runs)")
+    parser.add_argument("--max-env-steps", type = int, default = MAX_ENV_STEPS, help = "env-step budget")
+    parser.add_argument("--reward-mech", choices = ["V1", "V2"], default = REWARD_MECH)
+    parser.add_argument("--double-dqn", action = argparse.BooleanOptionalAction, default = DOUBLE_DQN,
+                        help = "Double DQN targets (the policy network picks the next action)")
+    parser.add_argument("--n-step", type = int, default = N_STEP, help = "rewards summed per return before bootstrapping")
+    args = parser.parse_args()
+
+    config = TrainingConfig(eval_frequency = args.eval_frequency, patience = args.patience, target_score = args.target_score,
+                            max_minutes = args.max_minutes, max_env_steps = args.max_env_steps,
+                            reward_mech = args.reward_mech, double_dqn = args.double_dqn, n_step = args.n_step)
+    trainer = Trainer(config, RoomSimulator(0.5,0.04,reward_mech=config.reward_mech))
+
+    if args.resume:
+        path = checkpoint.latest_checkpoint(trainer.checkpoint_dir) if args.resume == "latest" else args.resume
+        if path is None:
+            raise FileNotFoundError(f"No checkpoint found in {trainer.checkpoint_dir}")
+        trainer.resume(path)
+
+    if args.metrics:
+        trainer.metrics_sink = MetricsSink(args.metrics)
+    if args.profile:
+        start, stop = (int(x) for x in args.profile.split(":"))
+        trainer.profiler = EpisodeProfiler(start, stop, args.profiler, args.profile_dir or join(trainer.save_dir, "profiles"))
+
+    try:
+        if args.distributed:
+            trainer.train_distributed(args.num_actors, args.weight_sync_updates, args.actor_sync_steps, args.max_lead_steps)
+        else:
+            trainer.train()
+    finally:
+        if trainer.profiler is not None: trainer.profiler.finish()
+        if trainer.metrics_sink is not None: trainer.metrics_sink.close()
@@ -7,6 +7,8 @@ import numpy as np
 import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 import tensorflow as tf
+from tensorflow.keras import Sequential, Input
+from tensorflow.keras.layers import Dense
 from tensorflow.keras.losses import MSE
 
 # SEED = 0
@@ -24,39 +26,182 @@ def choose_action(env, epsilon, q_values):
 
     return action
 
+class ActionSelector():
+    """
+    Chooses actions for a whole batch of states with the epsilon-greedy strategy in one compiled call,
+    instead of an eager policy_network call plus choose_action per state.
+
+    Args:
+        policy_network (Sequential):
+            Policy network used to predict the best action in the env
+        num_actions (int):
+            Number of actions to explore from, i.e. env.action_space.n
+        seed (int):
+            Optional seed for the exploration generator
+    """
+
+    def __init__(self, policy_network, num_actions, seed = None):
+
+        self.policy_network = policy_network
+        self.num_actions = num_actions
+        self.state_shape = tuple(policy_network.input_shape[1:])
+        if seed is None:
+            self.rng = tf.random.Generator.from_non_deterministic_state()
+        else:
+            self.rng = tf.random.Generator.from_seed(seed)
+
+        self.select = tf.function(
+            self.select_tf,
+            input_signature = [tf.TensorSpec((None, *self.state_shape), tf.float32), tf.TensorSpec((), tf.float32)]
+        )
+
+    def select_tf(self, states, epsilon):
+        q_values = self.policy_network(states, training = False)
+        greedy = tf.argmax(q_values, axis = 1, output_type = tf.int32)
+
+        batch = tf.shape(states)[:1]
+        explore = self.rng.uniform(batch) < epsilon
+        random_actions = self.rng.uniform(batch, maxval = self.num_actions, dtype = tf.int32)
+
+        return tf.where(explore, random_actions, greedy)
+
+    def __call__(self, states, epsilon = 0.0):
+        """
+        Args:
+            states (ndarray):
+                A single state or a batch of states, e.g. from VectorRoomSimulator
+            epsilon (float):
+                Probability of taking a random action
+
+        Returns:
+            actions (ndarray):
+                One action per state, of shape (batch,)
+        """
+
+        states = np.reshape(np.asarray(states, dtype = np.float32), (-1, *self.state_shape))
+
+        return self.select(states, epsilon).numpy()
+
+def build_network(state_shape, num_outputs):
+    """
+    Returns the 64 -> 64 MLP used for the policy & target networks
+    """
+
+    return Sequential(
+        [
+            Input(shape = state_shape),
+            Dense(units = 64, activation = 'relu'),
+            Dense(units = 64, activation = 'relu'),
+            Dense(units = num_outputs, activation = 'linear')
+        ]
+    )
+
 def get_experiences(memory_buffer, batch_size):
     """
-    Returns a list, of size (batch_size,), of randomly selected experiences from the memory buffer.
+    Returns a mini-batch, of size (batch_size,), of randomly selected experiences from the memory buffer.
 
     Args:
-        memory_buffer (deque):
-            A deque storing the most recent experiences
+        memory_buffer (ReplayBuffer):
+            A ring buffer storing the most recent experiences
         batch_size (int):
             Number of experiences we want to take to form our mini-batch.
 
     Returns:
-        sample (list):
-            List of randomly selected experience tuples
+        experiences (tuple):
+            Tensors (states, actions, rewards, new_states, done_vals)
     """
 
-    # Python list of experiences
-    experiences = random.sample(memory_buffer, batch_size)
+    # one vectorized draw, gathered into contiguous arrays
+    states, actions, rewards, new_states, done_vals = memory_buffer.sample(batch_size)
 
-    states = tf.convert_to_tensor(
-        np.array([e.state for e in experiences]), dtype = tf.float32)
-    actions = tf.convert_to_tensor(
-        np.array([e.action for e in experiences]), dtype = tf.float32)
-    rewards = tf.convert_to_tensor(
-        np.array([e.reward for e in experiences]), dtype = tf.float32)
-    new_states = tf.convert_to_tensor(
-        np.array([e.new_state for e in experiences]), dtype = tf.float32)
-    done_vals = tf.convert_to_tensor(
-        np.array([e.done_val for e in experiences]), dtype = tf.uint8)
+    states = tf.convert_to_tensor(states, dtype = tf.float32)
+    actions = tf.convert_to_tensor(actions, dtype = tf.float32)
+    rewards = tf.convert_to_tensor(rewards, dtype = tf.float32)
+    new_states = tf.convert_to_tensor(new_states, dtype = tf.float32)
+    done_vals = tf.convert_to_tensor(done_vals, dtype = tf.uint8)
 
     # returns a tuple
     return (states, actions, rewards, new_states, done_vals)
 
-def compute_loss_tf(policy_network, target_network, experiences, gamma):
+def get_prioritized_experiences(memory_buffer, batch_size):
+    """
+    Returns a mini-batch sampled by priority from a PrioritizedReplayBuffer.
+
+    Args:
+        memory_buffer (PrioritizedReplayBuffer):
+            A ring buffer storing the most recent experiences & their priorities
+        batch_size (int):
+            Number of experiences we want to take to form our mini-batch.
+
+    Returns:
+        experiences (tuple):
+            Tensors (states, actions, rewards, new_states, done_vals)
+        idx (ndarray):
+            Buffer indices of the sampled experiences, used to update their priorities
+        weights (Tensor):
+            Importance-sampling weights for the loss
+    """
+
+    (states, actions, rewards, new_states, done_vals), idx, weights = memory_buffer.sample_prioritized(batch_size)
+
+    experiences = (
+        tf.convert_to_tensor(states, dtype = tf.float32),
+        tf.convert_to_tensor(actions, dtype = tf.float32),
+        tf.convert_to_tensor(rewards, dtype = tf.float32),
+        tf.convert_to_tensor(new_states, dtype = tf.float32),
+        tf.convert_to_tensor(done_vals, dtype = tf.uint8),
+    )
+
+    return experiences, idx, tf.convert_to_tensor(weights, dtype = tf.float32)
+
+def get_n_step_experiences(memory_buffer, batch_size, n_step, gamma, stride = 1):
+    """
+    Returns a mini-batch with n-step returns (see ReplayBuffer.n_step_returns), sampled uniformly or,
+    from a PrioritizedReplayBuffer, by priority.
+
+    Args:
+        memory_buffer (ReplayBuffer):
+            A ring buffer storing the most recent experiences
+        batch_size (int):
+            Number of experiences we want to take to form our mini-batch.
+        n_step (int):
+            Maximum number of rewards per return
+        gamma (float):
+            Discount factor
+        stride (int):
+            Index distance between consecutive steps of a trajectory in the buffer
+
+    Returns:
+        experiences (tuple):
+            Tensors (states, actions, returns, bootstrap states, done_vals)
+        gammas (Tensor):
+            Discount of each bootstrap Q-value, passed to compute_loss_tf as gamma
+        idx (ndarray):
+            Buffer indices of the sampled experiences
+        weights (Tensor):
+            Importance-sampling weights (prioritized replay only, otherwise None)
+    """
+
+    if hasattr(memory_buffer, "sample_prioritized"):
+        (states, actions, _, _, _), idx, weights = memory_buffer.sample_prioritized(batch_size)
+        weights = tf.convert_to_tensor(weights, dtype = tf.float32)
+    else:
+        idx = memory_buffer.sample_indices(batch_size)
+        states, actions = memory_buffer.gather(idx)[:2]
+        weights = None
+    rewards, new_states, done_vals, gammas = memory_buffer.n_step_returns(idx, n_step, gamma, stride)
+
+    experiences = (
+        tf.convert_to_tensor(states, dtype = tf.float32),
+        tf.convert_to_tensor(actions, dtype = tf.float32),
+        tf.convert_to_tensor(rewards, dtype = tf.float32),
+        tf.convert_to_tensor(new_states, dtype = tf.float32),
+        tf.convert_to_tensor(done_vals, dtype = tf.uint8),
+    )
+
+    return experiences, tf.convert_to_tensor(gammas, dtype = tf.float32), idx, weights
+
+def compute_loss_tf(policy_network, target_network, experiences, gamma, weights = None, double = False):
     """
     Computes the MSE (Mean Squared Error) between Q-values in the policy network
     and the RHS of the Bellman equation.
@@ -64,11 +209,18 @@ def compute_loss_tf(policy_network, target_network, experiences, gamma):
     Args:
         experiences (deque):
             Randomly sampled mini-batch of experiences from the memory buffer.
-        gamma (float):
-            Hyperparameter for discounting future rewards
+        gamma (float or Tensor):
+            Hyperparameter for discounting future rewards, or one discount per experience (n-step returns)
+        weights (Tensor):
+            Optional importance-sampling weights from prioritized replay, one per experience
+        double (bool):
+            Double DQN targets: the policy network picks the next action & the target network evaluates it
 
     Returns:
-        loss ()
+        loss (Tensor):
+            (Weighted) mean squared TD error
+        td_errors (Tensor):
+            TD error of each experience, used to refresh replay priorities
     """
 
     # unpack experiences tuples
@@ -86,13 +238,21 @@ def compute_loss_tf(policy_network, target_network, experiences, gamma):
     q_values = tf.gather_nd(q_values, idx_comb)
 
     ### COMPUTE TARGETS ###
-    q_msa = tf.reduce_max(target_network(new_states), axis = 1)
+    if double:
+        next_actions = tf.argmax(policy_network(new_states), axis = 1, output_type = tf.int32)
+        q_msa = tf.gather(target_network(new_states), next_actions, batch_dims = 1)
+    else:
+        q_msa = tf.reduce_max(target_network(new_states), axis = 1)
     done_vals_f = tf.cast(done_vals, dtype = tf.float32)
     targs = rewards + (gamma * (1 - done_vals_f) * q_msa)
 
-    loss = MSE(targs, q_values)
+    td_errors = targs - q_values
+    if weights is None:
+        loss = MSE(targs, q_values)
+    else:
+        loss = tf.reduce_mean(weights * tf.square(td_errors))
     
-    return loss
+    return loss, td_errors
 
 def check_update(t, num_steps_upd, memory_buffer, batch_size):
     """
@@ -106,8 +266,8 @@ def check_update(t, num_steps_upd, memory_buffer, batch_size):
             Current training timestep 
         num_steps_upd (int): 
             For every {num_steps_upd} timesteps we update our networks. 
-        memory_buffer (deque):
-            A deque storing the most recent experience tuples. The max number
+        memory_buffer (ReplayBuffer):
+            A ring buffer storing the most recent experiences. The max number
             of experiences it can store is specified by hyperparameter MEMORY.
 
     Returns:
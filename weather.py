@@ -1,10 +1,122 @@
 from settings import *
 
+def summer_temp_profile():
+    """
+    Returns the noiseless outdoor temperature curve for a Summer's day, of shape (n,)
+    """
+
+    return MIN_TEMP_SUMMER + (MAX_TEMP_SUMMER - MIN_TEMP_SUMMER) * np.sin(np.pi * t /96)**2
+
+def season_weight(day_of_year):
+    """
+    Returns how far into Summer each day of the year is: 0 on the coldest day, 1 half a year later
+    """
+
+    return 0.5 - 0.5 * np.cos(2 * np.pi * (np.asarray(day_of_year) - COLDEST_DAY) / DAYS_PER_YEAR)
+
+def seasonal_days(start_day = 0, num_days: Optional[int] = None, rng: Optional[np.random.Generator] = None,
+                  chunk_days = 7):
+    """
+    Lazily generates consecutive days of outdoor temperatures & setpoints. The daily min & max outdoor
+    temperatures move between their Winter & Summer values with the seasons; the Winter setpoint schedule
+    (with a night setback) is used for the colder half of the year.
+
+    Args:
+        start_day (int):
+            Day of the year of the first day (0 = 1st January); later days wrap around into the next year
+        num_days (int):
+            Number of days to generate, None for no end
+        rng (Generator):
+            Generator for the temperature noise
+        chunk_days (int):
+            Number of days generated per chunk, which bounds memory use whatever the horizon
+
+    Yields:
+        otemp (ndarray):
+            Outdoor temperatures of shape (chunk_days, n) (the last chunk may be shorter)
+        setpoint (ndarray):
+            Setpoints of the same shape
+    """
+
+    rng = np.random.default_rng() if rng is None else rng
+    shape = np.sin(np.pi * t /96)**2
+    day = start_day
+    while num_days is None or day < start_day + num_days:
+        days = day + np.arange(chunk_days if num_days is None else min(chunk_days, start_day + num_days - day))
+        summer = season_weight(days % DAYS_PER_YEAR)[:, None]
+
+        low = MIN_TEMP_WINTER + (MIN_TEMP_SUMMER - MIN_TEMP_WINTER) * summer
+        high = MAX_TEMP_WINTER + (MAX_TEMP_SUMMER - MAX_TEMP_WINTER) * summer
+        otemp = low + (high - low) * shape + rng.uniform(-0.5,0.5,size = (len(days), len(t)))
+        setpoint = np.where(summer < 0.5, SETPOINT_WINTER, SETPOINT_SUMMER)
+
+        yield otemp, setpoint
+        day += len(days)
+
 class OutdoorTemp():
-    def __init__(self): 
+    def __init__(self, rng: Optional[np.random.Generator] = None):
+
+        # summer
+        self.o_temp_summer_wo_noise = summer_temp_profile()
+        if rng is None:
+            self.o_temp_summer = [(MIN_TEMP_SUMMER + (MAX_TEMP_SUMMER - MIN_TEMP_SUMMER) * np.sin(np.pi * x /96)**2) + random.uniform(-0.5,0.5) for x in t]
+        else:
+            # seeded & vectorized, so that VectorRoomSimulator can reproduce it exactly
+            self.o_temp_summer = self.o_temp_summer_wo_noise + rng.uniform(-0.5,0.5,size = len(t))
+
+        # winter
+
+class WeatherBank():
+    """
+    A bank of pre-generated outdoor temperature days stored in a memory-mapped `.npy` file of shape (num_days, n).
+
+    Rows are read straight from the mapped file, so indexing a day is O(1), copies nothing and every process
+    that opens the same file shares one copy of it through the OS page cache.
+
+    Args:
+        path (str):
+            Path to a bank written by WeatherBank.generate
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.days = np.load(path, mmap_mode = 'r')
+
+    def __len__(self):
+        return self.days.shape[0]
+
+    def __getitem__(self, day):
+        return self.days[day]
+
+    @classmethod
+    def generate(cls, path, num_days, seed: Optional[int] = None, chunk_days = 4096):
+        """
+        Generates num_days noisy Summer days with a seeded, vectorized generator & writes them to path.
+        The same seed always gives the same bank, whatever the chunk size.
+
+        Args:
+            path (str):
+                Where to write the `.npy` file
+            num_days (int):
+                Number of days in the bank
+            seed (int):
+                Seed for the noise generator
+            chunk_days (int):
+                Number of days generated at a time, which bounds memory use for large banks
+
+        Returns:
+            bank (WeatherBank):
+                The bank, opened read-only
+        """
 
-        # summer 
-        self.o_temp_summer_wo_noise = MIN_TEMP_SUMMER + (MAX_TEMP_SUMMER - MIN_TEMP_SUMMER) * np.sin(np.pi * t /96)**2
-        self.o_temp_summer = [(MIN_TEMP_SUMMER + (MAX_TEMP_SUMMER - MIN_TEMP_SUMMER) * np.sin(np.pi * x /96)**2) + random.uniform(-0.5,0.5) for x in t]
+        rng = np.random.default_rng(seed)
+        base = summer_temp_profile()
+        days = np.lib.format.open_memmap(path, mode = 'w+', dtype = np.float64, shape = (num_days, len(t)))
+        for start in range(0, num_days, chunk_days):
+            stop = min(start + chunk_days, num_days)
+            days[start:stop] = base + rng.uniform(-0.5,0.5,size = (stop - start, len(t)))
+        days.flush()
+        del days
 
-        # winter 
+        return cls(path)